@@ -1,13 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from helpers.deadline import start_request_deadline
 from models.chat.chat_initialization_input_model import ChatInitializationInputModel
 from models.chat.chat_message_input_model import ChatMessage
 from models.chat.chat_message_output_model import ConversationMessagesOutput
 from models.chat.chat_restart_input_model import ChatRestartInputModel
 from services.chat_services.chat_respond import chat_service
+from services.chat_services.chat_respond_stream import chat_stream_service
 from services.chat_services.chat_initialization import chat_initialization_service
 from services.chat_services.chat_restart import restart_conversation_service
 
-chat_router = APIRouter()
+chat_router = APIRouter(dependencies=[Depends(start_request_deadline)])
 
 
 @chat_router.post("/initialization")
@@ -24,6 +27,13 @@ async def chat_respond(
     return await chat_service(request)
 
 
+@chat_router.post("/respond/stream")
+async def chat_respond_stream(
+    request: ChatMessage,
+) -> StreamingResponse:
+    return await chat_stream_service(request)
+
+
 @chat_router.post("/restart")
 async def chat_restart(
     request: ChatRestartInputModel,
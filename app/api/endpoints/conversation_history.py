@@ -1,6 +1,8 @@
+from typing import Optional
 from fastapi import APIRouter, Query
-from services.history.history_events import history_events_service
-from services.history.history_messages import history_messages_service
+from services.history.history_events import history_events_service, history_events_export_service
+from services.history.history_messages import history_messages_service, history_messages_export_service
+from services.history.history_pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 history_router = APIRouter()
 
@@ -8,12 +10,30 @@ history_router = APIRouter()
 @history_router.get("/events")
 async def retrieve_events_by_conversation_id(
     conversation_id: str = Query(..., description="The conversation ID to retrieve events for"),
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of events"),
+    cursor: Optional[str] = Query(None, description="The next_cursor returned by the previous page"),
 ):
-    return await history_events_service(conversation_id)
+    return await history_events_service(conversation_id, page_size, cursor)
+
+
+@history_router.get("/events/export")
+async def export_events_by_conversation_id(
+    conversation_id: str = Query(..., description="The conversation ID to export events for"),
+):
+    return await history_events_export_service(conversation_id)
 
 
 @history_router.get("/messages")
 async def retrieve_messages_by_conversation_id(
     conversation_id: str = Query(..., description="The conversation ID to retrieve messages for"),
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of messages"),
+    cursor: Optional[str] = Query(None, description="The next_cursor returned by the previous page"),
+):
+    return await history_messages_service(conversation_id, page_size, cursor)
+
+
+@history_router.get("/messages/export")
+async def export_messages_by_conversation_id(
+    conversation_id: str = Query(..., description="The conversation ID to export messages for"),
 ):
-    return await history_messages_service(conversation_id)
+    return await history_messages_export_service(conversation_id)
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from utils.metrics.metrics import Metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("")
+async def retrieve_metrics():
+    return Metrics().snapshot()
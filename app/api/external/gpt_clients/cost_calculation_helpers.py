@@ -24,4 +24,12 @@ openai_pricing_per_1k_tokens = {
         "prompt": 0.0025,
         "completion": 0.010,
     },
+    "gpt-4o-mini": {
+        "prompt": 0.00015,
+        "completion": 0.0006,
+    },
+    "gpt-4o-mini-2024-07-18": {
+        "prompt": 0.00015,
+        "completion": 0.0006,
+    },
 }
@@ -30,8 +30,10 @@ class GPTActionNames(StrEnum):
     HANDOFF_DECIDER_ACTION = "handoff_decider_action"
     HANDOFF_MESSAGE_ACTION = "handoff_message_action"
     CHATBOT_LABEL_ACTION_NAME = "chatbot_label_action"
+    FUSED_ROUTER_ACTION = "fused_router_action"
     TOOLS_CALL_DOMAINS_ACTION_NAME = "tools_call_domains_action"
     TOOLS_CALL_OOS_ACTION_NAME = "tools_call_oos_action"
+    CONVERSATION_SUMMARY_ACTION = "conversation_summary_action"
 
 
 class GPTTeamNames(StrEnum):
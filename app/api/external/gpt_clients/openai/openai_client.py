@@ -1,6 +1,7 @@
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletion
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
+from openai import AsyncOpenAI, AsyncStream
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from api.external.gpt_clients.cost_calculation_helpers import calculate_openai_cost
 from api.external.gpt_clients.gpt_enums import (
     GPTResponseFormat,
@@ -10,19 +11,46 @@ from api.external.gpt_clients.gpt_enums import (
     GPTTemperature,
 )
 from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from api.external.gpt_clients.openai.openai_http_client import OpenAIHttpClient, get_request_timeout
+from api.external.gpt_clients.openai.openai_hedging import hedge_request, is_hedged, timed_request
+from api.external.gpt_clients.openai.openai_rate_limiter import OpenAIRateLimiter, RateLimitReservation
+from helpers.context_builder import count_prompt_tokens
 from helpers.conversation import filter_out_system_messages
+from helpers.custom_exceptions import InvalidGPTResponseException
+from helpers.deadline import check_deadline
 from helpers.gpt_helper import return_temperature_float_value
 from helpers.tenacity_retry_strategies import openai_retry_strategy
 from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
 from utils.env_constants import OPENAI_API_KEY
 from time import time
 import logging
 
 TIMEOUT_SECONDS = 45
 DEFAULT_MAX_TOKENS = 2048
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=TIMEOUT_SECONDS)
+# Retries are left to openai_retry_strategy, which stops at the request deadline.
+openai_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=TIMEOUT_SECONDS,
+    max_retries=0,
+    http_client=OpenAIHttpClient().client,
+)
 
 logger = Logger()
+metrics = Metrics()
+openai_rate_limiter = OpenAIRateLimiter()
+
+
+def record_usage(
+    action_name: GPTActionNames, model: OpenAIModel, usage: CompletionUsage, response_time: float, cost: float | str
+) -> None:
+    """Aggregates tokens, cost and latency per action and model, so model tiers can be compared."""
+    metrics.increment("openai_responses_total", action_name=action_name, model=model)
+    metrics.increment("openai_prompt_tokens_total", usage.prompt_tokens, action_name=action_name, model=model)
+    metrics.increment("openai_completion_tokens_total", usage.completion_tokens, action_name=action_name, model=model)
+    metrics.observe("openai_response_seconds", response_time, action_name=action_name, model=model)
+    if isinstance(cost, float):
+        metrics.increment("openai_cost_usd_total", cost, action_name=action_name, model=model)
 
 
 class OpenAIChat:
@@ -39,16 +67,26 @@ class OpenAIChat:
             max_tokens: int = DEFAULT_MAX_TOKENS,
     ) -> ChatCompletion | None:
         try:
-            start_time = time()
+            predicted_prompt_tokens = count_prompt_tokens(messages, model)
 
-            response = await openai_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                response_format={"type": response_format},
-                timeout=TIMEOUT_SECONDS,
-                temperature=return_temperature_float_value(temperature),
-                max_tokens=max_tokens,
-            )
+            async def send_request() -> ChatCompletion:
+                async with openai_rate_limiter.limit(action_name, predicted_prompt_tokens + max_tokens) as reservation:
+                    response = await openai_client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        response_format={"type": response_format},
+                        timeout=get_request_timeout(TIMEOUT_SECONDS),
+                        temperature=return_temperature_float_value(temperature),
+                        max_tokens=max_tokens,
+                    )
+                    reservation.tokens = response.usage.total_tokens
+                return response
+
+            start_time = time()
+            if is_hedged(action_name):
+                response = await hedge_request(action_name, send_request)
+            else:
+                response = await timed_request(action_name, send_request)
 
             process_time = time() - start_time
             total_cost = calculate_openai_cost(model, response.usage.prompt_tokens, response.usage.completion_tokens)
@@ -60,12 +98,15 @@ class OpenAIChat:
                 chatbot_name=chatbot_name,
                 model=model,
                 prompt_tokens=response.usage.prompt_tokens,
+                predicted_prompt_tokens=predicted_prompt_tokens,
                 completion_tokens=response.usage.completion_tokens,
                 total_tokens=response.usage.total_tokens,
                 requests=self.get_response.retry.statistics["attempt_number"],
+                hedged=is_hedged(action_name),
                 response_time=process_time,
                 cost=total_cost,
             )
+            record_usage(action_name, model, response.usage, process_time, total_cost)
 
             return response
         except Exception as e:
@@ -82,6 +123,8 @@ class OpenAIChat:
                 exception_type=type(e).__name__,
                 conversation_messages=filter_out_system_messages(messages),
             )
+            # A timeout caused by the request deadline is not retried.
+            check_deadline()
             raise
 
     @openai_retry_strategy
@@ -98,18 +141,21 @@ class OpenAIChat:
             max_tokens: int = DEFAULT_MAX_TOKENS,
     ) -> ChatCompletion | None:
         try:
-            start_time = time()
+            predicted_prompt_tokens = count_prompt_tokens(messages, model, tools)
+            async with openai_rate_limiter.limit(action_name, predicted_prompt_tokens + max_tokens) as reservation:
+                start_time = time()
 
-            response = await openai_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                tools=tools,
-                tool_choice="auto",
-                response_format={"type": response_format},
-                temperature=return_temperature_float_value(temperature),
-                max_tokens=max_tokens,
-                timeout=TIMEOUT_SECONDS,
-            )
+                response = await openai_client.chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    tools=tools,
+                    tool_choice="auto",
+                    response_format={"type": response_format},
+                    temperature=return_temperature_float_value(temperature),
+                    max_tokens=max_tokens,
+                    timeout=get_request_timeout(TIMEOUT_SECONDS),
+                )
+                reservation.tokens = response.usage.total_tokens
 
             process_time = time() - start_time
             total_cost = calculate_openai_cost(model, response.usage.prompt_tokens, response.usage.completion_tokens)
@@ -120,12 +166,14 @@ class OpenAIChat:
                 chatbot_name=chatbot_name,
                 model=model,
                 prompt_tokens=response.usage.prompt_tokens,
+                predicted_prompt_tokens=predicted_prompt_tokens,
                 completion_tokens=response.usage.completion_tokens,
                 total_tokens=response.usage.total_tokens,
                 requests=self.get_response_with_tools.retry.statistics.get("attempt_number"),
                 response_time=process_time,
                 cost=total_cost,
             )
+            record_usage(action_name, model, response.usage, process_time, total_cost)
 
             return response
         except Exception as e:
@@ -142,4 +190,121 @@ class OpenAIChat:
                 exception_type=type(e).__name__,
                 conversation_messages=filter_out_system_messages(messages),
             )
+            check_deadline()
             raise
+
+    @openai_retry_strategy
+    async def create_stream_with_tools(
+            self,
+            messages: List[dict],
+            action_name: GPTActionNames,
+            team_name: GPTTeamNames,
+            chatbot_name: GPTChatbotNames,
+            tools: List[Dict[str, Any]],
+            model: OpenAIModel,
+            predicted_prompt_tokens: int,
+            response_format: GPTResponseFormat = GPTResponseFormat.TEXT,
+            temperature: GPTTemperature = GPTTemperature.POINT_FIVE,
+            max_tokens: int = DEFAULT_MAX_TOKENS,
+    ) -> Tuple[AsyncStream[ChatCompletionChunk], RateLimitReservation] | None:
+        """
+        Every attempt takes its own limiter slot, which is held until the response stream is open. The reservation
+        is returned so its tokens can be corrected once the stream reports its usage.
+        """
+        try:
+            async with openai_rate_limiter.limit(action_name, predicted_prompt_tokens + max_tokens) as reservation:
+                stream = await openai_client.chat.completions.create(
+                    messages=messages,
+                    model=model,
+                    tools=tools,
+                    tool_choice="auto",
+                    response_format={"type": response_format},
+                    temperature=return_temperature_float_value(temperature),
+                    max_tokens=max_tokens,
+                    timeout=get_request_timeout(TIMEOUT_SECONDS),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+            return stream, reservation
+        except Exception as e:
+            logger.log(
+                "GPT Exception occurred",
+                level=logging.WARNING,
+                service="OpenAI",
+                payload=str(e),
+                model_name=model,
+                action_name=action_name,
+                method_name="create_stream_with_tools",
+                team_name=team_name,
+                chatbot_name=chatbot_name,
+                exception_type=type(e).__name__,
+                conversation_messages=filter_out_system_messages(messages),
+            )
+            check_deadline()
+            raise
+
+    async def stream_response_with_tools(
+            self,
+            messages: List[dict],
+            action_name: GPTActionNames,
+            team_name: GPTTeamNames,
+            chatbot_name: GPTChatbotNames,
+            tools: List[Dict[str, Any]],
+            model: OpenAIModel,
+            response_format: GPTResponseFormat = GPTResponseFormat.TEXT,
+            temperature: GPTTemperature = GPTTemperature.POINT_FIVE,
+            max_tokens: int = DEFAULT_MAX_TOKENS,
+    ) -> AsyncGenerator[ChatCompletionChunk, None]:
+        predicted_prompt_tokens = count_prompt_tokens(messages, model, tools)
+        start_time = time()
+
+        opened_stream = await self.create_stream_with_tools(
+            messages=messages,
+            action_name=action_name,
+            team_name=team_name,
+            chatbot_name=chatbot_name,
+            tools=tools,
+            model=model,
+            predicted_prompt_tokens=predicted_prompt_tokens,
+            response_format=response_format,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+
+        if not opened_stream:
+            raise InvalidGPTResponseException("GPT failed to open a response stream.")
+
+        stream, reservation = opened_stream
+        usage = None
+        time_to_first_chunk = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                    await openai_rate_limiter.update_reservation(reservation, usage.total_tokens)
+                if chunk.choices:
+                    if time_to_first_chunk is None:
+                        time_to_first_chunk = time() - start_time
+                    yield chunk
+        finally:
+            await stream.close()
+
+        if usage:
+            process_time = time() - start_time
+            total_cost = calculate_openai_cost(model, usage.prompt_tokens, usage.completion_tokens)
+            logger.log(
+                "OpenAI Streaming With Tools Token usage",
+                team_name=team_name,
+                action_name=action_name,
+                chatbot_name=chatbot_name,
+                model=model,
+                prompt_tokens=usage.prompt_tokens,
+                predicted_prompt_tokens=predicted_prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens,
+                requests=self.create_stream_with_tools.retry.statistics.get("attempt_number"),
+                response_time=process_time,
+                time_to_first_chunk=time_to_first_chunk,
+                cost=total_cost,
+            )
+            record_usage(action_name, model, usage, process_time, total_cost)
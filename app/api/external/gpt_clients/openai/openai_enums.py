@@ -6,3 +6,11 @@ class OpenAIModel(StrEnum):
     GPT_4O = "gpt-4o"
     GPT_4O_2024_08_06 = "gpt-4o-2024-08-06"
     GPT_4O_2024_05_13 = "gpt-4o-2024-05-13"
+    GPT_4O_MINI = "gpt-4o-mini"
+    GPT_4O_MINI_2024_07_18 = "gpt-4o-mini-2024-07-18"
+
+
+class OpenAILane(StrEnum):
+    ROUTER = "router"
+    HANDLER = "handler"
+    BACKGROUND = "background"
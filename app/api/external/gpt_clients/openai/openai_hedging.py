@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from time import monotonic
+from typing import Awaitable, Callable, Set, TypeVar
+from api.external.gpt_clients.gpt_enums import GPTActionNames
+from utils.env_constants import (
+    OPENAI_HEDGE_INITIAL_DELAY,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    OPENAI_HEDGE_PERCENTILE,
+    OPENAI_HEDGED_ACTIONS,
+)
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+T = TypeVar("T")
+
+logger = Logger()
+metrics = Metrics()
+
+
+def parse_hedged_actions(hedged_actions: str) -> Set[GPTActionNames]:
+    action_names = {action_name.strip() for action_name in hedged_actions.split(",") if action_name.strip()}
+    unknown_action_names = action_names - set(GPTActionNames)
+    if unknown_action_names:
+        logger.log("Unknown hedged OpenAI actions", level=logging.WARNING, action_names=sorted(unknown_action_names))
+    return {GPTActionNames(action_name) for action_name in action_names - unknown_action_names}
+
+
+hedged_actions = parse_hedged_actions(OPENAI_HEDGED_ACTIONS)
+
+
+def is_hedged(action_name: GPTActionNames) -> bool:
+    return action_name in hedged_actions
+
+
+def get_hedge_delay(action_name: GPTActionNames) -> float:
+    """The OPENAI_HEDGE_PERCENTILE latency of single requests of the action, once enough of them were seen."""
+    if metrics.get_counter("openai_request_total", action_name=action_name) < OPENAI_HEDGE_MIN_SAMPLES:
+        return OPENAI_HEDGE_INITIAL_DELAY
+    return metrics.get_percentile("openai_request_seconds", OPENAI_HEDGE_PERCENTILE, action_name=action_name)
+
+
+def record_request_latency(action_name: GPTActionNames, latency: float) -> None:
+    metrics.increment("openai_request_total", action_name=action_name)
+    metrics.observe("openai_request_seconds", latency, action_name=action_name)
+
+
+async def timed_request(action_name: GPTActionNames, send_request: Callable[[], Awaitable[T]]) -> T:
+    start_time = monotonic()
+    response = await send_request()
+    record_request_latency(action_name, monotonic() - start_time)
+    return response
+
+
+async def hedge_request(action_name: GPTActionNames, send_request: Callable[[], Awaitable[T]]) -> T:
+    """
+    Sends the request, and an identical one if no answer arrived within the hedge delay. The first successful answer
+    wins and the other request is cancelled; an error is raised only when both requests fail.
+    """
+    start_time = monotonic()
+    hedge_delay = get_hedge_delay(action_name)
+    metrics.increment("openai_hedge_eligible_total", action_name=action_name)
+
+    primary_task = asyncio.create_task(timed_request(action_name, send_request))
+    started_at = {primary_task: start_time}
+    pending = {primary_task}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return primary_task.result()
+
+        metrics.increment("openai_hedge_total", action_name=action_name)
+        hedge_task = asyncio.create_task(timed_request(action_name, send_request))
+        started_at[hedge_task] = monotonic()
+        pending.add(hedge_task)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner_task = next((task for task in done if task.exception() is None), None)
+            if winner_task:
+                winner = "primary" if winner_task is primary_task else "hedge"
+                metrics.increment("openai_hedge_wins_total", action_name=action_name, winner=winner)
+                return winner_task.result()
+
+        return primary_task.result()
+    finally:
+        for task in pending:
+            # A finished request already recorded its own latency in timed_request.
+            if task.done():
+                continue
+            task.cancel()
+            # A cancelled request took at least this long. Recording it keeps the slow requests in the latency
+            # percentiles, which would otherwise only see the requests that were fast enough to win.
+            record_request_latency(action_name, monotonic() - started_at[task])
+        record_hedging_outcome(action_name, monotonic() - start_time)
+
+
+def record_hedging_outcome(action_name: GPTActionNames, latency: float) -> None:
+    """
+    The p99 improvement compares single requests with what callers saw. Cancelled requests count with the time they
+    ran, so the improvement is a lower bound.
+    """
+    metrics.observe("openai_hedged_response_seconds", latency, action_name=action_name)
+    metrics.set_gauge(
+        "openai_hedge_rate",
+        metrics.get_counter("openai_hedge_total", action_name=action_name)
+        / metrics.get_counter("openai_hedge_eligible_total", action_name=action_name),
+        action_name=action_name,
+    )
+    metrics.set_gauge(
+        "openai_hedge_p99_improvement_seconds",
+        metrics.get_percentile("openai_request_seconds", 99, action_name=action_name)
+        - metrics.get_percentile("openai_hedged_response_seconds", 99, action_name=action_name),
+        action_name=action_name,
+    )
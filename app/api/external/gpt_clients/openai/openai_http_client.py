@@ -0,0 +1,149 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Any, AsyncIterator, Callable, Dict
+import httpx
+from openai import DefaultAsyncHttpxClient
+from helpers.deadline import get_timeout
+from utils.env_constants import (
+    OPENAI_CONNECT_TIMEOUT,
+    OPENAI_HTTP2,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_PREWARM_CONNECTIONS,
+)
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+logger = Logger()
+metrics = Metrics()
+
+
+def get_request_timeout(read_timeout: float) -> httpx.Timeout:
+    """A short connect timeout, so an unreachable host fails fast, and a read timeout bounded by the deadline."""
+    read_timeout = get_timeout(read_timeout)
+    return httpx.Timeout(read_timeout, connect=min(OPENAI_CONNECT_TIMEOUT, read_timeout))
+
+
+def is_http2_available() -> bool:
+    if not OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.log("OPENAI_HTTP2 is set but the h2 package is not installed, using HTTP/1.1", level=logging.WARNING)
+        return False
+    return True
+
+
+class ReleasingByteStream(httpx.AsyncByteStream):
+    """Response body that reports when it is closed, which is when its connection goes back to the pool."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]) -> None:
+        self.stream = stream
+        self.on_close = on_close
+        self.closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.on_close()
+
+
+class PoolMetricsTransport(httpx.AsyncHTTPTransport):
+    """
+    Counts the requests using or waiting for a pool connection, and the connections opened, to size the pool.
+    A utilisation above 1 means requests are queueing for a connection.
+    """
+
+    def __init__(self, limits: httpx.Limits, **kwargs: Any) -> None:
+        super().__init__(limits=limits, **kwargs)
+        self.max_connections = limits.max_connections
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self.trace
+        self.acquire()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=ReleasingByteStream(response.stream, self.release),
+            extensions=response.extensions,
+        )
+
+    @staticmethod
+    async def trace(event_name: str, _info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            metrics.increment("openai_http_connections_opened_total")
+
+    def acquire(self) -> None:
+        self.in_flight += 1
+        metrics.increment("openai_http_requests_total")
+        metrics.observe("openai_http_concurrent_requests", self.in_flight)
+        self.update_usage_metrics()
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.update_usage_metrics()
+
+    def update_usage_metrics(self) -> None:
+        metrics.set_gauge("openai_http_in_flight", self.in_flight)
+        metrics.set_gauge("openai_http_pool_utilisation", self.in_flight / self.max_connections)
+
+
+class OpenAIHttpClient:
+    """
+    The HTTP client shared by every OpenAI request. Connections are kept alive for OPENAI_KEEPALIVE_EXPIRY seconds
+    instead of httpx's 5, so bursts reuse TLS connections rather than opening new ones.
+    """
+
+    _instance = None
+
+    def __new__(cls) -> "OpenAIHttpClient":
+        if cls._instance is None:
+            cls._instance = super(OpenAIHttpClient, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self) -> None:
+        self.http2 = is_http2_available()
+        self.transport = PoolMetricsTransport(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            http2=self.http2,
+        )
+        self.client = DefaultAsyncHttpxClient(transport=self.transport)
+
+    async def prewarm(self) -> None:
+        """Opens OPENAI_PREWARM_CONNECTIONS connections up front, so the first requests skip the TLS handshake."""
+        responses = await asyncio.gather(
+            *(
+                self.client.head(OPENAI_BASE_URL, timeout=httpx.Timeout(OPENAI_CONNECT_TIMEOUT))
+                for _ in range(OPENAI_PREWARM_CONNECTIONS)
+            ),
+            return_exceptions=True,
+        )
+        failures = [response for response in responses if isinstance(response, Exception)]
+        if failures:
+            logger.log("OpenAI connection prewarm failed", level=logging.WARNING, payload=str(failures[0]))
+        logger.log("OpenAI connections prewarmed", connections=len(responses) - len(failures), http2=self.http2)
+
+    async def close(self) -> None:
+        await self.client.aclose()
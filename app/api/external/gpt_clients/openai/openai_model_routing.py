@@ -0,0 +1,53 @@
+import logging
+from contextvars import ContextVar
+from typing import Dict
+from tenacity import RetryCallState
+from api.external.gpt_clients.gpt_enums import GPTActionNames
+from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from utils.env_constants import OPENAI_ACTION_MODELS, OPENAI_ESCALATION_MODEL
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+# Small classification answers do not need the large model. A response that fails validation is retried on
+# OPENAI_ESCALATION_MODEL instead.
+DEFAULT_ACTION_MODELS = {
+    GPTActionNames.CHATBOT_LABEL_ACTION_NAME: OpenAIModel.GPT_4O_MINI_2024_07_18,
+    GPTActionNames.HANDOFF_DECIDER_ACTION: OpenAIModel.GPT_4O_MINI_2024_07_18,
+    GPTActionNames.HANDOFF_MESSAGE_ACTION: OpenAIModel.GPT_4O_MINI_2024_07_18,
+}
+
+# Attempt number of the innermost retried classification, set by track_attempt_number.
+current_attempt_number: ContextVar[int] = ContextVar("current_attempt_number", default=1)
+
+logger = Logger()
+metrics = Metrics()
+
+
+def parse_action_models(action_models: str) -> Dict[str, OpenAIModel]:
+    """Parses "action_name:model,action_name:model" overrides from the environment."""
+    parsed_models = {}
+    for action_model in filter(None, (part.strip() for part in action_models.split(","))):
+        action_name, _, model = action_model.partition(":")
+        if action_name.strip() not in list(GPTActionNames) or model.strip() not in list(OpenAIModel):
+            logger.log("Unknown OpenAI action model override", level=logging.WARNING, action_model=action_model)
+            continue
+        parsed_models[action_name.strip()] = OpenAIModel(model.strip())
+    return parsed_models
+
+
+action_models: Dict[str, OpenAIModel] = {**DEFAULT_ACTION_MODELS, **parse_action_models(OPENAI_ACTION_MODELS)}
+escalation_model = OpenAIModel(OPENAI_ESCALATION_MODEL)
+
+
+def track_attempt_number(retry_state: RetryCallState) -> None:
+    """tenacity before hook of the classification retry strategies, so a retried call can escalate its model."""
+    current_attempt_number.set(retry_state.attempt_number)
+
+
+def get_action_model(action_name: GPTActionNames) -> OpenAIModel:
+    """Actions without a configured model, and retries of the ones with one, run on OPENAI_ESCALATION_MODEL."""
+    model = action_models.get(action_name, escalation_model)
+    if current_attempt_number.get() > 1 and model != escalation_model:
+        metrics.increment("openai_model_escalations_total", action_name=action_name, model=model)
+        return escalation_model
+    return model
@@ -0,0 +1,207 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from openai import RateLimitError
+from api.external.gpt_clients.gpt_enums import GPTActionNames
+from api.external.gpt_clients.openai.openai_enums import OpenAILane
+from helpers.deadline import check_deadline, get_remaining_time
+from utils.env_constants import OPENAI_MAX_CONCURRENCY, OPENAI_MIN_CONCURRENCY, OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+RATE_LIMIT_WINDOW_SECONDS = 60
+DEFAULT_RATE_LIMIT_COOLDOWN_SECONDS = 1.0
+
+# Lanes in the order they are served. Routing blocks every turn and is cheap, so it never waits behind handlers.
+LANE_PRIORITY = [OpenAILane.ROUTER, OpenAILane.HANDLER, OpenAILane.BACKGROUND]
+
+ACTION_LANES = {
+    GPTActionNames.CHATBOT_LABEL_ACTION_NAME: OpenAILane.ROUTER,
+    GPTActionNames.FUSED_ROUTER_ACTION: OpenAILane.ROUTER,
+    GPTActionNames.HANDOFF_DECIDER_ACTION: OpenAILane.ROUTER,
+    GPTActionNames.HANDOFF_MESSAGE_ACTION: OpenAILane.ROUTER,
+    GPTActionNames.TOOLS_CALL_DOMAINS_ACTION_NAME: OpenAILane.HANDLER,
+    GPTActionNames.TOOLS_CALL_OOS_ACTION_NAME: OpenAILane.HANDLER,
+    GPTActionNames.CONVERSATION_SUMMARY_ACTION: OpenAILane.BACKGROUND,
+}
+
+logger = Logger()
+metrics = Metrics()
+
+
+class RateLimitReservation:
+    def __init__(self, reserved_at: float, tokens: int) -> None:
+        self.reserved_at = reserved_at
+        self.tokens = tokens
+        self.counted_tokens = tokens
+
+
+class OpenAIRateLimiter:
+    """
+    Client side limit for OpenAI requests. Requests wait in priority lanes until they fit into the requests and
+    tokens per minute budgets and the concurrency limit. Tokens are reserved from the predicted prompt plus
+    max_tokens, as OpenAI does, and corrected with response.usage when the request finishes. The concurrency
+    limit adapts AIMD style: every success raises it slowly, every rate limit error halves it.
+    """
+
+    _instance = None
+
+    def __new__(cls) -> "OpenAIRateLimiter":
+        if cls._instance is None:
+            cls._instance = super(OpenAIRateLimiter, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self) -> None:
+        self.condition: Optional[asyncio.Condition] = None
+        self.lanes: Dict[OpenAILane, Deque[object]] = {lane: deque() for lane in LANE_PRIORITY}
+        self.reservations: Deque[RateLimitReservation] = deque()
+        self.reserved_tokens = 0
+        self.in_flight = 0
+        self.concurrency_limit = float(OPENAI_MAX_CONCURRENCY)
+        self.blocked_until = 0.0
+
+    def get_condition(self) -> asyncio.Condition:
+        # Created lazily, so it belongs to the running event loop rather than to the one active at import time.
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    @asynccontextmanager
+    async def limit(self, action_name: GPTActionNames, tokens: int) -> AsyncIterator[RateLimitReservation]:
+        """Set reservation.tokens to the actual usage once it is known."""
+        lane = ACTION_LANES.get(action_name, OpenAILane.HANDLER)
+        reservation = await self.acquire(lane, tokens)
+        try:
+            yield reservation
+            self.record_success()
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        finally:
+            await self.release(reservation)
+
+    async def acquire(self, lane: OpenAILane, tokens: int) -> RateLimitReservation:
+        condition = self.get_condition()
+        waiter = object()
+        start_time = monotonic()
+
+        async with condition:
+            self.lanes[lane].append(waiter)
+            self.update_queue_metrics()
+            try:
+                while not (self.is_next(lane, waiter) and self.has_capacity(tokens)):
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=self.get_wait_timeout())
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.lanes[lane].remove(waiter)
+                self.update_queue_metrics()
+                condition.notify_all()
+
+            reservation = RateLimitReservation(monotonic(), tokens)
+            self.reservations.append(reservation)
+            self.reserved_tokens += tokens
+            self.in_flight += 1
+            self.update_usage_metrics()
+
+        metrics.observe("openai_limiter_wait_seconds", monotonic() - start_time, lane=lane)
+        return reservation
+
+    async def release(self, reservation: RateLimitReservation) -> None:
+        condition = self.get_condition()
+        async with condition:
+            self.in_flight -= 1
+            self.count_reservation_tokens(reservation)
+            self.update_usage_metrics()
+            condition.notify_all()
+
+    async def update_reservation(self, reservation: RateLimitReservation, tokens: int) -> None:
+        """Corrects the tokens of a reservation that was already released, like a stream's once its usage arrives."""
+        condition = self.get_condition()
+        async with condition:
+            reservation.tokens = tokens
+            self.count_reservation_tokens(reservation)
+            self.update_usage_metrics()
+            condition.notify_all()
+
+    def count_reservation_tokens(self, reservation: RateLimitReservation) -> None:
+        self.expire_reservations()
+        if reservation.reserved_at > monotonic() - RATE_LIMIT_WINDOW_SECONDS:
+            self.reserved_tokens += reservation.tokens - reservation.counted_tokens
+            reservation.counted_tokens = reservation.tokens
+
+    def is_next(self, lane: OpenAILane, waiter: object) -> bool:
+        for priority_lane in LANE_PRIORITY:
+            if self.lanes[priority_lane]:
+                return priority_lane == lane and self.lanes[lane][0] is waiter
+        return False
+
+    def expire_reservations(self) -> None:
+        window_start = monotonic() - RATE_LIMIT_WINDOW_SECONDS
+        while self.reservations and self.reservations[0].reserved_at <= window_start:
+            self.reserved_tokens -= self.reservations.popleft().counted_tokens
+
+    def has_capacity(self, tokens: int) -> bool:
+        self.expire_reservations()
+        if monotonic() < self.blocked_until or self.in_flight >= int(self.concurrency_limit):
+            return False
+        if len(self.reservations) >= OPENAI_RPM_LIMIT:
+            return False
+        # A request larger than the whole budget is let through on an empty window instead of waiting forever.
+        return not self.reservations or self.reserved_tokens + tokens <= OPENAI_TPM_LIMIT
+
+    def get_capacity_delay(self) -> Optional[float]:
+        """Seconds until capacity frees up without a release, or None when only a release can free it."""
+        delays: List[float] = []
+        if self.blocked_until > monotonic():
+            delays.append(self.blocked_until - monotonic())
+        if self.reservations:
+            delays.append(self.reservations[0].reserved_at + RATE_LIMIT_WINDOW_SECONDS - monotonic())
+        return max(min(delays), 0.01) if delays else None
+
+    def get_wait_timeout(self) -> Optional[float]:
+        """The capacity delay, cut short by the request deadline so a queued request gives up in time."""
+        check_deadline()
+        capacity_delay = self.get_capacity_delay()
+        remaining_time = get_remaining_time()
+        if remaining_time is None or capacity_delay is not None and capacity_delay < remaining_time:
+            return capacity_delay
+        return remaining_time
+
+    def record_success(self) -> None:
+        self.concurrency_limit = min(OPENAI_MAX_CONCURRENCY, self.concurrency_limit + 1 / self.concurrency_limit)
+        metrics.set_gauge("openai_limiter_concurrency_limit", int(self.concurrency_limit))
+
+    def record_failure(self, exception: Exception) -> None:
+        if not isinstance(exception, RateLimitError):
+            return
+
+        retry_after = exception.response.headers.get("retry-after") if exception.response is not None else None
+        try:
+            cooldown = float(retry_after) if retry_after else DEFAULT_RATE_LIMIT_COOLDOWN_SECONDS
+        except ValueError:
+            cooldown = DEFAULT_RATE_LIMIT_COOLDOWN_SECONDS
+
+        self.concurrency_limit = max(OPENAI_MIN_CONCURRENCY, self.concurrency_limit / 2)
+        self.blocked_until = max(self.blocked_until, monotonic() + cooldown)
+
+        metrics.increment("openai_rate_limited_total")
+        metrics.set_gauge("openai_limiter_concurrency_limit", int(self.concurrency_limit))
+        logger.log(
+            "OpenAI rate limit reached, reducing concurrency",
+            concurrency_limit=int(self.concurrency_limit),
+            cooldown=cooldown,
+        )
+
+    def update_queue_metrics(self) -> None:
+        for lane, waiters in self.lanes.items():
+            metrics.set_gauge("openai_limiter_queue_depth", len(waiters), lane=lane)
+
+    def update_usage_metrics(self) -> None:
+        metrics.set_gauge("openai_limiter_in_flight", self.in_flight)
+        metrics.set_gauge("openai_limiter_requests_per_minute", len(self.reservations))
+        metrics.set_gauge("openai_limiter_tokens_per_minute", self.reserved_tokens)
@@ -0,0 +1,117 @@
+"""
+Trains and evaluates the local handoff pre-classifier.
+
+    python -m commands.handoff_classifier train --dataset conversations.jsonl --output handoff_classifier.json
+    python -m commands.handoff_classifier evaluate --dataset conversations.jsonl [--model handoff_classifier.json]
+
+The dataset has one labelled conversation per line:
+
+    {"messages": [{"role": "user", "content": "..."}, ...], "is_seeking_human_assistance": true}
+
+Only the latest user message of each conversation is used, as in routing. evaluate replays every conversation
+through the pre-classifier and reports the precision and recall of its local handoff decisions, the error rate of
+its local "no handoff" decisions and the fraction of GPT handoff calls it avoids. The keyword and profanity rules are
+reported separately, since they hand off without a threshold, and are also checked against KEYWORD_STAGE_CASES;
+evaluate exits with an error when one of those is decided wrongly. The model defaults to
+HANDOFF_CLASSIFIER_MODEL_PATH; without one, only the keyword and profanity rules are evaluated.
+"""
+
+import argparse
+import json
+import sys
+from typing import Iterator, Optional, Tuple
+from models.chat.chat_message_input_model import InputRole
+from router.handoff_classifier import HandoffClassifier, load_handoff_classifier, pre_classify_handoff
+
+KEYWORD_STAGES = {"human_request", "profanity"}
+
+# Messages the keyword stage has to get right, whatever the dataset. Only handoffs are decided by keywords, so the
+# negative cases must stay undecided and reach GPT.
+KEYWORD_STAGE_CASES = [
+    ("My live chat plugin is not showing on my WordPress site", False),
+    ("How do I add a real person photo to the about page?", False),
+    ("Can I chat with the agent bot in my site builder?", False),
+    ("Ich möchte einen Mitarbeiter zu meinem Konto hinzufügen", False),
+    ("I want to talk to a human", True),
+    ("Can I speak with a real person, please?", True),
+    ("Quiero hablar con un agente", True),
+    ("Ich möchte mit einem Mitarbeiter sprechen", True),
+]
+
+
+def read_dataset(dataset_path: str) -> Iterator[Tuple[str, bool]]:
+    with open(dataset_path) as dataset_file:
+        for line in dataset_file:
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            user_messages = [
+                message["content"] for message in conversation["messages"] if message.get("role") == InputRole.USER
+            ]
+            if user_messages:
+                yield user_messages[-1], bool(conversation["is_seeking_human_assistance"])
+
+
+def train(dataset_path: str, output_path: str) -> None:
+    classifier = HandoffClassifier.train(read_dataset(dataset_path))
+    classifier.save(output_path)
+    print(f"Trained on {sum(classifier.class_counts.values())} conversations {classifier.class_counts}")
+    print(f"Model saved to {output_path}")
+
+
+def safe_divide(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def evaluate(dataset_path: str, model_path: Optional[str]) -> None:
+    classifier = HandoffClassifier.load(model_path) if model_path else load_handoff_classifier()
+
+    counts = {"total": 0, "positives": 0, "true_yes": 0, "false_yes": 0, "true_no": 0, "false_no": 0}
+    keyword_counts = {"true_yes": 0, "false_yes": 0}
+    for message, is_handoff in read_dataset(dataset_path):
+        decision, reason = pre_classify_handoff(message, classifier)
+        counts["total"] += 1
+        counts["positives"] += is_handoff
+        if decision is True:
+            counts["true_yes" if is_handoff else "false_yes"] += 1
+            if reason in KEYWORD_STAGES:
+                keyword_counts["true_yes" if is_handoff else "false_yes"] += 1
+        elif decision is False:
+            counts["false_no" if is_handoff else "true_no"] += 1
+
+    keyword_stage_errors = [
+        message
+        for message, is_handoff in KEYWORD_STAGE_CASES
+        if (pre_classify_handoff(message, None)[1] in KEYWORD_STAGES) != is_handoff
+    ]
+
+    local_decisions = counts["true_yes"] + counts["false_yes"] + counts["true_no"] + counts["false_no"]
+    report = {
+        **counts,
+        "handoff_precision": safe_divide(counts["true_yes"], counts["true_yes"] + counts["false_yes"]),
+        "handoff_recall": safe_divide(counts["true_yes"], counts["positives"]),
+        "no_handoff_error_rate": safe_divide(counts["false_no"], counts["true_no"] + counts["false_no"]),
+        "gpt_calls_avoided": safe_divide(local_decisions, counts["total"]),
+        "keyword_handoffs": keyword_counts["true_yes"] + keyword_counts["false_yes"],
+        "keyword_handoff_precision": safe_divide(
+            keyword_counts["true_yes"], keyword_counts["true_yes"] + keyword_counts["false_yes"]
+        ),
+        "keyword_stage_errors": keyword_stage_errors,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if keyword_stage_errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Handoff pre-classifier training and evaluation")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--output", default="handoff_classifier.json")
+    parser.add_argument("--model")
+    arguments = parser.parse_args()
+
+    if arguments.command == "train":
+        train(arguments.dataset, arguments.output)
+    else:
+        evaluate(arguments.dataset, arguments.model)
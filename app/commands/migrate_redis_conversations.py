@@ -0,0 +1,35 @@
+"""
+Moves every conversation still stored under the legacy per-field Redis keys into the conversation hash layout.
+
+    python -m commands.migrate_redis_conversations
+
+Conversations are also migrated lazily the first time they are read, so running this is optional; it only
+finishes the rollout before the legacy keys would have expired on their own.
+"""
+
+import asyncio
+from redis_services.redis_client import RedisClient
+from redis_services.redis_enums import LegacyRedisPrefix
+from redis_services.redis_methods import migrate_legacy_conversation
+from utils.logger.logger import Logger
+
+logger = Logger()
+
+
+async def main() -> None:
+    redis_client = RedisClient()
+    migrated_conversations = 0
+
+    try:
+        async for legacy_key in redis_client.scan_iter(match=f"{LegacyRedisPrefix.CONVERSATION_KEY_PREFIX}*"):
+            user_id = legacy_key.removeprefix(LegacyRedisPrefix.CONVERSATION_KEY_PREFIX)
+            if await migrate_legacy_conversation(user_id):
+                migrated_conversations += 1
+    finally:
+        await redis_client.close()
+
+    logger.log("Legacy Redis conversations migrated", migrated_conversations=migrated_conversations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
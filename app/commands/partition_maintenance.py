@@ -0,0 +1,99 @@
+"""
+Maintenance of the monthly events and history partitions.
+
+    python -m commands.partition_maintenance create-partitions
+    python -m commands.partition_maintenance apply-retention
+
+create-partitions makes sure the current month and the next PARTITION_PREMAKE_MONTHS months have a partition.
+apply-retention archives every partition older than PARTITION_RETENTION_MONTHS into a gzip compressed CSV file
+under PARTITION_ARCHIVE_DIRECTORY, then detaches and drops it. A partition is only dropped after its archive
+has been written completely.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import date
+from typing import Optional
+from database.database_calls import postgres_database
+from utils.env_constants import PARTITION_ARCHIVE_DIRECTORY, PARTITION_PREMAKE_MONTHS, PARTITION_RETENTION_MONTHS
+from utils.logger.logger import Logger
+
+PARTITIONED_TABLES = ["events", "history"]
+
+logger = Logger()
+
+
+def add_months(month_start: date, months: int) -> date:
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partition_month(table_name: str, partition_name: str) -> Optional[date]:
+    match = re.fullmatch(rf"{table_name}_(\d{{4}})_(\d{{2}})", partition_name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+async def create_partitions(today: date) -> None:
+    current_month = today.replace(day=1)
+    for table_name in PARTITIONED_TABLES:
+        for month_offset in range(PARTITION_PREMAKE_MONTHS + 1):
+            month_start = add_months(current_month, month_offset)
+            partition_name = await postgres_database.create_monthly_partition(table_name, month_start)
+            if partition_name is None:
+                raise RuntimeError(f"Failed creating {table_name} partition for {month_start}")
+            logger.log("Partition is ready", table_name=table_name, partition_name=partition_name)
+
+
+async def apply_retention(today: date) -> None:
+    if PARTITION_RETENTION_MONTHS <= 0:
+        logger.log("Partition retention is disabled")
+        return
+
+    retention_start = add_months(today.replace(day=1), -PARTITION_RETENTION_MONTHS)
+    os.makedirs(PARTITION_ARCHIVE_DIRECTORY, exist_ok=True)
+
+    for table_name in PARTITIONED_TABLES:
+        partition_names = await postgres_database.get_partition_names(table_name)
+        if partition_names is None:
+            raise RuntimeError(f"Failed listing {table_name} partitions")
+
+        for partition_name in partition_names:
+            partition_month = get_partition_month(table_name, partition_name)
+            if partition_month is None or partition_month >= retention_start:
+                continue
+
+            archive_path = os.path.join(PARTITION_ARCHIVE_DIRECTORY, f"{partition_name}.csv.gz")
+            archived_rows = await postgres_database.archive_partition(partition_name, archive_path)
+            await postgres_database.drop_partition(table_name, partition_name)
+            logger.log(
+                "Partition archived and dropped",
+                table_name=table_name,
+                partition_name=partition_name,
+                archive_path=archive_path,
+                archived_rows=archived_rows,
+            )
+
+
+async def main(command: str) -> None:
+    await postgres_database.connect()
+    try:
+        if command == "create-partitions":
+            await create_partitions(date.today())
+        elif command == "apply-retention":
+            await apply_retention(date.today())
+    except Exception as exception:
+        logger.log("Partition maintenance failed", level=logging.ERROR, command=command, payload=exception)
+        raise
+    finally:
+        await postgres_database.close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Events and history partition maintenance")
+    parser.add_argument("command", choices=["create-partitions", "apply-retention"])
+    asyncio.run(main(parser.parse_args().command))
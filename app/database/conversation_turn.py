@@ -0,0 +1,56 @@
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional
+from database.database_calls import postgres_database
+from database.database_models.events_table_model import EventsTable
+from database.database_models.history_table_model import HistoryTable
+from helpers.deadline import without_deadline
+
+
+class ConversationTurn:
+    """
+    Collects the events and history rows produced while answering one user message,
+    so they can be written to Postgres in a single transaction at the end of the turn.
+    It also carries the turn's message part ids, which are generated locally and never leave the process.
+    """
+
+    def __init__(self, user_id: str, conversation_id: str, user_part_id: str, assistant_part_id: str) -> None:
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.user_part_id = user_part_id
+        self.assistant_part_id = assistant_part_id
+        self.events: List[EventsTable] = []
+        self.history: List[HistoryTable] = []
+
+    @classmethod
+    def start(cls, user_id: str, conversation_id: str) -> "ConversationTurn":
+        conversation_turn = cls(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            user_part_id=f"{user_id}-{uuid.uuid4()}",
+            assistant_part_id=f"{user_id}-{uuid.uuid4()}",
+        )
+        current_conversation_turn.set(conversation_turn)
+
+        return conversation_turn
+
+    def add_event(self, event: EventsTable) -> None:
+        self.events.append(event)
+
+    def add_history(self, history: HistoryTable) -> None:
+        self.history.append(history)
+
+    async def commit(self) -> None:
+        if not self.events and not self.history:
+            return
+
+        events, history = self.events, self.history
+        self.events, self.history = [], []
+        # Runs after the request deadline as well, a turn that timed out is still recorded.
+        with without_deadline():
+            await postgres_database.insert_turn(events, history)
+
+
+current_conversation_turn: ContextVar[Optional[ConversationTurn]] = ContextVar(
+    "current_conversation_turn", default=None
+)
@@ -1,9 +1,16 @@
+import gzip
 import logging
+import os
+from datetime import date, datetime
+from time import monotonic
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
 import asyncpg
 from asyncpg import UniqueViolationError, ForeignKeyViolationError, PostgresError
 from database.database_models.conversations_table_model import ConversationsTable
 from database.database_models.history_table_model import HistoryTable
 from database.database_models.events_table_model import EventsTable
+from database.write_behind_buffer import WriteBehindBuffer
+from helpers.deadline import get_timeout
 from helpers.tenacity_retry_strategies import postgresql_retry_strategy
 from utils.logger.logger import Logger
 from utils.env_constants import DB_NAME, DB_PASSWORD, DB_USERNAME, DB_HOST
@@ -13,6 +20,30 @@ MAX_POOL_SIZE = 10
 COMMAND_MAX_EXECUTION_TIMEOUT = 5
 ACQUIRE_A_CONNECTION_MAX_TIMEOUT = 5
 
+STREAM_CURSOR_PREFETCH = 500
+# Exports hold a connection and a transaction for the whole download, so they get their own small pool and a time
+# limit instead of taking connections from the request path.
+EXPORT_POOL_SIZE = 2
+EXPORT_MAX_SECONDS = 300
+EXPORT_IDLE_TIMEOUT_SECONDS = 60
+PARTITION_MAINTENANCE_TIMEOUT = 3600
+KEYSET_CONDITION = "AND (created_at, id) > ($3, $4)"
+
+INSERT_TURN_QUERY = """
+    WITH inserted_events AS (
+        INSERT INTO events (conversation_id, event_type, payload, message_part_id)
+        SELECT conversation_id, event_type, payload, message_part_id
+        FROM unnest($1::text[], $2::text[], $3::jsonb[], $4::text[]) WITH ORDINALITY
+            AS event_rows (conversation_id, event_type, payload, message_part_id, position)
+        ORDER BY position
+    )
+    INSERT INTO history (conversation_id, author_type, message, chatbot_label, message_part_id)
+    SELECT conversation_id, author_type, message, chatbot_label, message_part_id
+    FROM unnest($5::text[], $6::text[], $7::text[], $8::text[], $9::text[]) WITH ORDINALITY
+        AS history_rows (conversation_id, author_type, message, chatbot_label, message_part_id, position)
+    ORDER BY position
+"""
+
 logger = Logger()
 
 
@@ -27,20 +58,36 @@ class AsyncPostgreSQLDatabase:
     def __init__(self) -> None:
         self.db_uri = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
         self.pool = None
+        self.export_pool = None
+        self.write_behind_buffer = WriteBehindBuffer(self._flush_write_behind_rows)
 
     async def connect(self, connection_timeout=ACQUIRE_A_CONNECTION_MAX_TIMEOUT) -> None:
         if not self.pool:
             self.pool = await asyncpg.create_pool(
                 self.db_uri, min_size=MIN_POOL_SIZE, max_size=MAX_POOL_SIZE, command_timeout=connection_timeout
             )
+        if not self.export_pool:
+            self.export_pool = await asyncpg.create_pool(
+                self.db_uri, min_size=0, max_size=EXPORT_POOL_SIZE, command_timeout=connection_timeout
+            )
+
+    def start_write_behind(self) -> None:
+        self.write_behind_buffer.start()
+
+    async def drain_write_behind(self) -> None:
+        await self.write_behind_buffer.drain()
 
     async def close_pool(self) -> None:
         if self.pool:
             await self.pool.close()
             self.pool = None
+        if self.export_pool:
+            await self.export_pool.close()
+            self.export_pool = None
 
     @postgresql_retry_strategy
     async def _fetch_query(self, query, *args, command_timeout=COMMAND_MAX_EXECUTION_TIMEOUT):
+        command_timeout = get_timeout(command_timeout)
         try:
             async with self.pool.acquire(timeout=command_timeout) as connection:
                 async with connection.transaction():
@@ -67,8 +114,33 @@ class AsyncPostgreSQLDatabase:
             )
             raise
 
+    async def _stream_query(self, query, *args, command_timeout=COMMAND_MAX_EXECUTION_TIMEOUT):
+        """
+        Yields rows through a server-side cursor on the export pool, so the result set is never held in memory at once.
+        The export fails after EXPORT_MAX_SECONDS, and Postgres ends it once the client stops reading for
+        EXPORT_IDLE_TIMEOUT_SECONDS.
+        """
+        export_deadline = monotonic() + EXPORT_MAX_SECONDS
+        try:
+            async with self.export_pool.acquire(timeout=command_timeout) as connection:
+                async with connection.transaction():
+                    await connection.execute(
+                        f"SET LOCAL idle_in_transaction_session_timeout = '{EXPORT_IDLE_TIMEOUT_SECONDS}s'"
+                    )
+                    async for record in connection.cursor(query, *args, prefetch=STREAM_CURSOR_PREFETCH):
+                        if monotonic() > export_deadline:
+                            raise TimeoutError(f"Export took longer than {EXPORT_MAX_SECONDS} seconds")
+                        yield record
+        except TimeoutError as e:
+            logger.log("TimeoutError occurred while streaming query", level=logging.ERROR, query=query, payload=e)
+            raise
+        except PostgresError as e:
+            logger.log("PostgresError occurred:", level=logging.ERROR, query=query, arguments=args, payload=e)
+            raise
+
     @postgresql_retry_strategy
     async def _insert_query(self, query, *args, command_timeout=COMMAND_MAX_EXECUTION_TIMEOUT) -> None:
+        command_timeout = get_timeout(command_timeout)
         try:
             async with self.pool.acquire(timeout=command_timeout) as connection:
                 async with connection.transaction():
@@ -98,37 +170,176 @@ class AsyncPostgreSQLDatabase:
             )
             raise
 
+    @postgresql_retry_strategy
+    async def _insert_many_query(
+        self, queries: List[Tuple[str, List[tuple]]], command_timeout=COMMAND_MAX_EXECUTION_TIMEOUT
+    ) -> bool:
+        command_timeout = get_timeout(command_timeout)
+        try:
+            async with self.pool.acquire(timeout=command_timeout) as connection:
+                async with connection.transaction():
+                    for query, rows in queries:
+                        await connection.executemany(query, rows, timeout=command_timeout)
+            return True
+        except TimeoutError as e:
+            logger.log(
+                "TimeoutError occurred while executing batch query",
+                level=logging.ERROR,
+                queries=[query for query, _ in queries],
+                payload=e,
+            )
+            raise
+        except PostgresError as e:
+            logger.log(
+                "PostgresError occurred:", level=logging.ERROR, queries=[query for query, _ in queries], payload=e
+            )
+            raise
+        except Exception as e:
+            logger.log(
+                "Unexpected error occurred during database batch operation:",
+                level=logging.ERROR,
+                queries=[query for query, _ in queries],
+                payload=e,
+            )
+            raise
+
+    async def _flush_write_behind_rows(self, rows: List[Tuple[str, tuple]]) -> bool:
+        rows_by_query: Dict[str, List[tuple]] = {}
+        for query, arguments in rows:
+            rows_by_query.setdefault(query, []).append(arguments)
+
+        return bool(await self._insert_many_query(list(rows_by_query.items())))
+
+    async def _write_behind_or_insert(self, query: str, *args) -> None:
+        if self.write_behind_buffer.is_running:
+            await self.write_behind_buffer.put((query, args))
+        else:
+            await self._insert_query(query, *args)
+
     async def insert_into_conversations_table(self, data: ConversationsTable) -> None:
         query = "INSERT INTO conversations (user_id, conversation_id) VALUES ($1, $2)"
         await self._insert_query(query, data.user_id, data.conversation_id)
 
     async def insert_into_events_table(self, data: EventsTable) -> None:
         query = "INSERT INTO events (conversation_id, event_type, payload, message_part_id) VALUES ($1, $2, $3, $4)"
-        await self._insert_query(query, data.conversation_id, data.event_type, data.payload, data.message_part_id)
+        await self._write_behind_or_insert(
+            query, data.conversation_id, data.event_type, data.payload, data.message_part_id
+        )
 
     async def insert_into_history_table(self, data: HistoryTable) -> None:
         query = "INSERT INTO history (conversation_id, author_type, message, chatbot_label, message_part_id) VALUES ($1, $2, $3, $4, $5)"
-        await self._insert_query(
+        await self._write_behind_or_insert(
             query, data.conversation_id, data.author_type, data.message, data.chatbot_label, data.message_part_id
         )
 
-    async def get_events_by_conversation_id(self, conversation_id: str):
+    async def insert_turn(self, events: List[EventsTable], history: List[HistoryTable]) -> None:
+        """Writes all events and history rows of one conversation turn with a single statement."""
+        await self._write_behind_or_insert(
+            INSERT_TURN_QUERY,
+            [event.conversation_id for event in events],
+            [event.event_type for event in events],
+            [event.payload for event in events],
+            [event.message_part_id for event in events],
+            [row.conversation_id for row in history],
+            [row.author_type for row in history],
+            [row.message for row in history],
+            [row.chatbot_label for row in history],
+            [row.message_part_id for row in history],
+        )
+
+    async def get_events_by_conversation_id(
+        self, conversation_id: str, page_size: int, after: Optional[Tuple[datetime, int]] = None
+    ):
+        query = f"""
+            SELECT id, conversation_id, event_type, payload, message_part_id, created_at
+            FROM events
+            WHERE conversation_id = $1 {KEYSET_CONDITION if after else ""}
+            ORDER BY created_at ASC, id ASC
+            LIMIT $2;
+        """
+        return await self._fetch_query(query, conversation_id, page_size, *(after or ()))
+
+    async def get_history_by_conversation_id(
+        self, conversation_id: str, page_size: int, after: Optional[Tuple[datetime, int]] = None
+    ):
+        query = f"""
+            SELECT id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at
+            FROM history
+            WHERE conversation_id = $1 {KEYSET_CONDITION if after else ""}
+            ORDER BY created_at ASC, id ASC
+            LIMIT $2;
+        """
+        return await self._fetch_query(query, conversation_id, page_size, *(after or ()))
+
+    async def stream_events_by_conversation_id(self, conversation_id: str) -> AsyncGenerator[asyncpg.Record, None]:
         query = """
             SELECT id, conversation_id, event_type, payload, message_part_id, created_at
             FROM events
             WHERE conversation_id = $1
-            ORDER BY created_at ASC;
+            ORDER BY created_at ASC, id ASC;
         """
-        return await self._fetch_query(query, conversation_id)
+        async for record in self._stream_query(query, conversation_id):
+            yield record
 
-    async def get_history_by_conversation_id(self, conversation_id: str):
+    async def stream_history_by_conversation_id(self, conversation_id: str) -> AsyncGenerator[asyncpg.Record, None]:
         query = """
             SELECT id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at
             FROM history
             WHERE conversation_id = $1
-            ORDER BY created_at ASC;
+            ORDER BY created_at ASC, id ASC;
+        """
+        async for record in self._stream_query(query, conversation_id):
+            yield record
+
+
+    async def create_monthly_partition(self, table_name: str, month_start: date) -> Optional[str]:
+        query = "SELECT create_monthly_partition($1, $2) AS partition_name;"
+        records = await self._fetch_query(query, table_name, month_start)
+        return records[0]["partition_name"] if records else None
+
+    async def get_partition_names(self, table_name: str) -> Optional[List[str]]:
+        query = """
+            SELECT child.relname AS partition_name
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = $1
+            ORDER BY child.relname;
         """
-        return await self._fetch_query(query, conversation_id)
+        records = await self._fetch_query(query, table_name)
+        return None if records is None else [record["partition_name"] for record in records]
+
+    async def archive_partition(self, partition_name: str, archive_path: str) -> int:
+        """Copies a partition into a gzip compressed CSV file and returns the number of archived rows."""
+        partial_archive_path = f"{archive_path}.partial"
+        try:
+            async with self.pool.acquire(timeout=ACQUIRE_A_CONNECTION_MAX_TIMEOUT) as connection:
+                with gzip.open(partial_archive_path, "wb") as archive_file:
+                    copy_status = await connection.copy_from_table(
+                        partition_name,
+                        output=archive_file,
+                        format="csv",
+                        header=True,
+                        timeout=PARTITION_MAINTENANCE_TIMEOUT,
+                    )
+        except (PostgresError, OSError) as e:
+            logger.log("Failed archiving partition", level=logging.ERROR, partition_name=partition_name, payload=e)
+            raise
+        os.replace(partial_archive_path, archive_path)
+        return int(copy_status.split()[-1])
+
+    async def drop_partition(self, table_name: str, partition_name: str) -> None:
+        try:
+            async with self.pool.acquire(timeout=ACQUIRE_A_CONNECTION_MAX_TIMEOUT) as connection:
+                async with connection.transaction():
+                    await connection.execute(
+                        f'ALTER TABLE "{table_name}" DETACH PARTITION "{partition_name}"',
+                        timeout=PARTITION_MAINTENANCE_TIMEOUT,
+                    )
+                    await connection.execute(f'DROP TABLE "{partition_name}"', timeout=PARTITION_MAINTENANCE_TIMEOUT)
+        except PostgresError as e:
+            logger.log("Failed dropping partition", level=logging.ERROR, partition_name=partition_name, payload=e)
+            raise
 
 
 postgres_database = AsyncPostgreSQLDatabase()
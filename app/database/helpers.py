@@ -1,16 +1,53 @@
+import logging
+from database.conversation_turn import current_conversation_turn
 from database.database_calls import postgres_database
 from database.database_models.history_table_model import HistoryTable, AuthorType
 from database.database_models.events_table_model import EventsTable, EventType
 from models.chat.chat_message_input_model import ChatMessage
 from models.gpt_function_param_model import DefaultGPTFunctionParams
 from models.handler_response_model import HandlerResponse
-from redis_services.redis_methods import get_assistant_part_id, get_user_part_id
+from helpers.tenacity_retry_strategies import PART_ID_ERROR_INDICATOR
+from utils.logger.logger import Logger
+
+logger = Logger()
+
+
+async def record_event(event: EventsTable) -> None:
+    conversation_turn = current_conversation_turn.get()
+    if conversation_turn:
+        conversation_turn.add_event(event)
+    else:
+        await postgres_database.insert_into_events_table(event)
+
+
+async def record_history(history: HistoryTable) -> None:
+    conversation_turn = current_conversation_turn.get()
+    if conversation_turn:
+        conversation_turn.add_history(history)
+    else:
+        await postgres_database.insert_into_history_table(history)
+
+
+def get_turn_user_part_id() -> str:
+    conversation_turn = current_conversation_turn.get()
+    if conversation_turn:
+        return conversation_turn.user_part_id
+    logger.log("Part id requested outside of a conversation turn", level=logging.WARNING, part_id="user_part_id")
+    return PART_ID_ERROR_INDICATOR
+
+
+def get_turn_assistant_part_id() -> str:
+    conversation_turn = current_conversation_turn.get()
+    if conversation_turn:
+        return conversation_turn.assistant_part_id
+    logger.log("Part id requested outside of a conversation turn", level=logging.WARNING, part_id="assistant_part_id")
+    return PART_ID_ERROR_INDICATOR
 
 
 async def log_user_message_interaction(user_id: str, conversation_id: str, message: ChatMessage) -> None:
-    user_part_id = await get_user_part_id(user_id)
+    user_part_id = get_turn_user_part_id()
 
-    await postgres_database.insert_into_events_table(
+    await record_event(
         EventsTable(
             conversation_id=conversation_id,
             event_type=EventType.USER,
@@ -19,7 +56,7 @@ async def log_user_message_interaction(user_id: str, conversation_id: str, messa
         )
     )
 
-    await postgres_database.insert_into_history_table(
+    await record_history(
         HistoryTable(
             conversation_id=conversation_id,
             author_type=AuthorType.USER,
@@ -33,9 +70,9 @@ async def log_user_message_interaction(user_id: str, conversation_id: str, messa
 async def log_chatbot_response_interaction(
     user_id: str, conversation_id: str, chatbot_response: HandlerResponse
 ) -> None:
-    assistant_part_id = await get_assistant_part_id(user_id)
+    assistant_part_id = get_turn_assistant_part_id()
 
-    await postgres_database.insert_into_events_table(
+    await record_event(
         EventsTable(
             conversation_id=conversation_id,
             event_type=EventType.ASSISTANT,
@@ -44,7 +81,7 @@ async def log_chatbot_response_interaction(
         )
     )
 
-    await postgres_database.insert_into_history_table(
+    await record_history(
         HistoryTable(
             conversation_id=conversation_id,
             author_type=AuthorType.ASSISTANT,
@@ -56,11 +93,11 @@ async def log_chatbot_response_interaction(
 
 
 async def insert_function_log(data: DefaultGPTFunctionParams, message_payload: dict):
-    await postgres_database.insert_into_events_table(
+    await record_event(
         EventsTable(
             conversation_id=data.conversation_id,
             event_type=EventType.FUNCTION_LOG,
-            message_part_id=await get_assistant_part_id(data.user_id),
+            message_part_id=get_turn_assistant_part_id(),
             payload={"content": message_payload},
         )
     )
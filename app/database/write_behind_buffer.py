@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+from time import time
+from typing import Any, Awaitable, Callable, List, Optional
+from utils.env_constants import WRITE_BEHIND_SPILL_PATH
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+WRITE_BEHIND_MAX_BATCH_SIZE = 200
+WRITE_BEHIND_FLUSH_INTERVAL_SECONDS = 0.5
+WRITE_BEHIND_MAX_QUEUE_SIZE = 10000
+WRITE_BEHIND_MAX_FLUSH_ATTEMPTS = 3
+WRITE_BEHIND_RETRY_DELAY_SECONDS = 1
+WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS = 10
+
+logger = Logger()
+metrics = Metrics()
+
+
+class WriteBehindBuffer:
+    """
+    Takes rows off the request path and hands them to flush_callback in batches.
+    A batch is flushed once it reaches max_batch_size rows or flush_interval seconds after its first row.
+    When the queue is full, put() waits, so producers slow down instead of growing memory without bound.
+    A failed batch is retried up to max_flush_attempts times, with backoff, before its rows are appended to spill_path
+    as JSON lines, from where they can be replayed.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[List[Any]], Awaitable[bool]],
+        max_batch_size: int = WRITE_BEHIND_MAX_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+        max_queue_size: int = WRITE_BEHIND_MAX_QUEUE_SIZE,
+        max_flush_attempts: int = WRITE_BEHIND_MAX_FLUSH_ATTEMPTS,
+        retry_delay: float = WRITE_BEHIND_RETRY_DELAY_SECONDS,
+        spill_path: str = WRITE_BEHIND_SPILL_PATH,
+    ) -> None:
+        self.flush_callback = flush_callback
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_flush_attempts = max_flush_attempts
+        self.retry_delay = retry_delay
+        self.spill_path = spill_path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flushing_batch: List[Any] = []
+
+    @property
+    def is_running(self) -> bool:
+        return self.flush_task is not None and not self.flush_task.done()
+
+    def start(self) -> None:
+        if not self.is_running:
+            self.flush_task = asyncio.create_task(self.run())
+
+    async def put(self, row: Any) -> None:
+        if self.queue.full():
+            metrics.increment("write_behind_backpressure_total")
+        await self.queue.put(row)
+        metrics.set_gauge("write_behind_queue_depth", self.queue.qsize())
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            flush_deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.max_batch_size:
+                remaining_time = flush_deadline - loop.time()
+                if remaining_time <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining_time))
+                except asyncio.TimeoutError:
+                    break
+
+            self.flushing_batch = batch
+            await self.flush(batch)
+            self.flushing_batch = []
+
+    async def flush(self, batch: List[Any]) -> None:
+        try:
+            for attempt in range(1, self.max_flush_attempts + 1):
+                if await self.try_flush(batch):
+                    return
+                if attempt < self.max_flush_attempts:
+                    metrics.increment("write_behind_flush_retries_total")
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+            metrics.increment("write_behind_failed_flushes_total")
+            # A spill that has started finishes in its thread even if drain() cancels us, so drain must not repeat it.
+            self.flushing_batch = []
+            await self.spill(batch)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+            metrics.set_gauge("write_behind_queue_depth", self.queue.qsize())
+
+    async def try_flush(self, batch: List[Any]) -> bool:
+        start_time = time()
+        try:
+            flushed = await self.flush_callback(batch)
+        except Exception as e:
+            logger.log("Write-behind flush failed", level=logging.WARNING, rows=len(batch), payload=e)
+            return False
+
+        if flushed:
+            metrics.observe("write_behind_flush_seconds", time() - start_time)
+            metrics.observe("write_behind_batch_size", len(batch))
+        return flushed
+
+    async def spill(self, rows: List[Any]) -> None:
+        try:
+            await asyncio.to_thread(self.write_spill_file, rows)
+        except Exception as e:
+            metrics.increment("write_behind_dropped_rows_total", len(rows))
+            logger.log(
+                "Write-behind rows could not be spilled, rows dropped", level=logging.ERROR, rows=rows, payload=e
+            )
+            return
+
+        metrics.increment("write_behind_spilled_rows_total", len(rows))
+        logger.log("Write-behind rows not written, spilled", level=logging.ERROR, rows=len(rows), path=self.spill_path)
+
+    def write_spill_file(self, rows: List[Any]) -> None:
+        with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+            for row in rows:
+                spill_file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+    async def drain(self, timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS) -> None:
+        """Waits up to timeout seconds for the queued rows to be flushed. Rows still unwritten then are spilled."""
+        if self.flush_task is None:
+            return
+
+        join_task = asyncio.create_task(self.queue.join())
+        await asyncio.wait({join_task, self.flush_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        join_task.cancel()
+        if self.flush_task.done() and not self.flush_task.cancelled() and self.flush_task.exception():
+            logger.log("Write-behind flush task failed", level=logging.ERROR, payload=self.flush_task.exception())
+
+        self.flush_task.cancel()
+        await asyncio.gather(join_task, self.flush_task, return_exceptions=True)
+        self.flush_task = None
+
+        unwritten_rows = self.flushing_batch
+        while not self.queue.empty():
+            unwritten_rows.append(self.queue.get_nowait())
+            self.queue.task_done()
+        if unwritten_rows:
+            logger.log("Write-behind drain timed out", level=logging.ERROR, rows=len(unwritten_rows))
+            await self.spill(unwritten_rows)
+        self.flushing_batch = []
@@ -1,27 +1,38 @@
+import asyncio
+import logging
+import httpx
 from abc import ABC, abstractmethod
-from typing import List, Dict
-from openai.types.chat import ChatCompletion, ChatCompletionMessageToolCall
-from database.database_calls import postgres_database
+from contextlib import aclosing
+from time import time
+from typing import List, Dict, Optional, AsyncGenerator, Tuple, Union
+from fastapi import HTTPException, status
+from openai import APIError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+from database.helpers import record_event, get_turn_assistant_part_id
 from database.database_models.events_table_model import EventsTable, EventType
 from api.external.gpt_clients.gpt_enums import GPTRole, GPTTeamNames, GPTActionNames, GPTChatbotNames, GPTTemperature
-from helpers.gpt_helper import trim_to_earliest_user_message
+from helpers.context_builder import build_context
+from helpers.custom_exceptions import InvalidGPTResponseException
+from helpers.deadline import check_deadline
+from helpers.gpt_helper import trim_to_earliest_user_message, build_summary_messages
+from helpers.tenacity_retry_strategies import openai_tools_calling_retry_strategy
 from models.handler_config_model import HandlerConfigModel
 from redis_services.redis_message_formatter import filter_history_messages
 from models.gpt_function_param_model import DefaultGPTFunctionParams
 from models.handler_response_model import HandlerResponse
 from models.redis_messages_model import RedisMessages
+from redis_services.conversation_snapshot import ConversationSnapshot
 from utils.logger.logger import Logger
-from redis_services.redis_methods import (
-    push_message_to_redis,
-    get_assistant_part_id,
-    fetch_latest_conversation_messages,
-)
+from utils.metrics.metrics import Metrics
+from redis_services.redis_methods import push_message_to_redis
 from models.chat.chat_message_input_model import ChatMessage
 from utils.get_handler_functions import compile_function_metadata, compile_function_map
 from api.external.gpt_clients.openai.openai_client import OpenAIChat
 from api.external.gpt_clients.openai.openai_enums import OpenAIModel
 
 logger = Logger()
+metrics = Metrics()
 openai_client = OpenAIChat()
 
 
@@ -30,9 +41,13 @@ class BaseChatHandler(ABC):
     function_meta = None
     function_map = None
 
-    def __init__(self, handler_config: HandlerConfigModel):
+    def __init__(self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot):
         self.user_id = handler_config.user_id
         self.conversation_id = handler_config.conversation_id
+        self.conversation_snapshot = conversation_snapshot
+        self.side_effects_allowed = asyncio.Event()
+        self.side_effects_allowed.set()
+        self.side_effects_blocked_at: Optional[float] = None
 
     @classmethod
     async def ensure_function_data_loaded(cls) -> None:
@@ -57,6 +72,27 @@ class BaseChatHandler(ABC):
     async def handle(self, message: ChatMessage) -> HandlerResponse:
         pass
 
+    @abstractmethod
+    async def handle_stream(self, message: ChatMessage) -> AsyncGenerator[Union[str, HandlerResponse], None]:
+        """Yields the response message token by token, followed by the final HandlerResponse."""
+        yield
+
+    @abstractmethod
+    async def process_tool_calls(self, tool_calls: List[ChatCompletionMessageToolCall]) -> None:
+        pass
+
+    def hold_side_effects(self) -> None:
+        """Used for speculative runs: the handler may call GPT, but must not write to Redis or Postgres."""
+        self.side_effects_allowed.clear()
+
+    def release_side_effects(self) -> None:
+        self.side_effects_allowed.set()
+
+    async def wait_for_side_effects_permission(self) -> None:
+        if not self.side_effects_allowed.is_set():
+            self.side_effects_blocked_at = time()
+            await self.side_effects_allowed.wait()
+
     def log_message(self, message_content: str, **kwargs) -> None:
         log_fields = {
             "user_id": self.user_id,
@@ -67,25 +103,33 @@ class BaseChatHandler(ABC):
         logger.log(message_content, **log_fields)
 
     async def get_latest_conversation_messages_history(self) -> List[Dict]:
-        conversation_messages = await filter_history_messages(
-            await fetch_latest_conversation_messages(conversation_id=self.conversation_id)
-        )
+        conversation_messages = await filter_history_messages(self.conversation_snapshot.get_latest_messages())
 
         return await trim_to_earliest_user_message(conversation_messages)
 
-    async def format_chat_history_with_prompt(self) -> List[Dict]:
-        return [
-            {"role": GPTRole.SYSTEM, "content": await self.get_system_description()}
-        ] + await self.get_latest_conversation_messages_history()
+    async def format_chat_history_with_prompt(self, action_name: GPTActionNames) -> List[Dict]:
+        return build_context(
+            [{"role": GPTRole.SYSTEM, "content": await self.get_system_description()}]
+            + build_summary_messages(self.conversation_snapshot),
+            await self.get_latest_conversation_messages_history(),
+            action_name,
+            await self.get_model(),
+            tools=self.function_meta,
+        )
 
     async def push_function_response_to_redis(self, message: RedisMessages) -> None:
-        return await push_message_to_redis(user_id=self.user_id, conversation_id=self.conversation_id, message=message)
+        return await push_message_to_redis(
+            user_id=self.user_id,
+            conversation_id=self.conversation_id,
+            message=message,
+            conversation_snapshot=self.conversation_snapshot,
+        )
 
     async def get_gpt_with_tools_response(
         self, action_name: GPTActionNames, team_name: GPTTeamNames, chatbot_name: GPTChatbotNames
     ) -> ChatCompletion:
         return await openai_client.get_response_with_tools(
-            messages=await self.format_chat_history_with_prompt(),
+            messages=await self.format_chat_history_with_prompt(action_name),
             action_name=action_name,
             team_name=team_name,
             chatbot_name=chatbot_name,
@@ -94,8 +138,112 @@ class BaseChatHandler(ABC):
             temperature=self.get_temperature(),
         )
 
+    async def stream_gpt_response(
+        self,
+        action_name: GPTActionNames,
+        team_name: GPTTeamNames,
+        chatbot_name: GPTChatbotNames,
+        max_loop_count: int,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streaming counterpart of process_gpt_response. Tool call iterations are assembled from the stream and
+        processed as usual; the content of the answer is yielded as soon as GPT produces it.
+        """
+        for _ in range(max_loop_count):
+            check_deadline()
+            tool_calls, first_content, chunks = await self.start_gpt_stream(action_name, team_name, chatbot_name)
+
+            if tool_calls:
+                await self.process_tool_calls(tool_calls)
+                continue
+            if first_content is None:
+                continue
+
+            yield first_content
+            ignored_tool_calls = False
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    check_deadline()
+                    delta = chunk.choices[0].delta
+                    ignored_tool_calls = ignored_tool_calls or bool(delta.tool_calls)
+                    if delta.content:
+                        yield delta.content
+
+            if ignored_tool_calls:
+                metrics.increment("stream_ignored_tool_calls_total", action_name=action_name)
+                self.log_message(
+                    "GPT called tools after its streamed answer, tool calls ignored", level=logging.WARNING
+                )
+            return
+
+        self.log_message(f"GPT failed to provide a string response {max_loop_count} times in a row")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"GPT Failed to respond {max_loop_count} times"
+        )
+
+    @openai_tools_calling_retry_strategy
+    async def start_gpt_stream(
+        self, action_name: GPTActionNames, team_name: GPTTeamNames, chatbot_name: GPTChatbotNames
+    ) -> Tuple[List[ChatCompletionMessageToolCall], Optional[str], Optional[AsyncGenerator[ChatCompletionChunk, None]]]:
+        """
+        Reads a streamed GPT response until its first delta shows whether it is an answer or a tool call iteration.
+        Tool call iterations are read to the end, and content before their tool calls is dropped, as in
+        process_gpt_response. Answers are returned with their first content and the rest of the stream.
+        Nothing has been sent to the user up to that point, so a stream that fails in here is retried.
+        """
+        chunks = openai_client.stream_response_with_tools(
+            messages=await self.format_chat_history_with_prompt(action_name),
+            action_name=action_name,
+            team_name=team_name,
+            chatbot_name=chatbot_name,
+            tools=self.function_meta,
+            model=await self.get_model(),
+            temperature=self.get_temperature(),
+        )
+        tool_calls_by_index: Dict[int, Dict] = {}
+        first_content = None
+
+        try:
+            async for chunk in chunks:
+                check_deadline()
+                delta = chunk.choices[0].delta
+
+                if delta.content and not tool_calls_by_index:
+                    first_content = delta.content
+                    break
+
+                for tool_call_delta in delta.tool_calls or []:
+                    tool_call = tool_calls_by_index.setdefault(
+                        tool_call_delta.index, {"id": None, "name": "", "arguments": ""}
+                    )
+                    if tool_call_delta.id:
+                        tool_call["id"] = tool_call_delta.id
+                    if tool_call_delta.function and tool_call_delta.function.name:
+                        tool_call["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function and tool_call_delta.function.arguments:
+                        tool_call["arguments"] += tool_call_delta.function.arguments
+        except (APIError, httpx.HTTPError) as e:
+            self.log_message("GPT response stream failed", level=logging.WARNING, payload=str(e))
+            raise InvalidGPTResponseException("GPT response stream failed.") from e
+        finally:
+            if first_content is None:
+                await chunks.aclose()
+
+        if first_content is not None:
+            return [], first_content, chunks
+
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=tool_call["id"],
+                type="function",
+                function=Function(name=tool_call["name"], arguments=tool_call["arguments"]),
+            )
+            for _, tool_call in sorted(tool_calls_by_index.items())
+        ]
+        return tool_calls, None, None
+
     async def insert_tool_call_into_events_table(self, tool_calls: List[ChatCompletionMessageToolCall]) -> None:
-        await postgres_database.insert_into_events_table(
+        await record_event(
             EventsTable(
                 conversation_id=self.conversation_id,
                 event_type=EventType.TOOL_CALL,
@@ -109,7 +257,7 @@ class BaseChatHandler(ABC):
                         for tool_call in tool_calls
                     ],
                 },
-                message_part_id=await get_assistant_part_id(self.user_id),
+                message_part_id=get_turn_assistant_part_id(),
             )
         )
 
@@ -2,10 +2,10 @@ import asyncio
 import logging
 import os
 import traceback
-from typing import List, Union
+from typing import AsyncGenerator, List, Union
 from fastapi import HTTPException, status
 from openai.types.chat import ChatCompletionMessageToolCall, ChatCompletion
-from database.database_calls import postgres_database
+from database.helpers import record_event, get_turn_assistant_part_id
 from database.database_models.events_table_model import EventsTable, EventType
 from handlers.base_handler import BaseChatHandler
 from api.external.gpt_clients.gpt_enums import (
@@ -15,6 +15,7 @@ from api.external.gpt_clients.gpt_enums import (
     GPTTemperature,
 )
 from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from helpers.deadline import check_deadline
 from helpers.tenacity_retry_strategies import openai_tools_calling_retry_strategy
 from helpers.custom_exceptions import InvalidGPTResponseException
 from models.handler_config_model import HandlerConfigModel
@@ -31,7 +32,7 @@ from models.handler_response_model import (
     HandlerResponseStatus,
 )
 from models.redis_messages_model import RedisMessages
-from redis_services.redis_methods import get_assistant_part_id, get_conversation_metadata
+from redis_services.conversation_snapshot import ConversationSnapshot
 
 logger = logging.getLogger(__name__)
 
@@ -41,8 +42,8 @@ MAX_LOOP_COUNT = 4
 class DomainChatHandler(BaseChatHandler):
     functions_dir = os.path.dirname(__file__)
 
-    def __init__(self, handler_config: HandlerConfigModel):
-        super().__init__(handler_config)
+    def __init__(self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot):
+        super().__init__(handler_config, conversation_snapshot)
         self.handoff_support = False
 
     def get_temperature(self) -> GPTTemperature:
@@ -58,7 +59,7 @@ class DomainChatHandler(BaseChatHandler):
         Keep your responses short and simple, up to 3 sentences.
         Your answers must be in markdown format."""
 
-        conversation_metadata = await get_conversation_metadata(self.conversation_id, self.user_id)
+        conversation_metadata = self.conversation_snapshot.metadata
 
         if conversation_metadata and conversation_metadata.domain_name:
             system_description += (
@@ -82,6 +83,26 @@ class DomainChatHandler(BaseChatHandler):
 
         return HandlerResponse(status=HandlerResponseStatus.SUCCESS, message=gpt_response_message)
 
+    async def handle_stream(self, message: ChatMessage) -> AsyncGenerator[Union[str, HandlerResponse], None]:
+        if self.function_meta is None or self.function_map is None:
+            await self.ensure_function_data_loaded()
+
+        response_tokens = []
+        async for token in self.stream_gpt_response(
+            action_name=GPTActionNames.TOOLS_CALL_DOMAINS_ACTION_NAME,
+            team_name=GPTTeamNames.AI,
+            chatbot_name=GPTChatbotNames.DOMAIN,
+            max_loop_count=MAX_LOOP_COUNT,
+        ):
+            response_tokens.append(token)
+            yield token
+
+        if self.handoff_support:
+            yield HandlerResponse(status=HandlerResponseStatus.SUPPORT_HANDOFF, message="".join(response_tokens))
+            return
+
+        yield HandlerResponse(status=HandlerResponseStatus.SUCCESS, message="".join(response_tokens))
+
     @openai_tools_calling_retry_strategy
     async def get_gpt_response(self) -> ChatCompletion:
         gpt_response = await self.get_gpt_with_tools_response(
@@ -98,6 +119,7 @@ class DomainChatHandler(BaseChatHandler):
 
     async def process_gpt_response(self) -> Union[str, None]:
         for _ in range(MAX_LOOP_COUNT):
+            check_deadline()
             gpt_response = await self.get_gpt_response()
             gpt_message = gpt_response.choices[0].message
 
@@ -113,6 +135,8 @@ class DomainChatHandler(BaseChatHandler):
         )
 
     async def process_tool_calls(self, tool_calls: List[ChatCompletionMessageToolCall]) -> None:
+        await self.wait_for_side_effects_permission()
+
         await self.insert_tool_call_into_events_table(tool_calls)
 
         if not await self.is_gpt_generated_tools_valid(tool_calls):
@@ -147,7 +171,7 @@ class DomainChatHandler(BaseChatHandler):
             function_response: GPTFunctionOutput = await function_to_call(default_function_arguments, **gpt_arguments)
 
             self.log_message(f"Function {gpt_function_name} response: {function_response.to_dict()}")
-            await postgres_database.insert_into_events_table(
+            await record_event(
                 EventsTable(
                     conversation_id=self.conversation_id,
                     event_type=EventType.FUNCTION_RESPONSE,
@@ -157,7 +181,7 @@ class DomainChatHandler(BaseChatHandler):
                             **function_response.to_dict(),
                         }
                     },
-                    message_part_id=await get_assistant_part_id(self.user_id),
+                    message_part_id=get_turn_assistant_part_id(),
                 )
             )
 
@@ -180,7 +204,7 @@ class DomainChatHandler(BaseChatHandler):
                 traceback=tb_str,
                 level=logging.ERROR,
             )
-            await postgres_database.insert_into_events_table(
+            await record_event(
                 EventsTable(
                     conversation_id=self.conversation_id,
                     event_type=EventType.FUNCTION_ERROR,
@@ -190,7 +214,7 @@ class DomainChatHandler(BaseChatHandler):
                             "error_message": str(exception),
                         }
                     },
-                    message_part_id=await get_assistant_part_id(self.user_id),
+                    message_part_id=get_turn_assistant_part_id(),
                 )
             )
             return await get_mocked_failed_function_response(tool_call.id)
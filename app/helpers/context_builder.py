@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import tiktoken
+from time import monotonic
+from typing import Any, Dict, List, Optional, Set
+from api.external.gpt_clients.gpt_enums import GPTActionNames
+from models.chat.chat_message_input_model import InputRole
+from utils.env_constants import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS
+from utils.logger.logger import Logger
+
+# Fixed overhead of the chat format, as documented by OpenAI for the gpt-4 and gpt-4o model families.
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+CHARACTERS_PER_TOKEN = 4
+DEFAULT_ENCODING = "o200k_base"
+ENCODING_RETRY_SECONDS = 60
+
+DEFAULT_CONTEXT_TOKEN_BUDGETS = {
+    GPTActionNames.CHATBOT_LABEL_ACTION_NAME: 4000,
+    GPTActionNames.HANDOFF_DECIDER_ACTION: 4000,
+    GPTActionNames.HANDOFF_MESSAGE_ACTION: 4000,
+    GPTActionNames.FUSED_ROUTER_ACTION: 4000,
+    GPTActionNames.TOOLS_CALL_DOMAINS_ACTION_NAME: 12000,
+    GPTActionNames.TOOLS_CALL_OOS_ACTION_NAME: 12000,
+}
+
+logger = Logger()
+
+# Encodings are loaded off the event loop, as tiktoken downloads them on first use. Until one is loaded its tokens
+# are estimated from the text length.
+encodings: Dict[str, tiktoken.Encoding] = {}
+encoding_retry_at: Dict[str, float] = {}
+encoding_load_tasks: Set[asyncio.Task] = set()
+
+
+def parse_token_budgets(token_budgets: str) -> Dict[str, int]:
+    """Parses "action_name:tokens,action_name:tokens" overrides from the environment."""
+    parsed_budgets = {}
+    for token_budget in filter(None, (part.strip() for part in token_budgets.split(","))):
+        action_name, _, tokens = token_budget.partition(":")
+        parsed_budgets[action_name.strip()] = int(tokens)
+    return parsed_budgets
+
+
+context_token_budgets: Dict[str, int] = {**DEFAULT_CONTEXT_TOKEN_BUDGETS, **parse_token_budgets(CONTEXT_TOKEN_BUDGETS)}
+
+
+def get_context_token_budget(action_name: GPTActionNames) -> int:
+    return context_token_budgets.get(action_name, CONTEXT_TOKEN_BUDGET)
+
+
+def get_encoding_name(model: str) -> str:
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
+async def load_encoding(encoding_name: str) -> bool:
+    """A failed load is retried by get_encoding after ENCODING_RETRY_SECONDS, so it is not given up on for good."""
+    encoding_retry_at[encoding_name] = monotonic() + ENCODING_RETRY_SECONDS
+    try:
+        encodings[encoding_name] = await asyncio.to_thread(tiktoken.get_encoding, encoding_name)
+        return True
+    except Exception as e:
+        logger.log(
+            "Tokenizer unavailable, estimating tokens", level=logging.WARNING, encoding_name=encoding_name, payload=e
+        )
+        return False
+
+
+async def load_encodings(models: List[str]) -> None:
+    """Called at startup with the models in use, so the first requests do not wait for the download."""
+    encoding_names = {get_encoding_name(model) for model in models}
+    await asyncio.gather(*(load_encoding(encoding_name) for encoding_name in encoding_names))
+
+
+def get_encoding(model: str) -> Optional[tiktoken.Encoding]:
+    """Returns None while the encoding is not loaded, and schedules a load unless one was attempted recently."""
+    encoding_name = get_encoding_name(model)
+    encoding = encodings.get(encoding_name)
+    if encoding is not None or monotonic() < encoding_retry_at.get(encoding_name, 0):
+        return encoding
+    # Reserved before the load starts, so the other calls in this event loop tick do not schedule one as well.
+    encoding_retry_at[encoding_name] = monotonic() + ENCODING_RETRY_SECONDS
+    try:
+        load_task = asyncio.get_running_loop().create_task(load_encoding(encoding_name))
+    except RuntimeError:
+        return None
+    encoding_load_tasks.add(load_task)
+    load_task.add_done_callback(encoding_load_tasks.discard)
+    return None
+
+
+def count_text_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARACTERS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: Dict[str, Any], model: str) -> int:
+    tokens = TOKENS_PER_MESSAGE
+    for field_name, value in message.items():
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False)
+        tokens += count_text_tokens(value, model)
+    return tokens
+
+
+def count_tools_tokens(tools: Optional[List[Dict[str, Any]]], model: str) -> int:
+    """OpenAI renders tool schemas into the prompt in its own format; their JSON is a close enough estimate."""
+    if not tools:
+        return 0
+    return count_text_tokens(json.dumps(tools, ensure_ascii=False), model)
+
+
+def count_prompt_tokens(messages: List[Dict], model: str, tools: Optional[List[Dict[str, Any]]] = None) -> int:
+    return (
+        sum(count_message_tokens(message, model) for message in messages)
+        + count_tools_tokens(tools, model)
+        + TOKENS_PER_REPLY
+    )
+
+
+def drop_oldest_user_turn(history_messages: List[Dict]) -> List[Dict]:
+    """
+    Removes messages up to the second user message, so the history still starts with a user message and
+    assistant tool calls are never separated from their tool responses.
+    """
+    for index in range(1, len(history_messages)):
+        if history_messages[index].get("role") == InputRole.USER:
+            return history_messages[index:]
+    return history_messages
+
+
+def build_context(
+    prompt_messages: List[Dict],
+    history_messages: List[Dict],
+    action_name: GPTActionNames,
+    model: str,
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict]:
+    """
+    Returns the prompt messages followed by as much of the most recent history as fits into the action's token
+    budget. The prompt messages, which include the rolling summary of compacted messages, are always kept,
+    as is the latest user turn.
+    """
+    token_budget = get_context_token_budget(action_name)
+    fixed_tokens = count_prompt_tokens(prompt_messages, model, tools)
+    history_tokens = [count_message_tokens(message, model) for message in history_messages]
+    total_tokens = fixed_tokens + sum(history_tokens)
+
+    trimmed_history = history_messages
+    while total_tokens > token_budget:
+        shorter_history = drop_oldest_user_turn(trimmed_history)
+        if len(shorter_history) == len(trimmed_history):
+            break
+        dropped_count = len(trimmed_history) - len(shorter_history)
+        first_kept_index = len(history_messages) - len(trimmed_history)
+        total_tokens -= sum(history_tokens[first_kept_index : first_kept_index + dropped_count])
+        trimmed_history = shorter_history
+
+    if len(trimmed_history) != len(history_messages) or total_tokens > token_budget:
+        logger.log(
+            "Conversation context trimmed to token budget",
+            level=logging.WARNING if total_tokens > token_budget else logging.INFO,
+            action_name=action_name,
+            token_budget=token_budget,
+            predicted_prompt_tokens=total_tokens,
+            dropped_messages=len(history_messages) - len(trimmed_history),
+        )
+
+    return prompt_messages + trimmed_history
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from api.external.gpt_clients.gpt_enums import GPTActionNames, GPTRole, GPTTeamNames, GPTTemperature
+from api.external.gpt_clients.openai.openai_client import OpenAIChat
+from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from helpers.deadline import clear_deadline
+from models.chat.chat_message_output_model import OutputRole
+from redis_services.conversation_snapshot import ConversationSnapshot
+from redis_services.redis_message_formatter import filter_history_messages
+from redis_services.redis_methods import compact_conversation, load_conversation
+from redis_services.redis_enums import ConversationField
+from utils.env_constants import CONVERSATION_COMPACTION_THRESHOLD, CONVERSATION_WINDOW_SIZE
+from utils.logger.logger import Logger
+
+SUMMARY_MAX_TOKENS = 400
+
+logger = Logger()
+openai_client = OpenAIChat()
+
+# One compaction at a time per user in this process; a turn that ends while one is running does not start another.
+# Across processes, compact_conversation only applies the summary if no other compaction finished in the meantime.
+compaction_tasks: Dict[str, asyncio.Task] = {}
+
+
+def get_conversation_summary_prompt() -> str:
+    return """You maintain a running summary of a customer support conversation between a user and the Hostinger
+    AI assistant Kodee. You receive the current summary, which may be empty, and the messages that follow it.
+    Write an updated summary that keeps the user's goals, the domains, products and account details they mentioned,
+    what was already tried or answered, and anything still unresolved.
+    Write at most 8 short sentences in English, without greetings or commentary."""
+
+
+def schedule_conversation_compaction(user_id: str, conversation_snapshot: ConversationSnapshot) -> None:
+    """Starts compaction in the background once the list has grown past the window by the compaction threshold."""
+    if len(conversation_snapshot.messages) <= CONVERSATION_WINDOW_SIZE + CONVERSATION_COMPACTION_THRESHOLD:
+        return
+    if user_id in compaction_tasks:
+        return
+
+    compaction_task = asyncio.create_task(compact_conversation_history(user_id))
+    compaction_tasks[user_id] = compaction_task
+    compaction_task.add_done_callback(lambda _task: compaction_tasks.pop(user_id, None))
+
+
+async def compact_conversation_history(user_id: str) -> None:
+    clear_deadline()
+    try:
+        conversation = await load_conversation(user_id)
+        if not conversation:
+            return
+
+        conversation_fields, messages = conversation
+        conversation_id = conversation_fields.get(ConversationField.CONVERSATION_ID)
+        overflowing_messages = messages[: max(0, len(messages) - CONVERSATION_WINDOW_SIZE)]
+        if not conversation_id or not overflowing_messages:
+            return
+
+        summary = await summarize_messages(conversation_fields.get(ConversationField.SUMMARY), overflowing_messages)
+        if not summary:
+            return
+
+        summary_generation = conversation_fields.get(ConversationField.SUMMARY_GENERATION, "0")
+        compacted = await compact_conversation(
+            user_id, conversation_id, summary, len(overflowing_messages), summary_generation
+        )
+        logger.log(
+            "Conversation compacted",
+            user_id=user_id,
+            conversation_id=conversation_id,
+            compacted=compacted,
+            compacted_messages=len(overflowing_messages),
+            summary_length=len(summary),
+        )
+    except Exception as exception:
+        logger.log("Conversation compaction failed", level=logging.ERROR, user_id=user_id, payload=exception)
+
+
+async def summarize_messages(previous_summary: Optional[str], messages: List[Dict]) -> Optional[str]:
+    conversation_messages = await filter_history_messages(
+        messages,
+        exclude_fields=["tool_calls"],
+        exclude_if_field_matches={"role": OutputRole.TOOL},
+    )
+    transcript = "\n".join(f"{message['role']}: {message.get('content', '')}" for message in conversation_messages)
+
+    gpt_response = await openai_client.get_response(
+        messages=[
+            {"role": GPTRole.SYSTEM, "content": get_conversation_summary_prompt()},
+            {
+                "role": GPTRole.USER,
+                "content": f"Current summary:\n{previous_summary or ''}\n\nMessages:\n{transcript}",
+            },
+        ],
+        action_name=GPTActionNames.CONVERSATION_SUMMARY_ACTION,
+        team_name=GPTTeamNames.AI,
+        model=OpenAIModel.GPT_4O_2024_08_06,
+        temperature=GPTTemperature.ZERO,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+
+    if not gpt_response:
+        return None
+    return gpt_response.choices[0].message.content
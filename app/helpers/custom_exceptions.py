@@ -1,2 +1,12 @@
+from fastapi import HTTPException, status
+
+
 class InvalidGPTResponseException(Exception):
     """Exception for invalid or incorrectly formatted GPT responses."""
+
+
+class DeadlineExceededException(HTTPException):
+    """Raised when the request deadline is exhausted, so no further work is started for the request."""
+
+    def __init__(self, detail: str = "Request deadline exceeded") -> None:
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=detail)
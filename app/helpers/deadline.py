@@ -0,0 +1,71 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from typing import Awaitable, Iterator, Optional, TypeVar
+from helpers.custom_exceptions import DeadlineExceededException
+from utils.env_constants import REQUEST_DEADLINE_SECONDS
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request has to be answered. None outside of requests and in background work.
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+async def start_request_deadline() -> None:
+    """FastAPI dependency giving every request of the router REQUEST_DEADLINE_SECONDS to finish."""
+    current_deadline.set(monotonic() + REQUEST_DEADLINE_SECONDS)
+
+
+def clear_deadline() -> None:
+    """Background tasks copy the context of the request that created them, but must not be bound by its deadline."""
+    current_deadline.set(None)
+
+
+@contextmanager
+def without_deadline() -> Iterator[None]:
+    """For work that has to finish even after the request ran out of time, like saving the turn."""
+    token = current_deadline.set(None)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def get_remaining_time() -> Optional[float]:
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - monotonic()
+
+
+def check_deadline() -> None:
+    remaining_time = get_remaining_time()
+    if remaining_time is not None and remaining_time <= 0:
+        raise DeadlineExceededException()
+
+
+def get_timeout(default_timeout: float) -> float:
+    """The default timeout, shortened to the time left until the deadline. Raises once the deadline is exhausted."""
+    check_deadline()
+    remaining_time = get_remaining_time()
+    return default_timeout if remaining_time is None else min(default_timeout, remaining_time)
+
+
+async def run_within_deadline(awaitable: Awaitable[T], default_timeout: float) -> T:
+    """
+    Awaits with get_timeout(default_timeout). Raises DeadlineExceededException when the deadline cut the wait short,
+    or TimeoutError when the default timeout did.
+    """
+    try:
+        timeout = get_timeout(default_timeout)
+    except DeadlineExceededException:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except TimeoutError:
+        check_deadline()
+        raise
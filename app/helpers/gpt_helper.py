@@ -1,13 +1,15 @@
 import json
 from typing import Dict, Any, List, Union
 from openai.types.chat import ChatCompletionMessageToolCall
-from api.external.gpt_clients.gpt_enums import GPTRole, GPTTemperature
+from api.external.gpt_clients.gpt_enums import GPTRole, GPTTemperature, GPTActionNames
+from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from helpers.context_builder import build_context
 from models.chat.chat_message_input_model import InputRole
 from models.redis_messages_model import RedisMessages
 from redis_services.redis_message_formatter import filter_history_messages
 from models.chat.chat_message_output_model import OutputRole
 from utils.logger.logger import Logger
-from redis_services.redis_methods import fetch_entire_conversation_history
+from redis_services.conversation_snapshot import ConversationSnapshot
 
 logger = Logger()
 
@@ -20,13 +22,35 @@ def decode_json_string(json_string):
         return None
 
 
-async def get_conversation_history_with_system_prompt(system_description: str, conversation_id: str) -> list[dict]:
+async def get_conversation_history_with_system_prompt(
+    system_description: str,
+    conversation_snapshot: ConversationSnapshot,
+    action_name: GPTActionNames,
+    model: OpenAIModel,
+) -> list[dict]:
     historical_messages = await filter_history_messages(
-        await fetch_entire_conversation_history(conversation_id=conversation_id),
+        conversation_snapshot.get_entire_history(),
         exclude_fields=["tool_calls"],
         exclude_if_field_matches={"role": OutputRole.TOOL},
     )
-    return [{"role": GPTRole.SYSTEM, "content": system_description}] + historical_messages
+    return build_context(
+        [{"role": GPTRole.SYSTEM, "content": system_description}] + build_summary_messages(conversation_snapshot),
+        historical_messages,
+        action_name,
+        model,
+    )
+
+
+def build_summary_messages(conversation_snapshot: ConversationSnapshot) -> List[Dict]:
+    """Messages that were compacted out of the conversation window are passed to GPT as their rolling summary."""
+    if not conversation_snapshot.summary:
+        return []
+    return [
+        {
+            "role": GPTRole.SYSTEM,
+            "content": f"Summary of the earlier part of this conversation:\n{conversation_snapshot.summary}",
+        }
+    ]
 
 
 async def trim_to_earliest_user_message(history_data: List[Dict]) -> List[Dict]:
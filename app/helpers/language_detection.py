@@ -0,0 +1,83 @@
+import re
+from typing import Dict, List, Set, Tuple
+
+DEFAULT_LANGUAGE = "en"
+MINIMUM_STOPWORD_MATCHES = 2
+
+# Languages written in their own script are recognised by the first character of that script.
+SCRIPT_LANGUAGES: List[Tuple[str, str]] = [
+    ("ja", r"[぀-ヿ]"),
+    ("ko", r"[가-힯]"),
+    ("zh", r"[一-鿿]"),
+    ("th", r"[฀-๿]"),
+    ("ar", r"[؀-ۿ]"),
+    ("he", r"[֐-׿]"),
+    ("hi", r"[ऀ-ॿ]"),
+    ("el", r"[Ͱ-Ͽ]"),
+    ("uk", r"[іїєґІЇЄҐ]"),
+    ("ru", r"[Ѐ-ӿ]"),
+]
+
+# Latin script languages are told apart by their most frequent short words.
+LANGUAGE_STOPWORDS: Dict[str, Set[str]] = {
+    "en": {"the", "is", "and", "to", "my", "i", "you", "it", "have", "can", "not", "with", "how", "what", "please"},
+    "es": {"el", "la", "de", "que", "y", "en", "los", "mi", "por", "para", "es", "no", "con", "como", "quiero"},
+    "pt": {"o", "a", "de", "que", "e", "não", "meu", "minha", "para", "com", "um", "uma", "como", "é", "está"},
+    "fr": {"le", "la", "les", "de", "et", "je", "est", "mon", "pas", "pour", "que", "avec", "une", "vous", "comment"},
+    "de": {"der", "die", "das", "und", "ich", "ist", "nicht", "mein", "ein", "eine", "mit", "wie", "zu", "bitte"},
+    "it": {"il", "di", "che", "e", "non", "mio", "per", "un", "una", "sono", "come", "con", "della", "voglio"},
+    "id": {"yang", "dan", "saya", "tidak", "ini", "itu", "untuk", "dengan", "bagaimana", "apa", "ada", "bisa"},
+    "lt": {"ir", "kad", "ne", "mano", "yra", "kaip", "su", "man", "noriu", "domeno", "į", "ar", "labas"},
+    "pl": {"i", "nie", "jest", "się", "w", "na", "z", "mój", "moja", "jak", "to", "co", "chcę", "proszę"},
+    "nl": {"de", "het", "een", "en", "ik", "niet", "is", "mijn", "van", "met", "hoe", "wat", "voor", "wil"},
+    "tr": {"ve", "bir", "bu", "ne", "için", "benim", "değil", "nasıl", "var", "yok", "ile", "mi", "istiyorum"},
+    "vi": {"tôi", "không", "của", "và", "là", "có", "được", "một", "cho", "này", "làm", "sao", "muốn"},
+}
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "es": "Spanish",
+    "pt": "Portuguese",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+    "id": "Indonesian",
+    "lt": "Lithuanian",
+    "pl": "Polish",
+    "nl": "Dutch",
+    "tr": "Turkish",
+    "vi": "Vietnamese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "zh": "Chinese",
+    "th": "Thai",
+    "ar": "Arabic",
+    "he": "Hebrew",
+    "hi": "Hindi",
+    "el": "Greek",
+    "uk": "Ukrainian",
+    "ru": "Russian",
+}
+
+compiled_script_languages = [(language, re.compile(pattern)) for language, pattern in SCRIPT_LANGUAGES]
+word_pattern = re.compile(r"[^\W\d_]+")
+
+
+def detect_language(text: str) -> str:
+    """
+    Returns the ISO 639-1 code of the language the text is most likely written in. This is a cheap heuristic
+    meant for picking a translated canned message; short or ambiguous texts fall back to DEFAULT_LANGUAGE.
+    """
+    for language, script_pattern in compiled_script_languages:
+        if script_pattern.search(text):
+            return language
+
+    words = word_pattern.findall(text.lower())
+    language_scores = {
+        language: sum(word in stopwords for word in words) for language, stopwords in LANGUAGE_STOPWORDS.items()
+    }
+    best_language = max(language_scores, key=language_scores.get)
+
+    if language_scores[best_language] < MINIMUM_STOPWORD_MATCHES:
+        return DEFAULT_LANGUAGE
+    return best_language
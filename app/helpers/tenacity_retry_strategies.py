@@ -1,5 +1,14 @@
-from tenacity import retry, stop_after_attempt, retry_if_exception_type
-from helpers.custom_exceptions import InvalidGPTResponseException
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from api.external.gpt_clients.openai.openai_model_routing import track_attempt_number
+from helpers.custom_exceptions import DeadlineExceededException, InvalidGPTResponseException
+from helpers.deadline import get_remaining_time
 from fastapi import HTTPException, status
 
 from models.chat.chat_message_input_model import ChatbotLabel
@@ -8,49 +17,85 @@ from router.gpt_router_prompts import DEFAULT_HANDOFF_MESSAGE
 TENACITY_RETRY_ATTEMPTS = 3
 PART_ID_ERROR_INDICATOR = "ERROR_RETRIEVING_PART_ID"
 
+# Jittered backoff, so requests that failed together (usually on a rate limit) do not all retry at once.
+jittered_backoff = wait_random_exponential(multiplier=0.5, max=8)
+
+
+def wait_within_deadline(retry_state: RetryCallState) -> float:
+    """Jittered backoff that never sleeps past the request deadline."""
+    remaining_time = get_remaining_time()
+    if remaining_time is None:
+        return jittered_backoff(retry_state)
+    return max(min(jittered_backoff(retry_state), remaining_time), 0)
+
+
+def stop_at_deadline(retry_state: RetryCallState) -> bool:
+    remaining_time = get_remaining_time()
+    return remaining_time is not None and remaining_time <= 0
+
+
+# Deadline errors are never retried, so they reach the request instead of being turned into fallback values.
+stop_retrying = stop_after_attempt(TENACITY_RETRY_ATTEMPTS) | stop_at_deadline
+retry_unless_deadline = retry_if_not_exception_type(DeadlineExceededException)
+
 redis_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
+    stop=stop_retrying,
+    retry=retry_unless_deadline,
+    wait=wait_within_deadline,
     retry_error_callback=lambda retry_state: None,
 )
 
-redis_part_id_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
-    retry_error_callback=lambda retry_state: PART_ID_ERROR_INDICATOR,
-)
-
 openai_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
+    stop=stop_retrying,
+    retry=retry_unless_deadline,
+    wait=wait_within_deadline,
     retry_error_callback=lambda retry_state: None,
 )
 
+# Retries of malformed GPT answers do not wait, waiting does not make the next answer any better.
 openai_tools_calling_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
+    stop=stop_retrying,
     retry=retry_if_exception_type(InvalidGPTResponseException),
     retry_error_callback=lambda retry_state: raise_gpt_exception(),
 )
 
 handoff_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
+    before=track_attempt_number,
+    stop=stop_retrying,
+    retry=retry_unless_deadline,
+    wait=wait_within_deadline,
     retry_error_callback=lambda retry_state: True,
 )
 
 handoff_support_message_retry_strategy = retry(
-    stop=stop_after_attempt(TENACITY_RETRY_ATTEMPTS),
+    before=track_attempt_number,
+    stop=stop_retrying,
     retry=retry_if_exception_type(InvalidGPTResponseException),
     retry_error_callback=lambda retry_state: DEFAULT_HANDOFF_MESSAGE,
 )
 
 postgresql_retry_strategy = retry(
-    stop=stop_after_attempt(3),
+    stop=stop_retrying,
+    retry=retry_unless_deadline,
+    wait=wait_within_deadline,
     retry_error_callback=lambda retry_state: None,
 )
 
 chatbot_label_retry_strategy = retry(
-    stop=stop_after_attempt(3),
+    before=track_attempt_number,
+    stop=stop_retrying,
     retry=retry_if_exception_type(InvalidGPTResponseException),
     retry_error_callback=lambda retry_state: ChatbotLabel.OUT_OF_SCOPE,
 )
 
+# None makes the router fall back to the separate handoff and chatbot label requests.
+fused_router_retry_strategy = retry(
+    before=track_attempt_number,
+    stop=stop_after_attempt(2) | stop_at_deadline,
+    retry=retry_if_exception_type(InvalidGPTResponseException),
+    retry_error_callback=lambda retry_state: None,
+)
+
 
 def raise_gpt_exception():
     raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="GPT Failed to respond")
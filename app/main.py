@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -5,20 +6,34 @@ from fastapi import FastAPI
 
 from api.endpoints.chat import chat_router
 from api.endpoints.conversation_history import history_router
+from api.endpoints.metrics import metrics_router
+from api.external.gpt_clients.openai.openai_http_client import OpenAIHttpClient
+from api.external.gpt_clients.openai.openai_enums import OpenAIModel
 from database.database_calls import AsyncPostgreSQLDatabase
+from helpers.context_builder import load_encodings
 from redis_services.redis_client import RedisClient
 from middleware.global_exception_handler import global_exception_handler
+from router.handoff_message_cache import warm_up_handoff_messages
 
 postgres_database = AsyncPostgreSQLDatabase()
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator:
+    redis_client = RedisClient()
+    openai_http_client = OpenAIHttpClient()
     await postgres_database.connect()
+    await redis_client.load_scripts()
+    postgres_database.start_write_behind()
+    await openai_http_client.prewarm()
+    await load_encodings(list(OpenAIModel))
+    handoff_messages_warm_up = asyncio.create_task(warm_up_handoff_messages())
     yield
-    redis_client = RedisClient()
+    handoff_messages_warm_up.cancel()
+    await postgres_database.drain_write_behind()
     await redis_client.close()
     await postgres_database.close_pool()
+    await openai_http_client.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -26,3 +41,4 @@ app.add_exception_handler(Exception, global_exception_handler)
 
 app.include_router(chat_router, prefix="/api/chat", tags=["Chat"])
 app.include_router(history_router, prefix="/api/history", tags=["Database History"])
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
@@ -15,6 +15,12 @@ class OutputChatbotLabel(StrEnum):
     SUPPORT_HANDOFF_BOT = "support_handoff_bot"
 
 
+class StreamEventType(StrEnum):
+    TOKEN = "token"
+    DONE = "done"
+    ERROR = "error"
+
+
 class ConversationMessages(BaseModel):
     role: OutputRole
     content: str
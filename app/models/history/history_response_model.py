@@ -14,11 +14,13 @@ class HistoryAPIResponse(BaseModel):
     status: HistoryResponseStatusCode
     data: Optional[DataType] = None
     error_message: Optional[str] = None
+    next_cursor: Optional[str] = None
 
     def convert_to_success_response(self) -> Dict:
         return {
             "status": self.status,
             "data": self.data,
+            "next_cursor": self.next_cursor,
         }
 
     def convert_to_error_response(self) -> Dict:
@@ -0,0 +1,66 @@
+from typing import List, Dict, Optional
+from models.chat.chat_initialization_input_model import ChatbotMetadata
+from models.chat.chat_message_input_model import InputRole
+from models.redis_messages_model import RedisMessages
+from redis_services.redis_enums import ConversationField
+from redis_services.redis_methods import load_conversation
+
+LATEST_MESSAGES_COUNT = 20
+
+
+class ConversationSnapshot:
+    """
+    Request-scoped copy of the conversation state stored in Redis.
+    It is loaded once per request and kept in sync in memory by push_message_to_redis,
+    so the router, handoff decider and handlers do not re-read and re-parse the list.
+    """
+
+    def __init__(
+        self,
+        conversation_id: str,
+        messages: List[Dict],
+        chatbot_label: Optional[str] = None,
+        metadata: Optional[ChatbotMetadata] = None,
+        summary: Optional[str] = None,
+    ) -> None:
+        self.conversation_id = conversation_id
+        self.messages = messages
+        self.chatbot_label = chatbot_label
+        self.metadata = metadata
+        self.summary = summary
+
+    @classmethod
+    async def load(cls, user_id: str) -> Optional["ConversationSnapshot"]:
+        """Returns None when the user has no active conversation."""
+        conversation = await load_conversation(user_id)
+        if not conversation:
+            return None
+
+        conversation_fields, messages = conversation
+        conversation_id = conversation_fields.get(ConversationField.CONVERSATION_ID)
+        if not conversation_id:
+            return None
+
+        metadata = conversation_fields.get(ConversationField.METADATA)
+        return cls(
+            conversation_id,
+            messages,
+            chatbot_label=conversation_fields.get(ConversationField.CHATBOT_LABEL),
+            metadata=ChatbotMetadata.model_validate_json(metadata) if metadata else None,
+            summary=conversation_fields.get(ConversationField.SUMMARY),
+        )
+
+    def append(self, message: RedisMessages) -> None:
+        self.messages.append(message.to_dict())
+
+    def get_entire_history(self) -> List[Dict]:
+        return list(self.messages)
+
+    def get_latest_user_message(self) -> Optional[str]:
+        for message in reversed(self.messages):
+            if message.get("role") == InputRole.USER:
+                return message.get("content")
+        return None
+
+    def get_latest_messages(self, event_message_count: int = LATEST_MESSAGES_COUNT) -> List[Dict]:
+        return self.messages[-event_message_count:]
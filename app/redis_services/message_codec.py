@@ -0,0 +1,119 @@
+import base64
+import json
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List
+from models.redis_messages_model import RedisMessages
+from utils.env_constants import REDIS_MESSAGE_COMPRESSION, REDIS_MESSAGE_COMPRESSION_MIN_SIZE
+
+FIELD_NAMES = {"role": "r", "content": "c", "tool_calls": "t", "tool_call_id": "i"}
+SHORT_FIELD_NAMES = {short_name: field_name for field_name, short_name in FIELD_NAMES.items()}
+
+
+class MessageCodec(ABC):
+    """
+    Encodes conversation messages stored in Redis. Every encoded message starts with the codec version,
+    so messages written by different codecs can live in the same list and are always decoded correctly.
+    """
+
+    version: str
+
+    def encode(self, message: Dict) -> str:
+        return self.version + self.encode_body(message)
+
+    def decode(self, encoded_message: str) -> Dict:
+        return self.decode_body(encoded_message[len(self.version) :])
+
+    @abstractmethod
+    def encode_body(self, message: Dict) -> str:
+        pass
+
+    @abstractmethod
+    def decode_body(self, body: str) -> Dict:
+        pass
+
+
+class LegacyJsonCodec(MessageCodec):
+    """Plain model_dump JSON, written before messages were versioned. Only used for decoding."""
+
+    version = ""
+
+    def encode_body(self, message: Dict) -> str:
+        return json.dumps(message)
+
+    def decode_body(self, body: str) -> Dict:
+        return json.loads(body)
+
+
+class CompactJsonCodec(MessageCodec):
+    """JSON with one letter keys and without null fields."""
+
+    version = "1"
+
+    def encode_body(self, message: Dict) -> str:
+        compact_message = {FIELD_NAMES[field]: value for field, value in message.items() if value is not None}
+        return json.dumps(compact_message, separators=(",", ":"), ensure_ascii=False)
+
+    def decode_body(self, body: str) -> Dict:
+        return {SHORT_FIELD_NAMES[short_name]: value for short_name, value in json.loads(body).items()}
+
+
+class CompressedJsonCodec(CompactJsonCodec):
+    """Compact JSON compressed with zlib, for large tool call arguments and function responses."""
+
+    version = "2"
+
+    def encode_body(self, message: Dict) -> str:
+        return base64.b64encode(zlib.compress(super().encode_body(message).encode())).decode()
+
+    def decode_body(self, body: str) -> Dict:
+        return super().decode_body(zlib.decompress(base64.b64decode(body)).decode())
+
+
+compact_json_codec = CompactJsonCodec()
+compressed_json_codec = CompressedJsonCodec()
+legacy_json_codec = LegacyJsonCodec()
+codecs_by_version: Dict[str, MessageCodec] = {
+    codec.version: codec for codec in (compact_json_codec, compressed_json_codec)
+}
+
+
+def encode_message(message: RedisMessages) -> str:
+    message_fields = message.model_dump()
+    encoded_message = compact_json_codec.encode(message_fields)
+
+    if REDIS_MESSAGE_COMPRESSION and len(encoded_message) >= REDIS_MESSAGE_COMPRESSION_MIN_SIZE:
+        compressed_message = compressed_json_codec.encode(message_fields)
+        if len(compressed_message) < len(encoded_message):
+            return compressed_message
+
+    return encoded_message
+
+
+def get_codec(encoded_message: str) -> MessageCodec:
+    return codecs_by_version.get(encoded_message[:1], legacy_json_codec)
+
+
+def decode_messages(encoded_messages: List[str]) -> List[Dict]:
+    """
+    Messages in a versioned encoding were validated by RedisMessages when they were pushed, so they are decoded
+    straight into dicts shaped like RedisMessages.to_dict(). Legacy entries still go through validation.
+    """
+    decoded_messages = []
+    for encoded_message in encoded_messages:
+        codec = get_codec(encoded_message)
+        message = codec.decode(encoded_message)
+
+        if codec is legacy_json_codec:
+            decoded_messages.append(RedisMessages(**message).to_dict())
+            continue
+
+        decoded_messages.append(
+            {
+                "role": message["role"],
+                "tool_calls": message.get("tool_calls"),
+                "tool_call_id": message.get("tool_call_id"),
+                "content": message.get("content"),
+            }
+        )
+    return decoded_messages
@@ -1,8 +1,11 @@
-import json
 import redis.asyncio as redis
 from enum import IntEnum
-from typing import Any, Optional, List
-from redis_services.redis_enums import RedisExpiration
+from time import time
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+from redis.commands.core import AsyncScript
+from helpers.deadline import run_within_deadline
+from redis_services.redis_enums import RedisExpiration, RedisScript
+from redis_services.redis_scripts import REDIS_SCRIPTS
 from utils.env_constants import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
 from utils.logger.logger import Logger
 
@@ -11,6 +14,57 @@ REDIS_CONNECT_TIMEOUT = 5
 logger = Logger()
 
 
+class RedisBatch:
+    """
+    Collects Redis commands so they can be sent to the server in a single round trip.
+    With transaction=True the commands are wrapped in MULTI/EXEC and applied atomically.
+    """
+
+    def __init__(self, batch_name: str, transaction: bool = False) -> None:
+        self.batch_name = batch_name
+        self.transaction = transaction
+        self.commands: List[Tuple[str, tuple]] = []
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def get(self, key: str) -> "RedisBatch":
+        self.commands.append(("get", (key,)))
+        return self
+
+    def setex(self, key: str, expiration_time: RedisExpiration, value: Any) -> "RedisBatch":
+        if isinstance(expiration_time, IntEnum):
+            expiration_time = expiration_time.value
+        self.commands.append(("setex", (key, expiration_time, value)))
+        return self
+
+    def rpush_encoded(self, key: str, *encoded_values: str) -> "RedisBatch":
+        self.commands.append(("rpush", (key, *encoded_values)))
+        return self
+
+    def lrange(self, key: str, start: int, stop: int) -> "RedisBatch":
+        self.commands.append(("lrange", (key, start, stop)))
+        return self
+
+    def delete(self, *keys: str) -> "RedisBatch":
+        self.commands.append(("delete", keys))
+        return self
+
+    def expire(self, key: str, expiration_time: RedisExpiration) -> "RedisBatch":
+        if isinstance(expiration_time, IntEnum):
+            expiration_time = expiration_time.value
+        self.commands.append(("expire", (key, expiration_time)))
+        return self
+
+    def hset(self, key: str, mapping: Dict[str, Any]) -> "RedisBatch":
+        self.commands.append(("hset", (key, None, None, mapping)))
+        return self
+
+    def hgetall(self, key: str) -> "RedisBatch":
+        self.commands.append(("hgetall", (key,)))
+        return self
+
+
 class RedisClient:
     _instance: "RedisClient" = None
 
@@ -30,6 +84,15 @@ class RedisClient:
                 socket_timeout=REDIS_SOCKET_TIMEOUT,
                 socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
             )
+            self.scripts: Dict[RedisScript, AsyncScript] = {
+                script_name: self.client.register_script(script) for script_name, script in REDIS_SCRIPTS.items()
+            }
+
+    async def load_scripts(self) -> None:
+        """Caches the scripts on the server up front, so the first EVALSHA of each one does not miss."""
+        for script_name, script in self.scripts.items():
+            script.sha = await self.client.script_load(script.script)
+            logger.log("Redis script loaded", script_name=script_name, sha=script.sha)
 
     async def close(self) -> None:
         await self.client.close()
@@ -42,8 +105,8 @@ class RedisClient:
 
     async def get(self, key: str) -> Optional[str]:
         try:
-            return await self.client.get(key)
-        except redis.RedisError as e:
+            return await run_within_deadline(self.client.get(key), REDIS_SOCKET_TIMEOUT)
+        except (redis.RedisError, TimeoutError) as e:
             logger.log(f"Redis: Error getting key {key}", payload=str(e))
             return None
 
@@ -51,34 +114,26 @@ class RedisClient:
         try:
             if isinstance(expiration_time, IntEnum):
                 expiration_time = expiration_time.value
-            await self.client.setex(key, expiration_time, value)
+            await run_within_deadline(self.client.setex(key, expiration_time, value), REDIS_SOCKET_TIMEOUT)
             return True
-        except redis.RedisError as e:
+        except (redis.RedisError, TimeoutError) as e:
             logger.log(
                 f"Redis: Error setting key {key} with value {value} for {expiration_time} seconds", payload=str(e)
             )
             return False
 
-    async def rpush(self, key: str, value: Any) -> bool:
-        try:
-            await self.client.rpush(key, json.dumps(value))
-            return True
-        except redis.RedisError as e:
-            logger.log(f"Redis: Error pushing to list {key}", payload=str(e))
-            return False
-
     async def lrange(self, key: str, start: int, stop: int) -> List[Any]:
         try:
-            return await self.client.lrange(key, start, stop)
-        except redis.RedisError as e:
+            return await run_within_deadline(self.client.lrange(key, start, stop), REDIS_SOCKET_TIMEOUT)
+        except (redis.RedisError, TimeoutError) as e:
             logger.log(f"Redis: Error retrieving range from list {key}", payload=str(e))
             return []
 
     async def delete(self, *keys: str) -> bool:
         try:
-            await self.client.delete(*keys)
+            await run_within_deadline(self.client.delete(*keys), REDIS_SOCKET_TIMEOUT)
             return True
-        except redis.RedisError as e:
+        except (redis.RedisError, TimeoutError) as e:
             logger.log(f"Redis: Error deleting keys {keys}", payload=str(e))
             return False
 
@@ -86,8 +141,63 @@ class RedisClient:
         try:
             if isinstance(expiration_time, IntEnum):
                 expiration_time = expiration_time.value
-            await self.client.expire(key, expiration_time)
+            await run_within_deadline(self.client.expire(key, expiration_time), REDIS_SOCKET_TIMEOUT)
             return True
-        except redis.RedisError as e:
+        except (redis.RedisError, TimeoutError) as e:
             logger.log(f"Redis: Error setting expire for key {key}", payload=str(e))
             return False
+
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        try:
+            return await run_within_deadline(self.client.hget(key, field), REDIS_SOCKET_TIMEOUT)
+        except (redis.RedisError, TimeoutError) as e:
+            logger.log(f"Redis: Error getting field {field} of hash {key}", payload=str(e))
+            return None
+
+    async def hset(self, key: str, mapping: Dict[str, Any]) -> bool:
+        try:
+            await run_within_deadline(self.client.hset(key, mapping=mapping), REDIS_SOCKET_TIMEOUT)
+            return True
+        except (redis.RedisError, TimeoutError) as e:
+            logger.log(f"Redis: Error setting fields {list(mapping)} of hash {key}", payload=str(e))
+            return False
+
+    async def scan_iter(self, match: str) -> AsyncIterator[str]:
+        async for key in self.client.scan_iter(match=match):
+            yield key
+
+    async def run_script(self, script_name: RedisScript, keys: List[str], args: List[Any]) -> Any:
+        try:
+            start_time = time()
+            args = [arg.value if isinstance(arg, IntEnum) else arg for arg in args]
+            result = await run_within_deadline(self.scripts[script_name](keys=keys, args=args), REDIS_SOCKET_TIMEOUT)
+            logger.log("Redis script executed", script_name=script_name, response_time=time() - start_time)
+            return result
+        except (redis.RedisError, TimeoutError) as e:
+            logger.log(f"Redis: Error running script {script_name}", payload=str(e))
+            return None
+
+    async def execute_batch(self, batch: RedisBatch) -> Optional[List[Any]]:
+        if not batch.commands:
+            return []
+
+        try:
+            start_time = time()
+
+            async with self.client.pipeline(transaction=batch.transaction) as pipeline:
+                for command_name, command_args in batch.commands:
+                    getattr(pipeline, command_name)(*command_args)
+                results = await run_within_deadline(pipeline.execute(), REDIS_SOCKET_TIMEOUT)
+
+            logger.log(
+                "Redis batch executed",
+                batch_name=batch.batch_name,
+                transaction=batch.transaction,
+                commands=len(batch.commands),
+                response_time=time() - start_time,
+            )
+
+            return results
+        except (redis.RedisError, TimeoutError) as e:
+            logger.log(f"Redis: Error executing batch {batch.batch_name}", payload=str(e))
+            return None
@@ -2,6 +2,13 @@ from enum import StrEnum, IntEnum
 
 
 class RedisPrefix(StrEnum):
+    CONVERSATION_KEY_PREFIX = "conversation:"
+    CONVERSATION_MESSAGES_KEY_PREFIX = "conversation_messages:"
+    HANDOFF_MESSAGE_KEY_PREFIX = "handoff_message:"
+    CHATBOT_LABEL_CACHE_KEY_PREFIX = "chatbot_label_cache:"
+
+
+class LegacyRedisPrefix(StrEnum):
     CONVERSATION_KEY_PREFIX = "user_conversation:"
     CONVERSATION_MESSAGES_KEY_PREFIX = "conversation_messages:"
     CONVERSATION_METADATA_KEY_PREFIX = "conversation_metadata:"
@@ -10,8 +17,24 @@ class RedisPrefix(StrEnum):
     MESSAGE_PART_ID_KEY_PREFIX = "message_part_ids:"
 
 
+class ConversationField(StrEnum):
+    CONVERSATION_ID = "conversation_id"
+    METADATA = "metadata"
+    CHATBOT_LABEL = "chatbot_label"
+    MUST_HANDOFF = "must_handoff"
+    SUMMARY = "summary"
+    SUMMARY_GENERATION = "summary_generation"
+
+
 class RedisExpiration(IntEnum):
     FIVE_MINUTES = 300
     ONE_HOUR = 3600
     ONE_DAY = 86400
     ONE_WEEK = 604800
+
+
+class RedisScript(StrEnum):
+    CREATE_OR_REFRESH_CONVERSATION = "create_or_refresh_conversation"
+    APPEND_MESSAGES = "append_messages"
+    ROTATE_CONVERSATION = "rotate_conversation"
+    COMPACT_CONVERSATION = "compact_conversation"
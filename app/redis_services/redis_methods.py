@@ -1,165 +1,154 @@
 import json
 import logging
-import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 from redis import RedisError
 from helpers.tenacity_retry_strategies import (
     redis_retry_strategy,
-    redis_part_id_retry_strategy,
-    PART_ID_ERROR_INDICATOR,
 )
 from models.chat.chat_initialization_input_model import ChatbotMetadata
 from utils.logger.logger import Logger
 from models.redis_messages_model import RedisMessages
-from redis_services.redis_client import RedisClient
-from redis_services.redis_enums import RedisPrefix, RedisExpiration
+from redis_services.message_codec import encode_message, decode_messages
+from redis_services.redis_client import RedisClient, RedisBatch
+from redis_services.redis_enums import RedisPrefix, RedisExpiration, LegacyRedisPrefix, ConversationField, RedisScript
 
-logger = Logger()
-redis_client = RedisClient()
+if TYPE_CHECKING:
+    from redis_services.conversation_snapshot import ConversationSnapshot
 
+# Returned by rotate_conversation when the user has no conversation, as None means Redis could not be reached.
+NO_ACTIVE_CONVERSATION = ""
 
-@redis_retry_strategy
-async def get_conversation_id(user_id: str) -> Optional[str]:
-    try:
-        conversation_id = await redis_client.get(f"{RedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}")
-        return conversation_id
-    except RedisError as e:
-        logger.log("Redis: Error retrieving conversation data", level=logging.WARNING, user_id=user_id, payload=e)
-        raise
+logger = Logger()
+redis_client = RedisClient()
 
 
-@redis_retry_strategy
-async def set_conversation_id(user_id: str, conversation_id: str) -> None:
-    try:
-        await redis_client.setex(
-            f"{RedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}",
-            RedisExpiration.ONE_HOUR,
-            conversation_id,
-        )
-    except RedisError as e:
-        logger.log(
-            "Redis: Error setting conversation_id",
-            level=logging.WARNING,
-            conversation_id=conversation_id,
-            user_id=user_id,
-            payload=e,
-        )
-        raise
+def get_conversation_key(user_id: str) -> str:
+    """Hash with the scalar conversation state. The {user_id} hash tag keeps it in the same slot as the messages."""
+    return f"{RedisPrefix.CONVERSATION_KEY_PREFIX}{{{user_id}}}"
 
 
-@redis_retry_strategy
-async def push_message_to_redis(user_id: str, conversation_id: str, message: RedisMessages) -> None:
-    try:
-        await redis_client.rpush(
-            f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{conversation_id}", message.model_dump()
-        )
-        await refresh_conversation_expiration(user_id)
-        await refresh_conversation_messages_expiration(conversation_id)
-        await refresh_metadata_expiration(conversation_id)
-    except RedisError as e:
-        logger.log(
-            "Redis: Error pushing message",
-            level=logging.WARNING,
-            conversation_id=conversation_id,
-            user_id=user_id,
-            payload=e,
-        )
-        raise
+def get_conversation_messages_key(user_id: str) -> str:
+    return f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{{{user_id}}}"
 
 
 @redis_retry_strategy
-async def refresh_metadata_expiration(conversation_id: str) -> None:
+async def load_conversation(user_id: str) -> Optional[Tuple[Dict[str, str], List[Dict]]]:
+    """Reads the conversation hash and its messages in one round trip."""
     try:
-        await redis_client.expire(
-            f"{RedisPrefix.CONVERSATION_METADATA_KEY_PREFIX}{conversation_id}",
-            RedisExpiration.ONE_HOUR,
-        )
+        batch = (
+            RedisBatch("load_conversation")
+            .hgetall(get_conversation_key(user_id))
+            .lrange(get_conversation_messages_key(user_id), 0, -1)
+        )
+        results = await redis_client.execute_batch(batch)
+        if results and not results[0] and await migrate_legacy_conversation(user_id):
+            results = await redis_client.execute_batch(batch)
+        if not results or not results[0]:
+            return None
+
+        conversation_fields, encoded_messages = results
+        return conversation_fields, decode_messages(encoded_messages)
     except RedisError as e:
-        logger.log(
-            "Redis: Error refreshing metadata expiration",
-            level=logging.WARNING,
-            conversation_id=conversation_id,
-            payload=e,
-        )
+        logger.log("Redis: Error loading conversation", level=logging.WARNING, user_id=user_id, payload=e)
         raise
 
 
 @redis_retry_strategy
-async def refresh_conversation_expiration(user_id: str) -> None:
+async def create_or_refresh_conversation(
+    user_id: str, new_conversation_id: str, metadata: Optional[ChatbotMetadata]
+) -> Optional[Tuple[str, bool, List[Dict]]]:
+    """
+    Keeps the user's active conversation or starts new_conversation_id when there is none, stores the metadata,
+    refreshes the expirations and returns (conversation_id, created, messages) in one atomic round trip.
+    """
     try:
-        await redis_client.expire(f"{RedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}", RedisExpiration.ONE_HOUR)
+        keys = [get_conversation_key(user_id), get_conversation_messages_key(user_id)]
+        args = [new_conversation_id, json.dumps(metadata.model_dump()) if metadata else "", RedisExpiration.ONE_HOUR]
+        result = await redis_client.run_script(RedisScript.CREATE_OR_REFRESH_CONVERSATION, keys, args)
+        if result and result[1] and await migrate_legacy_conversation(user_id):
+            result = await redis_client.run_script(RedisScript.CREATE_OR_REFRESH_CONVERSATION, keys, args)
+        if not result:
+            return None
+
+        conversation_id, created, encoded_messages = result
+        return conversation_id, bool(created), decode_messages(encoded_messages)
     except RedisError as e:
-        logger.log("Redis: Error refreshing conversation expiration", level=logging.WARNING, user_id=user_id, payload=e)
+        logger.log("Redis: Error creating or refreshing conversation", level=logging.WARNING, user_id=user_id, payload=e)
         raise
 
 
 @redis_retry_strategy
-async def refresh_conversation_messages_expiration(conversation_id: str) -> None:
+async def push_message_to_redis(
+    user_id: str,
+    conversation_id: str,
+    message: RedisMessages,
+    conversation_snapshot: Optional["ConversationSnapshot"] = None,
+) -> None:
     try:
-        await redis_client.expire(
-            f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{conversation_id}",
-            RedisExpiration.ONE_HOUR,
-        )
+        messages_length = await redis_client.run_script(
+            RedisScript.APPEND_MESSAGES,
+            [get_conversation_key(user_id), get_conversation_messages_key(user_id)],
+            [conversation_id, RedisExpiration.ONE_HOUR, encode_message(message)],
+        )
+        if messages_length == 0:
+            logger.log(
+                "Redis: Message not pushed, conversation was restarted or expired",
+                level=logging.WARNING,
+                conversation_id=conversation_id,
+                user_id=user_id,
+            )
+            return
+        if conversation_snapshot is not None:
+            conversation_snapshot.append(message)
     except RedisError as e:
         logger.log(
-            "Redis: Error refreshing conversation messages expiration",
+            "Redis: Error pushing message",
             level=logging.WARNING,
             conversation_id=conversation_id,
+            user_id=user_id,
             payload=e,
         )
         raise
 
 
 @redis_retry_strategy
-async def fetch_entire_conversation_history(conversation_id: str) -> List[RedisMessages]:
+async def rotate_conversation(user_id: str, new_conversation_id: str) -> Optional[str]:
+    """
+    Atomically replaces the user's conversation with new_conversation_id, keeping its metadata.
+    Returns the previous conversation id, NO_ACTIVE_CONVERSATION when the user has none, or None when Redis failed.
+    """
     try:
-        history_data = await redis_client.lrange(
-            f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{conversation_id}", 0, -1
-        )
-        return [RedisMessages(**json.loads(msg)).to_dict() for msg in history_data]
+        keys = [get_conversation_key(user_id), get_conversation_messages_key(user_id)]
+        args = [new_conversation_id, RedisExpiration.ONE_HOUR]
+        previous_conversation_id = await redis_client.run_script(RedisScript.ROTATE_CONVERSATION, keys, args)
+        if previous_conversation_id == 0 and await migrate_legacy_conversation(user_id):
+            previous_conversation_id = await redis_client.run_script(RedisScript.ROTATE_CONVERSATION, keys, args)
+        if previous_conversation_id is None:
+            raise RedisError("Rotating the conversation failed")
+        return previous_conversation_id or NO_ACTIVE_CONVERSATION
     except RedisError as e:
-        logger.log(
-            "Redis: Error fetching conversation messages",
-            level=logging.WARNING,
-            conversation_id=conversation_id,
-            payload=e,
-        )
+        logger.log("Redis: Error rotating conversation", level=logging.WARNING, user_id=user_id, payload=e)
         raise
 
 
 @redis_retry_strategy
-async def fetch_latest_conversation_messages(
-    conversation_id: str, event_message_count: int = 20
-) -> List[RedisMessages]:
+async def compact_conversation(
+    user_id: str, conversation_id: str, summary: str, compacted_messages: int, summary_generation: str
+) -> bool:
+    """
+    Stores the rolling summary and trims the summarised messages off the head of the list. Returns False without
+    writing when the conversation was rotated or compacted since summary_generation was read.
+    """
     try:
-        history_data = await redis_client.lrange(
-            f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{conversation_id}", -event_message_count, -1
-        )
-        return [RedisMessages(**json.loads(msg)).to_dict() for msg in history_data]
-    except RedisError as e:
-        logger.log(
-            "Redis: Error fetching latest conversation messages",
-            level=logging.WARNING,
-            conversation_id=conversation_id,
-            payload=e,
+        compacted = await redis_client.run_script(
+            RedisScript.COMPACT_CONVERSATION,
+            [get_conversation_key(user_id), get_conversation_messages_key(user_id)],
+            [conversation_id, summary, compacted_messages, summary_generation],
         )
-        raise
-
-
-@redis_retry_strategy
-async def delete_conversation(user_id: str, conversation_id: str) -> None:
-    try:
-        keys_to_delete = [
-            f"{RedisPrefix.CHATBOT_LABEL_KEY_PREFIX}{conversation_id}",
-            f"{RedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{conversation_id}",
-            f"{RedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}",
-            f"{RedisPrefix.CONVERSATION_METADATA_KEY_PREFIX}{conversation_id}",
-            f"{RedisPrefix.MUST_HANDOFF_CONVERSATION_KEY_PREFIX}{conversation_id}",
-        ]
-        await redis_client.delete(*keys_to_delete)
+        return bool(compacted)
     except RedisError as e:
         logger.log(
-            "Redis: Error deleting conversation",
+            "Redis: Error compacting conversation",
             level=logging.WARNING,
             conversation_id=conversation_id,
             user_id=user_id,
@@ -169,71 +158,80 @@ async def delete_conversation(user_id: str, conversation_id: str) -> None:
 
 
 @redis_retry_strategy
-async def set_conversation_metadata(conversation_id: str, metadata: ChatbotMetadata) -> None:
+async def set_chatbot_label(user_id: str, chatbot_label: str) -> None:
     try:
-        await redis_client.setex(
-            f"{RedisPrefix.CONVERSATION_METADATA_KEY_PREFIX}{conversation_id}",
-            RedisExpiration.ONE_HOUR,
-            json.dumps(metadata.model_dump()),
+        await redis_client.execute_batch(
+            RedisBatch("set_chatbot_label", transaction=True)
+            .hset(get_conversation_key(user_id), {ConversationField.CHATBOT_LABEL: chatbot_label})
+            .expire(get_conversation_key(user_id), RedisExpiration.ONE_HOUR)
         )
     except RedisError as e:
         logger.log(
-            "Redis: Error setting conversation metadata",
+            "Redis: Error setting chatbot label",
             level=logging.WARNING,
-            conversation_id=conversation_id,
+            user_id=user_id,
             payload=e,
         )
         raise
 
 
-@redis_retry_strategy
-async def get_conversation_metadata(conversation_id: str, user_id: str) -> Optional[ChatbotMetadata]:
-    try:
-        conversation_metadata = await redis_client.get(
-            f"{RedisPrefix.CONVERSATION_METADATA_KEY_PREFIX}{conversation_id}"
-        )
-        return ChatbotMetadata.model_validate_json(conversation_metadata)
-    except RedisError as e:
-        logger.log("Redis: Error retrieving conversation metadata", level=logging.WARNING, user_id=user_id, payload=e)
-        raise
-
-
-@redis_retry_strategy
-async def generate_new_part_ids(user_id: str) -> None:
-    try:
-        key = f"{RedisPrefix.MESSAGE_PART_ID_KEY_PREFIX}{user_id}"
-        new_part_ids = json.dumps(
-            {"user_part_id": f"{user_id}-{str(uuid.uuid4())}", "assistant_part_id": f"{user_id}-{str(uuid.uuid4())}"}
-        )
-        await redis_client.setex(key, RedisExpiration.FIVE_MINUTES, new_part_ids)
-    except RedisError as e:
-        logger.log("Redis: Error generating part_ids", level=logging.WARNING, user_id=user_id, payload=e)
-        raise
-
-
-@redis_part_id_retry_strategy
-async def get_assistant_part_id(user_id: str) -> Optional[str]:
-    try:
-        key = f"{RedisPrefix.MESSAGE_PART_ID_KEY_PREFIX}{user_id}"
-        part_ids_str = await redis_client.get(key)
-        if part_ids_str:
-            part_ids = json.loads(part_ids_str)
-            return part_ids.get("assistant_part_id", PART_ID_ERROR_INDICATOR)
-        return PART_ID_ERROR_INDICATOR
-    except RedisError as e:
-        logger.log("Redis: Error retrieving assistant_part_id", level=logging.WARNING, user_id=user_id, payload=e)
-        return PART_ID_ERROR_INDICATOR
-
-
-@redis_part_id_retry_strategy
-async def get_user_part_id(user_id: str) -> Optional[str]:
-    try:
-        key = f"{RedisPrefix.MESSAGE_PART_ID_KEY_PREFIX}{user_id}"
-        part_ids_str = await redis_client.get(key)
-        if part_ids_str:
-            part_ids = json.loads(part_ids_str)
-            return part_ids.get("user_part_id", PART_ID_ERROR_INDICATOR)
-        return PART_ID_ERROR_INDICATOR
-    except RedisError as e:
-        logger.log("Redis: Error retrieving user_part_id", level=logging.WARNING, user_id=user_id, payload=e)
-        return PART_ID_ERROR_INDICATOR
+async def migrate_legacy_conversation(user_id: str) -> bool:
+    """
+    Moves a conversation stored under the legacy per-field keys into the conversation hash and messages list.
+    Returns False when the user has no legacy conversation.
+    """
+    legacy_conversation_id = await redis_client.get(f"{LegacyRedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}")
+    if not legacy_conversation_id:
+        return False
+
+    legacy_keys = [
+        f"{LegacyRedisPrefix.CONVERSATION_METADATA_KEY_PREFIX}{legacy_conversation_id}",
+        f"{LegacyRedisPrefix.CHATBOT_LABEL_KEY_PREFIX}{legacy_conversation_id}",
+        f"{LegacyRedisPrefix.MUST_HANDOFF_CONVERSATION_KEY_PREFIX}{legacy_conversation_id}",
+    ]
+    legacy_messages_key = f"{LegacyRedisPrefix.CONVERSATION_MESSAGES_KEY_PREFIX}{legacy_conversation_id}"
+
+    read_batch = RedisBatch("read_legacy_conversation")
+    for legacy_key in legacy_keys:
+        read_batch.get(legacy_key)
+    results = await redis_client.execute_batch(read_batch.lrange(legacy_messages_key, 0, -1))
+    if results is None:
+        return False
+
+    metadata, chatbot_label, must_handoff, encoded_messages = results
+    conversation_fields = {
+        ConversationField.CONVERSATION_ID: legacy_conversation_id,
+        ConversationField.METADATA: metadata,
+        ConversationField.CHATBOT_LABEL: chatbot_label,
+        ConversationField.MUST_HANDOFF: must_handoff,
+    }
+
+    write_batch = (
+        RedisBatch("write_migrated_conversation", transaction=True)
+        .delete(get_conversation_key(user_id), get_conversation_messages_key(user_id))
+        .hset(get_conversation_key(user_id), {k: v for k, v in conversation_fields.items() if v is not None})
+        .expire(get_conversation_key(user_id), RedisExpiration.ONE_HOUR)
+    )
+    if encoded_messages:
+        write_batch.rpush_encoded(get_conversation_messages_key(user_id), *encoded_messages).expire(
+            get_conversation_messages_key(user_id), RedisExpiration.ONE_HOUR
+        )
+    if await redis_client.execute_batch(write_batch) is None:
+        return False
+
+    # The legacy keys live in other hash slots, so they are removed outside of the transaction above.
+    await redis_client.execute_batch(
+        RedisBatch("delete_legacy_conversation").delete(
+            f"{LegacyRedisPrefix.CONVERSATION_KEY_PREFIX}{user_id}",
+            f"{LegacyRedisPrefix.MESSAGE_PART_ID_KEY_PREFIX}{user_id}",
+            legacy_messages_key,
+            *legacy_keys,
+        )
+    )
+    logger.log(
+        "Redis: Legacy conversation migrated",
+        user_id=user_id,
+        conversation_id=legacy_conversation_id,
+        messages=len(encoded_messages),
+    )
+    return True
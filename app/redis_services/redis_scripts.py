@@ -0,0 +1,93 @@
+from typing import Dict
+from redis_services.redis_enums import RedisScript
+
+# Every script receives the conversation hash as KEYS[1] and the messages list as KEYS[2]. Both share the
+# {user_id} hash tag, so the scripts also run on a cluster. The hash field names match ConversationField.
+
+CREATE_OR_REFRESH_CONVERSATION_SCRIPT = """
+local conversation_key, messages_key = KEYS[1], KEYS[2]
+local new_conversation_id, metadata, expiration = ARGV[1], ARGV[2], tonumber(ARGV[3])
+
+local conversation_id = redis.call("HGET", conversation_key, "conversation_id")
+local created = 0
+if not conversation_id then
+    conversation_id = new_conversation_id
+    created = 1
+    redis.call("DEL", conversation_key, messages_key)
+    redis.call("HSET", conversation_key, "conversation_id", conversation_id)
+end
+if metadata ~= "" then
+    redis.call("HSET", conversation_key, "metadata", metadata)
+end
+
+redis.call("EXPIRE", conversation_key, expiration)
+redis.call("EXPIRE", messages_key, expiration)
+return {conversation_id, created, redis.call("LRANGE", messages_key, 0, -1)}
+"""
+
+# Returns 0 without writing when the conversation was rotated or expired since the request loaded it.
+APPEND_MESSAGES_SCRIPT = """
+local conversation_key, messages_key = KEYS[1], KEYS[2]
+local conversation_id, expiration = ARGV[1], tonumber(ARGV[2])
+
+if redis.call("HGET", conversation_key, "conversation_id") ~= conversation_id then
+    return 0
+end
+
+local length = redis.call("RPUSH", messages_key, unpack(ARGV, 3))
+redis.call("EXPIRE", conversation_key, expiration)
+redis.call("EXPIRE", messages_key, expiration)
+return length
+"""
+
+# Replaces the conversation with an empty one that keeps the metadata. Returns 0 when there is none to rotate.
+ROTATE_CONVERSATION_SCRIPT = """
+local conversation_key, messages_key = KEYS[1], KEYS[2]
+local new_conversation_id, expiration = ARGV[1], tonumber(ARGV[2])
+
+local previous_conversation_id = redis.call("HGET", conversation_key, "conversation_id")
+if not previous_conversation_id then
+    return 0
+end
+local metadata = redis.call("HGET", conversation_key, "metadata")
+
+redis.call("DEL", conversation_key, messages_key)
+redis.call("HSET", conversation_key, "conversation_id", new_conversation_id)
+if metadata then
+    redis.call("HSET", conversation_key, "metadata", metadata)
+end
+
+redis.call("EXPIRE", conversation_key, expiration)
+return previous_conversation_id
+"""
+
+# Drops the oldest messages that were folded into the summary. Messages are only ever appended to the tail,
+# so as long as the conversation was not rotated, the head still holds the messages that were summarised.
+# Every compaction bumps the summary generation; one that started from an older generation is a no-op, so two
+# processes compacting the same conversation cannot both trim it.
+COMPACT_CONVERSATION_SCRIPT = """
+local conversation_key, messages_key = KEYS[1], KEYS[2]
+local conversation_id, summary, compacted_messages, generation = ARGV[1], ARGV[2], tonumber(ARGV[3]), ARGV[4]
+
+if redis.call("HGET", conversation_key, "conversation_id") ~= conversation_id then
+    return 0
+end
+if (redis.call("HGET", conversation_key, "summary_generation") or "0") ~= generation then
+    return 0
+end
+if redis.call("LLEN", messages_key) < compacted_messages then
+    return 0
+end
+
+redis.call("LTRIM", messages_key, compacted_messages, -1)
+redis.call("HSET", conversation_key, "summary", summary)
+redis.call("HINCRBY", conversation_key, "summary_generation", 1)
+return 1
+"""
+
+REDIS_SCRIPTS: Dict[RedisScript, str] = {
+    RedisScript.CREATE_OR_REFRESH_CONVERSATION: CREATE_OR_REFRESH_CONVERSATION_SCRIPT,
+    RedisScript.APPEND_MESSAGES: APPEND_MESSAGES_SCRIPT,
+    RedisScript.ROTATE_CONVERSATION: ROTATE_CONVERSATION_SCRIPT,
+    RedisScript.COMPACT_CONVERSATION: COMPACT_CONVERSATION_SCRIPT,
+}
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Optional
+from models.chat.chat_message_input_model import ChatbotLabel
+from models.chat.chat_message_output_model import OutputRole
+from redis_services.conversation_snapshot import ConversationSnapshot
+from redis_services.redis_client import RedisClient
+from redis_services.redis_enums import RedisPrefix
+from router.gpt_router_prompts import get_router_prompt
+from utils.env_constants import CHATBOT_LABEL_CACHE_MESSAGES, CHATBOT_LABEL_CACHE_SIZE, CHATBOT_LABEL_CACHE_TTL
+from utils.metrics.metrics import Metrics
+
+metrics = Metrics()
+redis_client = RedisClient()
+
+# A changed router prompt may label the same conversation differently, so it is part of every key.
+router_prompt_hash = hashlib.sha256(get_router_prompt().encode()).hexdigest()[:12]
+non_word_pattern = re.compile(r"[^\w]+")
+
+
+class ChatbotLabelCache:
+    """
+    Chatbot labels of recently routed conversation tails. Labels are requested at temperature 0, so conversations
+    ending with the same messages get the same label. An in-process LRU sits in front of Redis, where the labels are
+    shared between workers and expire after CHATBOT_LABEL_CACHE_TTL seconds.
+    """
+
+    _instance = None
+
+    def __new__(cls) -> "ChatbotLabelCache":
+        if cls._instance is None:
+            cls._instance = super(ChatbotLabelCache, cls).__new__(cls)
+            cls._instance.labels = OrderedDict()
+        return cls._instance
+
+    @staticmethod
+    def build_key(conversation_snapshot: ConversationSnapshot) -> Optional[str]:
+        """Hash of the last CHATBOT_LABEL_CACHE_MESSAGES text messages, ignoring case, punctuation and spacing."""
+        text_messages = [
+            (message["role"], non_word_pattern.sub(" ", message["content"].lower()).strip())
+            for message in conversation_snapshot.get_entire_history()
+            if message.get("content") and message.get("role") != OutputRole.TOOL
+        ][-CHATBOT_LABEL_CACHE_MESSAGES:]
+        if not text_messages:
+            return None
+
+        tail_hash = hashlib.sha256(json.dumps(text_messages, ensure_ascii=False).encode()).hexdigest()
+        return f"{RedisPrefix.CHATBOT_LABEL_CACHE_KEY_PREFIX}{router_prompt_hash}:{tail_hash}"
+
+    async def get(self, key: str) -> Optional[ChatbotLabel]:
+        chatbot_label = self.labels.get(key)
+        if chatbot_label:
+            self.labels.move_to_end(key)
+            self.record_lookup("local_hit")
+            return chatbot_label
+
+        chatbot_label = await redis_client.get(key)
+        if chatbot_label in list(ChatbotLabel):
+            self.remember(key, ChatbotLabel(chatbot_label))
+            self.record_lookup("redis_hit")
+            return ChatbotLabel(chatbot_label)
+
+        self.record_lookup("miss")
+        return None
+
+    async def set(self, key: str, chatbot_label: ChatbotLabel) -> None:
+        self.remember(key, chatbot_label)
+        await redis_client.setex(key, CHATBOT_LABEL_CACHE_TTL, str(chatbot_label))
+
+    def remember(self, key: str, chatbot_label: ChatbotLabel) -> None:
+        self.labels[key] = chatbot_label
+        self.labels.move_to_end(key)
+        while len(self.labels) > CHATBOT_LABEL_CACHE_SIZE:
+            self.labels.popitem(last=False)
+            metrics.increment("chatbot_label_cache_evictions_total")
+        metrics.set_gauge("chatbot_label_cache_size", len(self.labels))
+
+    @staticmethod
+    def record_lookup(outcome: str) -> None:
+        metrics.increment("chatbot_label_cache_total", outcome=outcome)
+        lookups = sum(
+            metrics.get_counter("chatbot_label_cache_total", outcome=lookup_outcome)
+            for lookup_outcome in ("local_hit", "redis_hit", "miss")
+        )
+        hits = lookups - metrics.get_counter("chatbot_label_cache_total", outcome="miss")
+        metrics.set_gauge("chatbot_label_cache_hit_ratio", hits / lookups)
@@ -1,19 +1,45 @@
+import asyncio
+import logging
+from time import time
+from typing import Any, AsyncGenerator, Awaitable, Optional, Tuple, Union
 from handlers.domains.domain_handler import DomainChatHandler
 from handlers.out_of_scope.out_of_scope_handler import OutOfScopeChatHandler
 from models.chat.chat_message_input_model import ChatMessage, ChatbotLabel
 from models.chat.chat_message_output_model import OutputChatbotLabel
 from models.handler_config_model import HandlerConfigModel
-from router.gpt_chatbot_label import generate_chatbot_label
+from redis_services.conversation_snapshot import ConversationSnapshot
+from redis_services.redis_methods import set_chatbot_label
+from router.gpt_chatbot_label import classify_chatbot_label, generate_chatbot_label, record_chatbot_label_event
+from router.gpt_fused_router import classify_conversation
+from router.router_enums import RouterMode
+from router.speculative_execution import SpeculativeExecution
+from utils.env_constants import ROUTER_MODE, ROUTER_SPECULATIVE_EXECUTION
 from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
 from models.handler_response_model import HandlerResponse, HandlerResponseStatus
-from router.support_handoff_decider import is_seeking_human_assistance, get_handoff_response_message
+from router.handoff_message_cache import get_handoff_response_message
+from router.support_handoff_decider import is_seeking_human_assistance, pre_classify_conversation
 
 logger = Logger()
+metrics = Metrics()
 MAXIMUM_OUT_OF_SCOPE_ATTEMPTS = 3
 
 
+async def measure_execution_time(awaitable: Awaitable) -> Tuple[Any, float]:
+    start_time = time()
+    result = await awaitable
+    return result, time() - start_time
+
+
 class ChatbotRouter:
-    def __init__(self):
+    def __init__(
+        self,
+        router_mode: RouterMode = RouterMode(ROUTER_MODE),
+        speculative_execution: bool = ROUTER_SPECULATIVE_EXECUTION,
+    ):
+        self.router_mode = router_mode
+        self.speculative_execution = speculative_execution
+
         self.handler_classes = {
             ChatbotLabel.DOMAIN: DomainChatHandler,
             ChatbotLabel.OUT_OF_SCOPE: OutOfScopeChatHandler,
@@ -24,17 +50,250 @@ class ChatbotRouter:
             ChatbotLabel.OUT_OF_SCOPE: OutputChatbotLabel.OUT_OF_SCOPE_BOT,
         }
 
-    async def route(self, message: ChatMessage, handler_config: HandlerConfigModel) -> HandlerResponse:
-        if await is_seeking_human_assistance(handler_config.conversation_id, handler_config.user_id):
-            return HandlerResponse(
-                status=HandlerResponseStatus.SUPPORT_HANDOFF,
-                message=await get_handoff_response_message(handler_config.conversation_id, handler_config.user_id),
-                chatbot_label=OutputChatbotLabel.SUPPORT_HANDOFF_BOT,
+    async def route(
+        self, message: ChatMessage, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> HandlerResponse:
+        speculative_execution = None
+        if self.speculative_execution:
+            speculative_execution = await self.start_speculative_execution(
+                message, handler_config, conversation_snapshot
             )
 
-        message.chatbot_label = await generate_chatbot_label(handler_config.conversation_id, handler_config.user_id)
+        try:
+            chatbot_label = await self.classify(handler_config, conversation_snapshot)
+        except BaseException:
+            if speculative_execution:
+                await speculative_execution.cancel()
+            raise
+
+        classified_at = time()
+
+        if chatbot_label is None:
+            if speculative_execution:
+                await self.discard_speculative_execution(speculative_execution, handler_config, "handoff")
+            return await self.build_handoff_response(handler_config, conversation_snapshot)
+
+        message.chatbot_label = chatbot_label
+
+        if self.speculative_execution:
+            await set_chatbot_label(handler_config.user_id, chatbot_label)
+
+        if speculative_execution and speculative_execution.chatbot_label == chatbot_label:
+            response = await self.confirm_speculative_execution(speculative_execution, handler_config, classified_at)
+        else:
+            if speculative_execution:
+                await self.discard_speculative_execution(speculative_execution, handler_config, "miss")
+
+            handler_class = self.handler_classes.get(message.chatbot_label)
+            response = await handler_class(handler_config, conversation_snapshot).handle(message)
 
-        handler_class = self.handler_classes.get(message.chatbot_label)
-        response = await handler_class(handler_config).handle(message)
         response.chatbot_label = self.chatbot_label_mapping.get(message.chatbot_label)
         return response
+
+    async def route_stream(
+        self, message: ChatMessage, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> AsyncGenerator[Union[str, HandlerResponse], None]:
+        """
+        Streaming counterpart of route: yields response tokens followed by the final HandlerResponse.
+        Speculative execution is not used here, as the handler output is sent to the user while it is generated.
+        """
+        chatbot_label = await self.classify(handler_config, conversation_snapshot)
+
+        if chatbot_label is None:
+            yield await self.build_handoff_response(handler_config, conversation_snapshot)
+            return
+
+        message.chatbot_label = chatbot_label
+
+        if self.speculative_execution:
+            await set_chatbot_label(handler_config.user_id, chatbot_label)
+
+        handler_class = self.handler_classes.get(message.chatbot_label)
+        async for response_part in handler_class(handler_config, conversation_snapshot).handle_stream(message):
+            if isinstance(response_part, HandlerResponse):
+                response_part.chatbot_label = self.chatbot_label_mapping.get(message.chatbot_label)
+            yield response_part
+
+    @staticmethod
+    async def build_handoff_response(
+        handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> HandlerResponse:
+        return HandlerResponse(
+            status=HandlerResponseStatus.SUPPORT_HANDOFF,
+            message=await get_handoff_response_message(
+                handler_config.conversation_id, handler_config.user_id, conversation_snapshot
+            ),
+            chatbot_label=OutputChatbotLabel.SUPPORT_HANDOFF_BOT,
+        )
+
+    async def classify(
+        self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> Optional[ChatbotLabel]:
+        if self.router_mode == RouterMode.CONCURRENT:
+            return await self.classify_concurrently(handler_config, conversation_snapshot)
+        if self.router_mode == RouterMode.FUSED:
+            return await self.classify_fused(handler_config, conversation_snapshot)
+        return await self.classify_sequentially(handler_config, conversation_snapshot)
+
+    async def start_speculative_execution(
+        self, message: ChatMessage, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> Optional[SpeculativeExecution]:
+        previous_chatbot_label = conversation_snapshot.chatbot_label
+        handler_class = self.handler_classes.get(previous_chatbot_label)
+
+        if not handler_class:
+            metrics.increment("speculative_execution_total", outcome="skipped")
+            return None
+
+        return SpeculativeExecution(
+            ChatbotLabel(previous_chatbot_label), handler_class(handler_config, conversation_snapshot), message
+        )
+
+    async def confirm_speculative_execution(
+        self, speculative_execution: SpeculativeExecution, handler_config: HandlerConfigModel, classified_at: float
+    ) -> HandlerResponse:
+        response = await speculative_execution.confirm()
+        saved_time = speculative_execution.get_saved_time(classified_at)
+
+        metrics.increment("speculative_execution_total", outcome="hit")
+        metrics.observe("speculative_execution_saved_seconds", saved_time)
+        self.update_speculative_execution_hit_rate()
+
+        logger.log(
+            "Speculative handler execution hit",
+            user_id=handler_config.user_id,
+            conversation_id=handler_config.conversation_id,
+            chatbot_label=speculative_execution.chatbot_label,
+            saved_time=saved_time,
+        )
+
+        return response
+
+    async def discard_speculative_execution(
+        self, speculative_execution: SpeculativeExecution, handler_config: HandlerConfigModel, outcome: str
+    ) -> None:
+        await speculative_execution.cancel()
+
+        metrics.increment("speculative_execution_total", outcome=outcome)
+        self.update_speculative_execution_hit_rate()
+
+        logger.log(
+            "Speculative handler execution discarded",
+            user_id=handler_config.user_id,
+            conversation_id=handler_config.conversation_id,
+            chatbot_label=speculative_execution.chatbot_label,
+            outcome=outcome,
+        )
+
+    @staticmethod
+    def update_speculative_execution_hit_rate() -> None:
+        hits = metrics.get_counter("speculative_execution_total", outcome="hit")
+        attempts = hits + metrics.get_counter("speculative_execution_total", outcome="miss")
+        if attempts:
+            metrics.set_gauge("speculative_execution_hit_rate", hits / attempts)
+
+    async def classify_sequentially(
+        self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> Optional[ChatbotLabel]:
+        """Returns the chatbot label for the conversation, or None if it must be handed off to support."""
+        if await is_seeking_human_assistance(
+            handler_config.conversation_id, handler_config.user_id, conversation_snapshot
+        ):
+            return None
+
+        return await generate_chatbot_label(
+            handler_config.conversation_id, handler_config.user_id, conversation_snapshot
+        )
+
+    async def classify_fused(
+        self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> Optional[ChatbotLabel]:
+        """
+        Same contract as classify_sequentially, but the handoff decision and the chatbot label come from one GPT
+        request. Falls back to the separate requests when GPT does not answer that request validly.
+        """
+        start_time = time()
+        if pre_classify_conversation(handler_config.conversation_id, handler_config.user_id, conversation_snapshot):
+            return None
+
+        routing_decision = await classify_conversation(
+            handler_config.conversation_id, handler_config.user_id, conversation_snapshot
+        )
+
+        if routing_decision is None:
+            metrics.increment("fused_routing_total", outcome="fallback")
+            logger.log(
+                "Fused routing failed, falling back to separate requests",
+                level=logging.WARNING,
+                user_id=handler_config.user_id,
+                conversation_id=handler_config.conversation_id,
+            )
+            return await self.classify_sequentially(handler_config, conversation_snapshot)
+
+        is_handoff_needed, chatbot_label = routing_decision
+        metrics.increment("fused_routing_total", outcome="handoff" if is_handoff_needed else "label")
+        logger.log(
+            "Fused routing latency",
+            user_id=handler_config.user_id,
+            conversation_id=handler_config.conversation_id,
+            chatbot_label=chatbot_label,
+            routing_time=time() - start_time,
+        )
+
+        return chatbot_label
+
+    async def classify_concurrently(
+        self, handler_config: HandlerConfigModel, conversation_snapshot: ConversationSnapshot
+    ) -> Optional[ChatbotLabel]:
+        """
+        Same contract as classify_sequentially, but the handoff decision and the chatbot label are requested
+        at the same time. If the conversation must be handed off, the label request is cancelled, and the label
+        is only recorded once the handoff was ruled out.
+        """
+        start_time = time()
+
+        handoff_task = asyncio.create_task(
+            measure_execution_time(
+                is_seeking_human_assistance(
+                    handler_config.conversation_id, handler_config.user_id, conversation_snapshot
+                )
+            )
+        )
+        chatbot_label_task = asyncio.create_task(
+            measure_execution_time(
+                classify_chatbot_label(handler_config.conversation_id, handler_config.user_id, conversation_snapshot)
+            )
+        )
+
+        try:
+            is_handoff_needed, handoff_time = await handoff_task
+        except BaseException:
+            chatbot_label_task.cancel()
+            raise
+
+        if is_handoff_needed:
+            chatbot_label_task.cancel()
+            logger.log(
+                "Concurrent routing: handoff detected, chatbot label request cancelled",
+                user_id=handler_config.user_id,
+                conversation_id=handler_config.conversation_id,
+                handoff_time=handoff_time,
+                routing_time=time() - start_time,
+            )
+            return None
+
+        (chatbot_label, cached), chatbot_label_time = await chatbot_label_task
+        await record_chatbot_label_event(handler_config.conversation_id, chatbot_label, cached=cached)
+        routing_time = time() - start_time
+
+        logger.log(
+            "Concurrent routing latency",
+            user_id=handler_config.user_id,
+            conversation_id=handler_config.conversation_id,
+            handoff_time=handoff_time,
+            chatbot_label_time=chatbot_label_time,
+            routing_time=routing_time,
+            saved_time=handoff_time + chatbot_label_time - routing_time,
+        )
+
+        return chatbot_label
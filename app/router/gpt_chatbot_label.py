@@ -1,32 +1,57 @@
+from typing import Tuple
 from api.external.gpt_clients.gpt_enums import GPTResponseFormat, GPTActionNames, GPTTeamNames, GPTTemperature
-from database.database_calls import postgres_database
+from database.helpers import record_event, get_turn_assistant_part_id
 from database.database_models.events_table_model import EventsTable, EventType
 from helpers.tenacity_retry_strategies import chatbot_label_retry_strategy
 from helpers.custom_exceptions import InvalidGPTResponseException
-from redis_services.redis_methods import get_assistant_part_id
+from redis_services.conversation_snapshot import ConversationSnapshot
 from utils.logger.logger import Logger
 from helpers.gpt_helper import decode_json_string, get_conversation_history_with_system_prompt
 from models.chat.chat_message_input_model import ChatbotLabel
+from router.chatbot_label_cache import ChatbotLabelCache
 from router.gpt_router_prompts import get_router_prompt
-from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from api.external.gpt_clients.openai.openai_model_routing import get_action_model
 from api.external.gpt_clients.openai.openai_client import OpenAIChat
 
 openai_client = OpenAIChat()
 logger = Logger()
+chatbot_label_cache = ChatbotLabelCache()
 
 
 async def is_chatbot_label_valid(chatbot_label: str) -> bool:
     return any(chatbot_label == label for label in ChatbotLabel)
 
 
+async def generate_chatbot_label(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> ChatbotLabel:
+    chatbot_label, cached = await classify_chatbot_label(conversation_id, user_id, conversation_snapshot)
+    await record_chatbot_label_event(conversation_id, chatbot_label, cached=cached)
+    return chatbot_label
+
+
 @chatbot_label_retry_strategy
-async def generate_chatbot_label(conversation_id: str, user_id: str) -> ChatbotLabel:
+async def classify_chatbot_label(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> Tuple[ChatbotLabel, bool]:
+    """Returns the chatbot label and whether it came from the cache, without recording the label event."""
+    cache_key = ChatbotLabelCache.build_key(conversation_snapshot)
+    cached_chatbot_label = await chatbot_label_cache.get(cache_key) if cache_key else None
+    if cached_chatbot_label:
+        return cached_chatbot_label, True
+
     system_description = get_router_prompt()
-    messages = await get_conversation_history_with_system_prompt(system_description, conversation_id)
+    model = get_action_model(GPTActionNames.CHATBOT_LABEL_ACTION_NAME)
+    messages = await get_conversation_history_with_system_prompt(
+        system_description,
+        conversation_snapshot,
+        GPTActionNames.CHATBOT_LABEL_ACTION_NAME,
+        model,
+    )
 
     gpt_response = await openai_client.get_response(
         messages=messages,
-        model=OpenAIModel.GPT_4O_2024_08_06,
+        model=model,
         response_format=GPTResponseFormat.JSON,
         temperature=GPTTemperature.ZERO,
         action_name=GPTActionNames.CHATBOT_LABEL_ACTION_NAME,
@@ -48,14 +73,24 @@ async def generate_chatbot_label(conversation_id: str, user_id: str) -> ChatbotL
         logger.log("GPT response was not a valid chatbot label.", conversation_id=conversation_id)
         raise InvalidGPTResponseException("GPT response was not a valid chatbot label.")
 
-    await postgres_database.insert_into_events_table(
+    if cache_key:
+        await chatbot_label_cache.set(cache_key, ChatbotLabel(decoded_chatbot_label))
+
+    return decoded_chatbot_label, False
+
+
+async def record_chatbot_label_event(conversation_id: str, chatbot_label: str, cached: bool = False) -> None:
+    await record_event(
         EventsTable(
             conversation_id=conversation_id,
             event_type=EventType.CHATBOT_LABEL,
-            payload={"content": {"message": "Setting active chatbot label for conversation",
-                                 "label": decoded_chatbot_label}},
-            message_part_id=await get_assistant_part_id(user_id),
+            payload={
+                "content": {
+                    "message": "Setting active chatbot label for conversation",
+                    "label": chatbot_label,
+                    "cached": cached,
+                }
+            },
+            message_part_id=get_turn_assistant_part_id(),
         )
     )
-
-    return decoded_chatbot_label
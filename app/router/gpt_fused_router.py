@@ -0,0 +1,76 @@
+import logging
+from typing import Optional, Tuple
+from api.external.gpt_clients.gpt_enums import GPTResponseFormat, GPTActionNames, GPTTeamNames, GPTTemperature
+from api.external.gpt_clients.openai.openai_client import OpenAIChat
+from api.external.gpt_clients.openai.openai_model_routing import get_action_model
+from helpers.custom_exceptions import InvalidGPTResponseException
+from helpers.gpt_helper import decode_json_string, get_conversation_history_with_system_prompt
+from helpers.tenacity_retry_strategies import fused_router_retry_strategy
+from models.chat.chat_message_input_model import ChatbotLabel
+from redis_services.conversation_snapshot import ConversationSnapshot
+from router.gpt_chatbot_label import is_chatbot_label_valid, record_chatbot_label_event
+from router.gpt_router_prompts import get_fused_router_prompt
+from router.support_handoff_decider import decode_handoff_boolean
+from utils.logger.logger import Logger
+
+openai_client = OpenAIChat()
+logger = Logger()
+
+
+@fused_router_retry_strategy
+async def classify_conversation(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> Optional[Tuple[bool, Optional[ChatbotLabel]]]:
+    """
+    Makes the handoff decision and picks the chatbot label with one GPT request.
+    Returns (is_seeking_human_assistance, chatbot_label), where the label is None when the conversation is handed off,
+    or None when GPT did not give a valid answer, so the caller can fall back to the separate requests.
+    """
+    model = get_action_model(GPTActionNames.FUSED_ROUTER_ACTION)
+    messages = await get_conversation_history_with_system_prompt(
+        get_fused_router_prompt(),
+        conversation_snapshot,
+        GPTActionNames.FUSED_ROUTER_ACTION,
+        model,
+    )
+
+    gpt_response = await openai_client.get_response(
+        messages=messages,
+        model=model,
+        response_format=GPTResponseFormat.JSON,
+        temperature=GPTTemperature.ZERO,
+        action_name=GPTActionNames.FUSED_ROUTER_ACTION,
+        team_name=GPTTeamNames.AI,
+    )
+
+    if not gpt_response:
+        logger.log("classify_conversation: GPT failed to generate a response.", conversation_id=conversation_id)
+        raise InvalidGPTResponseException("GPT failed to generate a response.")
+
+    decoded_response = decode_json_string(gpt_response.choices[0].message.content)
+    if not decoded_response:
+        logger.log("classify_conversation: GPT response was not valid JSON.", conversation_id=conversation_id)
+        raise InvalidGPTResponseException("GPT response was not valid JSON.")
+
+    is_handoff_needed = decode_handoff_boolean(decoded_response.get("is_seeking_human_assistance", {}))
+    if not isinstance(is_handoff_needed, bool):
+        logger.log(
+            "classify_conversation: GPT response was not a boolean",
+            conversation_id=conversation_id,
+            user_id=user_id,
+            level=logging.WARNING,
+            payload=is_handoff_needed,
+        )
+        raise InvalidGPTResponseException("GPT response was not a boolean")
+
+    if is_handoff_needed:
+        return True, None
+
+    chatbot_label = decoded_response.get("team_label", {})
+    if not await is_chatbot_label_valid(chatbot_label):
+        logger.log("classify_conversation: GPT response was not a valid chatbot label.", conversation_id=conversation_id)
+        raise InvalidGPTResponseException("GPT response was not a valid chatbot label.")
+
+    await record_chatbot_label_event(conversation_id, chatbot_label)
+
+    return False, ChatbotLabel(chatbot_label)
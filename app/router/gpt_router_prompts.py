@@ -44,6 +44,30 @@ def get_router_prompt() -> str:
     return "\n".join(prompt_lines)
 
 
+def get_fused_router_prompt() -> str:
+    prompt_lines = [
+        """You route a customer conversation. Focus on the user's latest message and make two decisions.""",
+        """1. is_seeking_human_assistance: True only if the customer clearly indicates that they want to talk to
+        a real human, agent or specialist, e.g. "I want live chat", "I want to talk to a human", "I need human
+        assistance", or similar phrases. A simple mention of "support" or descriptions of problems/issues, such as
+        "website doesn't work", does not mean that the user is seeking assistance from an agent. If the customer
+        is using swear words, cursing, or inappropriate language, also return True. In other cases, return False.""",
+        """2. team_label: select 1 team that is the most capable to further assist the customer. The teams are
+        specializing only in 1 topic. Below are possible team names, and explanations, in what they are
+        specializing:""",
+    ]
+
+    for chatbot_label, description in CHATBOT_DESCRIPTIONS.items():
+        prompt_lines.append(f'"{chatbot_label}": {description.strip()}')
+
+    prompt_lines.append(
+        """Respond in JSON format with is_seeking_human_assistance and team_label fields. You MUST respond as in
+        this example: {"is_seeking_human_assistance": false, "team_label": "team_name"}"""
+    )
+
+    return "\n".join(prompt_lines)
+
+
 def get_is_handoff_needed_prompt() -> str:
     return """Based on the received customer conversation, you need to decide if the customer is explicitly asking to contact
     a real human, agent or specialist. A simple mention of "support" or descriptions of problems/issues, such as "website doesn't work",
@@ -57,8 +81,8 @@ def get_is_handoff_needed_prompt() -> str:
     {"is_seeking_human_assistance": False}"""
 
 
-def get_handoff_message_prompt() -> str:
-    return """Below between triple dashes is the message that needs to be rephrased and translated to user language language:
+def get_handoff_message_prompt(language_name: str) -> str:
+    return f"""Below between triple dashes is the message that needs to be rephrased and translated to {language_name}:
     
     ---
     I’m now redirecting you to our Customer Success Team for further assistance.
@@ -0,0 +1,160 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.env_constants import (
+    HANDOFF_CLASSIFIER_MODEL_PATH,
+    HANDOFF_CLASSIFIER_NO_THRESHOLD,
+    HANDOFF_CLASSIFIER_YES_THRESHOLD,
+)
+from utils.logger.logger import Logger
+
+MODEL_VERSION = 1
+HANDOFF_CLASS = "handoff"
+NO_HANDOFF_CLASS = "no_handoff"
+
+# Explicit requests to be put through to a person, in the languages we support. A match is always a handoff, so
+# every pattern is anchored to a request verb: "live chat", "real person" or "Mitarbeiter" on their own are just as
+# common in questions about websites and accounts. Check changes with `commands.handoff_classifier evaluate`.
+HUMAN_NOUNS = r"(real\s+|live\s+|human\s+)?(human|person|agent|operator|representative|specialist|someone)"
+NOT_A_PERSON = r"(?!\s+(bot|chatbot|plugin|widget|app|photo|picture|image|feature|account|role|builder)\b)"
+HUMAN_REQUEST_PATTERNS = [
+    rf"\b(talk|speak|chat)\s+(to|with)\s+(a|an|the|some|your)?\s*{HUMAN_NOUNS}\b{NOT_A_PERSON}",
+    rf"\b(connect|transfer|put)\s+me\s+(to|with|through\s+to)\s+(a|an|the|some|your)?\s*{HUMAN_NOUNS}\b{NOT_A_PERSON}",
+    rf"\bi\s+(want|need|would\s+like)\s+(a|an)\s+{HUMAN_NOUNS}\b{NOT_A_PERSON}",
+    r"\b(hablar|chatear)\s+con\s+(un|una|el|la|alguna)?\s*(humano|persona|agente|operador|asesor)",
+    r"\b(falar|conversar)\s+com\s+(um|uma|o|a|algum)?\s*(humano|pessoa|atendente|agente|operador)",
+    r"\bparler\s+(à|a|avec)\s+(un|une|quelqu'un|le|la)?\s*(humain|personne|agent|conseiller|opérateur)",
+    r"\bmit\s+(einem|einer)\s+(echten\s+)?(menschen|mitarbeiter|mitarbeiterin|berater|beraterin)\s+"
+    r"(sprechen|reden)",
+    r"\bparlare\s+con\s+(un|una|un')?\s*(umano|persona|operatore|agente)",
+    r"\b(bicara|berbicara|ngobrol)\s+dengan\s+(manusia|agen|operator|cs)\b",
+    r"\b(kalbėti|pasikalbėti|susisiekti)\s+su\s+(žmogumi|operatoriumi|konsultantu|agentu)",
+    r"\b(rozmawiać|porozmawiać)\s+z\s+(człowiekiem|konsultantem|agentem|operatorem)",
+    r"(поговорить|связаться|говорить)\s+с\s+(человеком|оператором|консультантом|агентом)",
+]
+
+# Swearing is handed off as well, as instructed in get_is_handoff_needed_prompt.
+PROFANITY_WORDS = """
+    fuck fucking fucked shit bullshit bitch asshole bastard dickhead motherfucker
+    mierda puta joder cabrón gilipollas pendejo caralho porra merda foda-se
+    putain merde connard salope scheiße scheisse arschloch fotze cazzo vaffanculo stronzo
+    anjing bangsat kurwa blyat бля блять сука хуй пиздец
+""".split()
+
+human_request_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in HUMAN_REQUEST_PATTERNS), re.IGNORECASE)
+profanity_pattern = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(word) for word in PROFANITY_WORDS) + r")(?!\w)", re.IGNORECASE
+)
+word_pattern = re.compile(r"[^\W_]+", re.UNICODE)
+
+logger = Logger()
+
+
+def extract_features(text: str) -> List[str]:
+    words = word_pattern.findall(text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class HandoffClassifier:
+    """
+    Multinomial naive Bayes over word unigrams and bigrams of the latest user message, trained offline with
+    `python -m commands.handoff_classifier train` and stored as JSON.
+    """
+
+    def __init__(self, class_counts: Dict[str, int], feature_counts: Dict[str, Dict[str, int]]) -> None:
+        self.class_counts = class_counts
+        self.feature_counts = feature_counts
+        self.feature_totals = {label: sum(counts.values()) for label, counts in feature_counts.items()}
+        self.vocabulary_size = len(set().union(*(counts.keys() for counts in feature_counts.values())))
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[str, bool]]) -> "HandoffClassifier":
+        class_counts = Counter()
+        feature_counts = {HANDOFF_CLASS: Counter(), NO_HANDOFF_CLASS: Counter()}
+        for text, is_handoff in samples:
+            label = HANDOFF_CLASS if is_handoff else NO_HANDOFF_CLASS
+            class_counts[label] += 1
+            feature_counts[label].update(extract_features(text))
+        return cls(dict(class_counts), {label: dict(counts) for label, counts in feature_counts.items()})
+
+    @classmethod
+    def load(cls, model_path: str) -> "HandoffClassifier":
+        with open(model_path) as model_file:
+            model = json.load(model_file)
+        if model.get("version") != MODEL_VERSION:
+            raise ValueError(f"Unsupported handoff classifier model version {model.get('version')}")
+        return cls(model["class_counts"], model["feature_counts"])
+
+    def save(self, model_path: str) -> None:
+        with open(model_path, "w") as model_file:
+            json.dump(
+                {"version": MODEL_VERSION, "class_counts": self.class_counts, "feature_counts": self.feature_counts},
+                model_file,
+                ensure_ascii=False,
+            )
+
+    def predict_handoff_probability(self, text: str) -> Optional[float]:
+        """Returns None when the message has no feature seen in training."""
+        known_features = [
+            feature
+            for feature in extract_features(text)
+            if any(feature in counts for counts in self.feature_counts.values())
+        ]
+        if not known_features or not all(self.class_counts.get(label) for label in self.feature_counts):
+            return None
+
+        total_samples = sum(self.class_counts.values())
+        log_probabilities = {}
+        for label, counts in self.feature_counts.items():
+            log_probability = math.log(self.class_counts[label] / total_samples)
+            denominator = self.feature_totals[label] + self.vocabulary_size
+            for feature in known_features:
+                log_probability += math.log((counts.get(feature, 0) + 1) / denominator)
+            log_probabilities[label] = log_probability
+
+        log_odds = log_probabilities[HANDOFF_CLASS] - log_probabilities[NO_HANDOFF_CLASS]
+        return 1 / (1 + math.exp(-max(min(log_odds, 50), -50)))
+
+
+def load_handoff_classifier() -> Optional[HandoffClassifier]:
+    if not HANDOFF_CLASSIFIER_MODEL_PATH:
+        return None
+    if not os.path.exists(HANDOFF_CLASSIFIER_MODEL_PATH):
+        logger.log("Handoff classifier model not found", level=logging.WARNING, path=HANDOFF_CLASSIFIER_MODEL_PATH)
+        return None
+    try:
+        return HandoffClassifier.load(HANDOFF_CLASSIFIER_MODEL_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        logger.log("Failed loading handoff classifier model", level=logging.WARNING, payload=e)
+        return None
+
+
+handoff_classifier = load_handoff_classifier()
+
+
+def pre_classify_handoff(
+    message: str, classifier: Optional[HandoffClassifier] = handoff_classifier
+) -> Tuple[Optional[bool], str]:
+    """
+    Returns (decision, reason). The decision is None when the message is ambiguous and has to be sent to GPT.
+    Keyword and profanity matches are always a handoff; otherwise the model decides when it is confident enough.
+    """
+    if human_request_pattern.search(message):
+        return True, "human_request"
+    if profanity_pattern.search(message):
+        return True, "profanity"
+    if classifier is None:
+        return None, "ambiguous"
+
+    handoff_probability = classifier.predict_handoff_probability(message)
+    if handoff_probability is None:
+        return None, "ambiguous"
+    if handoff_probability >= HANDOFF_CLASSIFIER_YES_THRESHOLD:
+        return True, "model"
+    if handoff_probability <= HANDOFF_CLASSIFIER_NO_THRESHOLD:
+        return False, "model"
+    return None, "ambiguous"
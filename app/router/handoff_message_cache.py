@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Dict
+from helpers.deadline import clear_deadline
+from helpers.language_detection import DEFAULT_LANGUAGE, LANGUAGE_NAMES, detect_language
+from redis_services.conversation_snapshot import ConversationSnapshot
+from redis_services.redis_client import RedisClient
+from redis_services.redis_enums import RedisExpiration, RedisPrefix
+from router.gpt_router_prompts import DEFAULT_HANDOFF_MESSAGE
+from router.support_handoff_decider import generate_handoff_message
+from utils.env_constants import HANDOFF_MESSAGE_WARMUP_LANGUAGES
+from utils.logger.logger import Logger
+from utils.metrics.metrics import Metrics
+
+logger = Logger()
+metrics = Metrics()
+redis_client = RedisClient()
+
+# The handoff message never depends on the conversation, only on its language, so each translation is generated
+# once and shared by every worker through Redis.
+handoff_messages: Dict[str, str] = {DEFAULT_LANGUAGE: DEFAULT_HANDOFF_MESSAGE}
+
+# One lookup at a time per language; concurrent misses wait for the lookup that is already running.
+handoff_message_tasks: Dict[str, asyncio.Task] = {}
+
+
+def get_handoff_message_key(language: str) -> str:
+    return f"{RedisPrefix.HANDOFF_MESSAGE_KEY_PREFIX}{language}"
+
+
+async def get_handoff_response_message(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> str:
+    language = detect_language(conversation_snapshot.get_latest_user_message() or "")
+    logger.log("Handoff message language detected", conversation_id=conversation_id, user_id=user_id, language=language)
+    return await get_handoff_message(language)
+
+
+async def get_handoff_message(language: str) -> str:
+    handoff_message = handoff_messages.get(language)
+    if handoff_message:
+        metrics.increment("handoff_message_cache_total", outcome="hit")
+        return handoff_message
+
+    handoff_message_task = handoff_message_tasks.get(language)
+    if handoff_message_task is None:
+        handoff_message_task = asyncio.create_task(load_handoff_message(language))
+        handoff_message_tasks[language] = handoff_message_task
+        handoff_message_task.add_done_callback(lambda _task: handoff_message_tasks.pop(language, None))
+        metrics.increment("handoff_message_cache_total", outcome="miss")
+    else:
+        metrics.increment("handoff_message_cache_total", outcome="coalesced")
+
+    # Shielded, so a cancelled request does not cancel the lookup other requests are waiting for.
+    return await asyncio.shield(handoff_message_task)
+
+
+async def load_handoff_message(language: str) -> str:
+    clear_deadline()
+    handoff_message = await redis_client.get(get_handoff_message_key(language))
+    if handoff_message:
+        handoff_messages[language] = handoff_message
+        return handoff_message
+
+    handoff_message = await generate_handoff_message(language)
+    if handoff_message == DEFAULT_HANDOFF_MESSAGE:
+        # GPT failed and the English fallback was returned; it is not cached, so the next handoff retries.
+        return handoff_message
+
+    handoff_messages[language] = handoff_message
+    await redis_client.setex(get_handoff_message_key(language), RedisExpiration.ONE_WEEK, handoff_message)
+    logger.log("Handoff message generated", language=language)
+    return handoff_message
+
+
+async def warm_up_handoff_messages() -> None:
+    languages = [language.strip() for language in HANDOFF_MESSAGE_WARMUP_LANGUAGES.split(",") if language.strip()]
+    unknown_languages = [language for language in languages if language not in LANGUAGE_NAMES]
+    if unknown_languages:
+        logger.log("Unknown handoff message warm-up languages", level=logging.WARNING, languages=unknown_languages)
+
+    await asyncio.gather(
+        *(get_handoff_message(language) for language in languages if language in LANGUAGE_NAMES),
+        return_exceptions=True,
+    )
+    logger.log("Handoff messages warmed up", languages=sorted(handoff_messages))
@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class RouterMode(StrEnum):
+    SEQUENTIAL = "sequential"
+    CONCURRENT = "concurrent"
+    FUSED = "fused"
@@ -0,0 +1,40 @@
+import asyncio
+from time import time
+from typing import Optional
+from handlers.base_handler import BaseChatHandler
+from models.chat.chat_message_input_model import ChatMessage, ChatbotLabel
+from models.handler_response_model import HandlerResponse
+
+
+class SpeculativeExecution:
+    """
+    Runs a handler for the conversation's previous chatbot label while the new label is still being classified.
+    The handler is started with its side effects on hold, so it can only call GPT. Redis and Postgres writes
+    start after confirm(); cancel() discards the run before anything has been persisted.
+    """
+
+    def __init__(self, chatbot_label: ChatbotLabel, handler: BaseChatHandler, message: ChatMessage) -> None:
+        self.chatbot_label = chatbot_label
+        self.handler = handler
+        self.started_at = time()
+        self.finished_at: Optional[float] = None
+
+        self.handler.hold_side_effects()
+        self.task = asyncio.create_task(self.handler.handle(message))
+        self.task.add_done_callback(self.mark_finished)
+
+    def mark_finished(self, _task: asyncio.Task) -> None:
+        self.finished_at = time()
+
+    def get_saved_time(self, classified_at: float) -> float:
+        """Time the handler spent working before the chatbot label was known."""
+        work_stopped_at = self.handler.side_effects_blocked_at or self.finished_at or classified_at
+        return max(0.0, min(classified_at, work_stopped_at) - self.started_at)
+
+    async def confirm(self) -> HandlerResponse:
+        self.handler.release_side_effects()
+        return await self.task
+
+    async def cancel(self) -> None:
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
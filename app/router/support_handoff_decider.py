@@ -4,24 +4,60 @@ from helpers.tenacity_retry_strategies import handoff_retry_strategy, handoff_su
 from helpers.custom_exceptions import InvalidGPTResponseException
 from utils.logger.logger import Logger
 from helpers.gpt_helper import decode_json_string, get_conversation_history_with_system_prompt
+from helpers.language_detection import LANGUAGE_NAMES
 from router.gpt_router_prompts import get_is_handoff_needed_prompt, get_handoff_message_prompt
+from router.handoff_classifier import pre_classify_handoff
+from utils.metrics.metrics import Metrics
 import logging
+from typing import Any, Optional
+from redis_services.conversation_snapshot import ConversationSnapshot
 from api.external.gpt_clients.openai.openai_client import OpenAIChat
-from api.external.gpt_clients.openai.openai_enums import OpenAIModel
+from api.external.gpt_clients.openai.openai_model_routing import get_action_model
 
 
 openai_client = OpenAIChat()
 logger = Logger()
+metrics = Metrics()
+
+
+def pre_classify_conversation(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> Optional[bool]:
+    """Decides clear cases locally from the latest user message. Returns None when GPT has to decide."""
+    is_handoff_needed, reason = pre_classify_handoff(conversation_snapshot.get_latest_user_message() or "")
+    outcome = "gpt" if is_handoff_needed is None else str(is_handoff_needed).lower()
+    metrics.increment("handoff_pre_classifier_total", outcome=outcome, reason=reason)
+    if is_handoff_needed is not None:
+        logger.log(
+            "Handoff decided by the pre-classifier",
+            conversation_id=conversation_id,
+            user_id=user_id,
+            is_seeking_human_assistance=is_handoff_needed,
+            reason=reason,
+        )
+    return is_handoff_needed
 
 
 @handoff_retry_strategy
-async def is_seeking_human_assistance(conversation_id: str, user_id: str) -> bool:
-    messages = await get_conversation_history_with_system_prompt(get_is_handoff_needed_prompt(), conversation_id)
+async def is_seeking_human_assistance(
+    conversation_id: str, user_id: str, conversation_snapshot: ConversationSnapshot
+) -> bool:
+    is_handoff_needed = pre_classify_conversation(conversation_id, user_id, conversation_snapshot)
+    if is_handoff_needed is not None:
+        return is_handoff_needed
+
+    model = get_action_model(GPTActionNames.HANDOFF_DECIDER_ACTION)
+    messages = await get_conversation_history_with_system_prompt(
+        get_is_handoff_needed_prompt(),
+        conversation_snapshot,
+        GPTActionNames.HANDOFF_DECIDER_ACTION,
+        model,
+    )
     gpt_response = await openai_client.get_response(
         messages=messages,
         action_name=GPTActionNames.HANDOFF_DECIDER_ACTION,
         team_name=GPTTeamNames.AI,
-        model=OpenAIModel.GPT_4O_2024_08_06,
+        model=model,
         response_format=GPTResponseFormat.JSON,
         temperature=GPTTemperature.ZERO,
     )
@@ -46,13 +82,7 @@ async def is_seeking_human_assistance(conversation_id: str, user_id: str) -> boo
         )
         raise InvalidGPTResponseException("GPT response was not valid JSON.")
 
-    decoded_handoff_boolean = decoded_handoff_boolean.get("is_seeking_human_assistance", {})
-
-    if isinstance(decoded_handoff_boolean, int):
-        decoded_handoff_boolean = bool(decoded_handoff_boolean)
-    elif isinstance(decoded_handoff_boolean, str):
-        if decoded_handoff_boolean.lower() in ["true", "false"]:
-            decoded_handoff_boolean = decoded_handoff_boolean.lower() == "true"
+    decoded_handoff_boolean = decode_handoff_boolean(decoded_handoff_boolean.get("is_seeking_human_assistance", {}))
 
     if not isinstance(decoded_handoff_boolean, bool):
         logger.log(
@@ -67,21 +97,29 @@ async def is_seeking_human_assistance(conversation_id: str, user_id: str) -> boo
     return decoded_handoff_boolean
 
 
+def decode_handoff_boolean(handoff_value: Any) -> Any:
+    """GPT sometimes answers with 0/1 or "True"/"False" instead of a JSON boolean."""
+    if isinstance(handoff_value, int):
+        return bool(handoff_value)
+    if isinstance(handoff_value, str) and handoff_value.lower() in ["true", "false"]:
+        return handoff_value.lower() == "true"
+    return handoff_value
+
+
 @handoff_support_message_retry_strategy
-async def get_handoff_response_message(conversation_id: str, user_id: str) -> str:
+async def generate_handoff_message(language: str) -> str:
     gpt_response = await openai_client.get_response(
-        messages=[{"role": GPTRole.SYSTEM, "content": get_handoff_message_prompt()}],
+        messages=[{"role": GPTRole.SYSTEM, "content": get_handoff_message_prompt(LANGUAGE_NAMES[language])}],
         action_name=GPTActionNames.HANDOFF_MESSAGE_ACTION,
         team_name=GPTTeamNames.AI,
-        model=OpenAIModel.GPT_4O_2024_08_06,
+        model=get_action_model(GPTActionNames.HANDOFF_MESSAGE_ACTION),
         temperature=GPTTemperature.ZERO,
     )
 
     if not gpt_response:
         logger.log(
-            "get_handoff_response_message: GPT failed to generate a response.",
-            conversation_id=conversation_id,
-            user_id=user_id,
+            "generate_handoff_message: GPT failed to generate a response.",
+            language=language,
             level=logging.WARNING,
         )
         raise InvalidGPTResponseException("GPT failed to generate a response.")
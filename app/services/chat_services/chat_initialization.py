@@ -1,43 +1,36 @@
-from typing import List, Dict
-from helpers.conversation import create_new_conversation
+from typing import List, Dict, Tuple
+from fastapi import HTTPException, status
+from helpers.conversation import generate_conversation_id, save_new_conversation
 from redis_services.redis_message_formatter import filter_history_messages
 from models.chat.chat_initialization_input_model import ChatInitializationInputModel
 from models.chat.chat_message_output_model import OutputRole
 from models.chat.chat_initialization_output_model import ChatInitializationOutputModel
-from redis_services.redis_methods import (
-    get_conversation_id,
-    refresh_conversation_expiration,
-    set_conversation_metadata,
-    fetch_entire_conversation_history,
-    refresh_conversation_messages_expiration,
-)
+from redis_services.redis_methods import create_or_refresh_conversation
 
 
 async def chat_initialization_service(user_id: str, request: ChatInitializationInputModel) -> dict:
-    conversation_id = await handle_conversation_id(user_id)
+    conversation_id, messages = await handle_conversation_id(user_id, request)
 
-    await set_conversation_metadata(conversation_id, request.metadata)
-
-    history = await fetch_and_filter_history(conversation_id)
+    history = await filter_history(messages)
 
     return ChatInitializationOutputModel(conversation_id=conversation_id, history=history).model_dump(exclude_none=True)
 
 
-async def handle_conversation_id(user_id: str) -> str:
-    conversation_id = await get_conversation_id(user_id)
+async def handle_conversation_id(user_id: str, request: ChatInitializationInputModel) -> Tuple[str, List[Dict]]:
+    conversation = await create_or_refresh_conversation(user_id, generate_conversation_id(), request.metadata)
+    if not conversation:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Conversation storage unavailable")
 
-    if conversation_id:
-        await refresh_conversation_expiration(user_id)
-        await refresh_conversation_messages_expiration(conversation_id)
-    else:
-        conversation_id = await create_new_conversation(user_id)
+    conversation_id, created, messages = conversation
+    if created:
+        await save_new_conversation(user_id, conversation_id)
 
-    return conversation_id
+    return conversation_id, messages
 
 
-async def fetch_and_filter_history(conversation_id: str) -> List[Dict]:
+async def filter_history(messages: List[Dict]) -> List[Dict]:
     return await filter_history_messages(
-        await fetch_entire_conversation_history(conversation_id=conversation_id),
+        messages,
         exclude_fields=["tool_calls"],
         exclude_if_field_matches={"role": OutputRole.TOOL},
     )
@@ -3,13 +3,13 @@ from database.helpers import log_chatbot_response_interaction, log_user_message_
 from models.handler_config_model import HandlerConfigModel
 from models.handler_response_model import HandlerResponse, HandlerResponseStatus
 from models.redis_messages_model import RedisMessages
+from redis_services.conversation_snapshot import ConversationSnapshot
 from utils.logger.logger import Logger
 from models.chat.chat_message_input_model import ChatMessage
-from redis_services.redis_methods import (
-    get_conversation_id,
-    generate_new_part_ids,
-    push_message_to_redis,
-)
+from database.conversation_turn import ConversationTurn
+from helpers.conversation_compaction import schedule_conversation_compaction
+from helpers.deadline import without_deadline
+from redis_services.redis_methods import push_message_to_redis
 from models.chat.chat_message_output_model import (
     OutputRole,
     ConversationMessagesOutput,
@@ -24,21 +24,25 @@ chatbot_router = ChatbotRouter()
 
 async def chat_service(request: ChatMessage) -> ConversationMessagesOutput | HTTPException:
     user_id = request.user_id
-    conversation_id = await get_conversation_id(user_id)
+    conversation_snapshot = await ConversationSnapshot.load(user_id)
 
-    if not conversation_id:
+    if not conversation_snapshot:
         logger.log("User has no active conversations", user_id=user_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer has no active conversations")
 
-    await generate_new_part_ids(user_id)
+    conversation_id = conversation_snapshot.conversation_id
+    conversation_turn = ConversationTurn.start(user_id, conversation_id)
 
-    await process_user_message(user_id, request, conversation_id)
+    try:
+        await process_user_message(user_id, request, conversation_id, conversation_snapshot)
 
-    handler_response: HandlerResponse = await chatbot_router.route(
-        request, HandlerConfigModel(user_id=user_id, conversation_id=conversation_id)
-    )
+        handler_response: HandlerResponse = await chatbot_router.route(
+            request, HandlerConfigModel(user_id=user_id, conversation_id=conversation_id), conversation_snapshot
+        )
 
-    await process_chatbot_response(user_id, conversation_id, handler_response)
+        await process_chatbot_response(user_id, conversation_id, handler_response, conversation_snapshot)
+    finally:
+        await conversation_turn.commit()
 
     return ConversationMessagesOutput(
         conversation_id=conversation_id,
@@ -47,19 +51,28 @@ async def chat_service(request: ChatMessage) -> ConversationMessagesOutput | HTT
     )
 
 
-async def process_user_message(user_id: str, message: ChatMessage, conversation_id: str) -> None:
+async def process_user_message(
+    user_id: str, message: ChatMessage, conversation_id: str, conversation_snapshot: ConversationSnapshot
+) -> None:
     await push_message_to_redis(
         user_id=user_id,
         conversation_id=conversation_id,
         message=RedisMessages(role=message.role, content=message.content),
+        conversation_snapshot=conversation_snapshot,
     )
     await log_user_message_interaction(user_id, conversation_id, message)
 
 
-async def process_chatbot_response(user_id: str, conversation_id: str, handler_response: HandlerResponse) -> None:
-    await push_message_to_redis(
-        user_id=user_id,
-        conversation_id=conversation_id,
-        message=RedisMessages(role=OutputRole.ASSISTANT, content=handler_response.message),
-    )
-    await log_chatbot_response_interaction(user_id, conversation_id, handler_response)
+async def process_chatbot_response(
+    user_id: str, conversation_id: str, handler_response: HandlerResponse, conversation_snapshot: ConversationSnapshot
+) -> None:
+    # The response is already generated, so it is stored even when the request deadline ran out meanwhile.
+    with without_deadline():
+        await push_message_to_redis(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message=RedisMessages(role=OutputRole.ASSISTANT, content=handler_response.message),
+            conversation_snapshot=conversation_snapshot,
+        )
+        await log_chatbot_response_interaction(user_id, conversation_id, handler_response)
+    schedule_conversation_compaction(user_id, conversation_snapshot)
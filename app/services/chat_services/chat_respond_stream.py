@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+from typing import AsyncGenerator, Dict, Any
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from models.handler_config_model import HandlerConfigModel
+from models.handler_response_model import HandlerResponse, HandlerResponseStatus
+from redis_services.conversation_snapshot import ConversationSnapshot
+from utils.logger.logger import Logger
+from models.chat.chat_message_input_model import ChatMessage
+from database.conversation_turn import ConversationTurn, current_conversation_turn
+from models.chat.chat_message_output_model import (
+    OutputRole,
+    ConversationMessagesOutput,
+    ConversationMessages,
+    HandoffDetails,
+    StreamEventType,
+)
+from services.chat_services.chat_respond import chatbot_router, process_user_message, process_chatbot_response
+
+logger = Logger()
+
+
+async def chat_stream_service(request: ChatMessage) -> StreamingResponse:
+    user_id = request.user_id
+    conversation_snapshot = await ConversationSnapshot.load(user_id)
+
+    if not conversation_snapshot:
+        logger.log("User has no active conversations", user_id=user_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer has no active conversations")
+
+    conversation_id = conversation_snapshot.conversation_id
+    conversation_turn = ConversationTurn.start(user_id, conversation_id)
+
+    try:
+        await process_user_message(user_id, request, conversation_id, conversation_snapshot)
+    except BaseException:
+        await conversation_turn.commit()
+        raise
+
+    return StreamingResponse(
+        stream_chatbot_response(user_id, request, conversation_id, conversation_snapshot, conversation_turn),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def stream_chatbot_response(
+    user_id: str,
+    request: ChatMessage,
+    conversation_id: str,
+    conversation_snapshot: ConversationSnapshot,
+    conversation_turn: ConversationTurn,
+) -> AsyncGenerator[str, None]:
+    current_conversation_turn.set(conversation_turn)
+
+    try:
+        handler_response = None
+        has_streamed_tokens = False
+
+        async for response_part in chatbot_router.route_stream(
+            request, HandlerConfigModel(user_id=user_id, conversation_id=conversation_id), conversation_snapshot
+        ):
+            if isinstance(response_part, HandlerResponse):
+                handler_response = response_part
+            else:
+                has_streamed_tokens = True
+                yield format_stream_event(StreamEventType.TOKEN, {"content": response_part})
+
+        if not has_streamed_tokens:
+            yield format_stream_event(StreamEventType.TOKEN, {"content": handler_response.message})
+
+        # The assembled message is persisted even if the client disconnects while it is being stored
+        await asyncio.shield(
+            process_chatbot_response(user_id, conversation_id, handler_response, conversation_snapshot)
+        )
+
+        yield format_stream_event(
+            StreamEventType.DONE,
+            ConversationMessagesOutput(
+                conversation_id=conversation_id,
+                message=ConversationMessages(role=OutputRole.ASSISTANT, content=handler_response.message),
+                handoff=HandoffDetails(should_handoff=handler_response.status == HandlerResponseStatus.SUPPORT_HANDOFF),
+            ).model_dump(mode="json"),
+        )
+    except HTTPException as exception:
+        yield format_stream_event(StreamEventType.ERROR, {"detail": exception.detail})
+    except Exception as exception:
+        logger.log(
+            "Streaming chatbot response failed",
+            level=logging.ERROR,
+            user_id=user_id,
+            conversation_id=conversation_id,
+            payload=exception,
+        )
+        yield format_stream_event(StreamEventType.ERROR, {"detail": "An internal server error occurred"})
+    finally:
+        await asyncio.shield(conversation_turn.commit())
+
+
+def format_stream_event(event_type: StreamEventType, data: Dict[str, Any]) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -1,27 +1,21 @@
 from fastapi import HTTPException, status
-from helpers.conversation import create_new_conversation
+from helpers.conversation import generate_conversation_id, save_new_conversation
 from utils.logger.logger import Logger
 from models.chat.chat_initialization_output_model import ChatInitializationOutputModel
-from redis_services.redis_methods import (
-    get_conversation_id,
-    delete_conversation,
-    get_conversation_metadata,
-    set_conversation_metadata,
-)
+from redis_services.redis_methods import NO_ACTIVE_CONVERSATION, rotate_conversation
 
 logger = Logger()
 
 
 async def restart_conversation_service(user_id: str) -> dict:
-    current_conversation_id = await get_conversation_id(user_id)
-    if not current_conversation_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer has no active conversations")
-
-    current_conversation_metadata = await get_conversation_metadata(current_conversation_id, user_id)
+    new_conversation_id = generate_conversation_id()
 
-    await delete_conversation(user_id, current_conversation_id)
+    previous_conversation_id = await rotate_conversation(user_id, new_conversation_id)
+    if previous_conversation_id is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Conversation storage unavailable")
+    if previous_conversation_id == NO_ACTIVE_CONVERSATION:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer has no active conversations")
 
-    new_conversation_id = await create_new_conversation(user_id)
-    await set_conversation_metadata(new_conversation_id, current_conversation_metadata)
+    await save_new_conversation(user_id, new_conversation_id)
 
     return ChatInitializationOutputModel(conversation_id=new_conversation_id, history=[]).model_dump(exclude_none=True)
@@ -1,17 +1,38 @@
-from typing import Dict
+from typing import Dict, Optional
 from fastapi import status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from database.database_calls import postgres_database
-from models.history.events_output_model import DatabaseEventTable
 from models.history.history_response_model import HistoryAPIResponse, HistoryResponseStatusCode
+from services.history.history_pagination import (
+    NDJSON_MEDIA_TYPE,
+    decode_cursor,
+    encode_cursor,
+    serialize_event,
+    serialize_event_line,
+    stream_ndjson_lines,
+)
 from utils.logger.logger import Logger
 
 logger = Logger()
 
 
-async def history_events_service(conversation_id: str) -> Dict | JSONResponse:
+async def history_events_service(conversation_id: str, page_size: int, cursor: Optional[str]) -> Dict | JSONResponse:
     try:
-        history_events = await postgres_database.get_events_by_conversation_id(conversation_id)
+        after = decode_cursor(cursor)
+    except ValueError:
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Invalid cursor"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        history_events = await postgres_database.get_events_by_conversation_id(
+            conversation_id, page_size + 1, after
+        )
+        if history_events is None:
+            raise ConnectionError("Events query failed after retries")
     except Exception as exception:
         logger.log("Failed fetching events from database", conversation_id=conversation_id, payload=exception)
         return JSONResponse(
@@ -21,7 +42,7 @@ async def history_events_service(conversation_id: str) -> Dict | JSONResponse:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    if not history_events:
+    if not history_events and not after:
         return JSONResponse(
             content=HistoryAPIResponse(
                 status=HistoryResponseStatusCode.ERROR, error_message="Conversation ID not found"
@@ -29,8 +50,38 @@ async def history_events_service(conversation_id: str) -> Dict | JSONResponse:
             status_code=status.HTTP_404_NOT_FOUND,
         )
 
-    parsed_events = [DatabaseEventTable(**event) for event in history_events]
+    page = history_events[:page_size]
+    next_cursor = encode_cursor(page[-1]) if len(history_events) > page_size else None
 
     return HistoryAPIResponse(
-        status=HistoryResponseStatusCode.SUCCESS, data=parsed_events
+        status=HistoryResponseStatusCode.SUCCESS,
+        data=[serialize_event(event) for event in page],
+        next_cursor=next_cursor,
     ).convert_to_success_response()
+
+
+async def history_events_export_service(conversation_id: str) -> StreamingResponse | JSONResponse:
+    history_events = postgres_database.stream_events_by_conversation_id(conversation_id)
+    try:
+        first_event = await anext(history_events)
+    except StopAsyncIteration:
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Conversation ID not found"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as exception:
+        await history_events.aclose()
+        logger.log("Failed exporting events from database", conversation_id=conversation_id, payload=exception)
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Failed exporting events from database"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    return StreamingResponse(
+        stream_ndjson_lines(first_event, history_events, serialize_event_line, conversation_id),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
@@ -1,17 +1,37 @@
-from typing import Dict
+from typing import Dict, Optional
 from fastapi import status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from database.database_calls import postgres_database
-from models.history.messages_output_model import DatabaseHistoryTable
 from models.history.history_response_model import HistoryAPIResponse, HistoryResponseStatusCode
+from services.history.history_pagination import (
+    NDJSON_MEDIA_TYPE,
+    decode_cursor,
+    encode_cursor,
+    serialize_history_line,
+    stream_ndjson_lines,
+)
 from utils.logger.logger import Logger
 
 logger = Logger()
 
 
-async def history_messages_service(conversation_id: str) -> Dict | JSONResponse:
+async def history_messages_service(conversation_id: str, page_size: int, cursor: Optional[str]) -> Dict | JSONResponse:
     try:
-        history_messages = await postgres_database.get_history_by_conversation_id(conversation_id)
+        after = decode_cursor(cursor)
+    except ValueError:
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Invalid cursor"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        history_messages = await postgres_database.get_history_by_conversation_id(
+            conversation_id, page_size + 1, after
+        )
+        if history_messages is None:
+            raise ConnectionError("Messages query failed after retries")
     except Exception as exception:
         logger.log("Failed fetching messages from database", conversation_id=conversation_id, payload=exception)
         return JSONResponse(
@@ -21,7 +41,7 @@ async def history_messages_service(conversation_id: str) -> Dict | JSONResponse:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    if not history_messages:
+    if not history_messages and not after:
         return JSONResponse(
             content=HistoryAPIResponse(
                 status=HistoryResponseStatusCode.ERROR, error_message="Conversation ID not found"
@@ -29,8 +49,38 @@ async def history_messages_service(conversation_id: str) -> Dict | JSONResponse:
             status_code=status.HTTP_404_NOT_FOUND,
         )
 
-    parsed_events = [DatabaseHistoryTable(**event) for event in history_messages]
+    page = history_messages[:page_size]
+    next_cursor = encode_cursor(page[-1]) if len(history_messages) > page_size else None
 
     return HistoryAPIResponse(
-        status=HistoryResponseStatusCode.SUCCESS, data=parsed_events
+        status=HistoryResponseStatusCode.SUCCESS,
+        data=[dict(message) for message in page],
+        next_cursor=next_cursor,
     ).convert_to_success_response()
+
+
+async def history_messages_export_service(conversation_id: str) -> StreamingResponse | JSONResponse:
+    history_messages = postgres_database.stream_history_by_conversation_id(conversation_id)
+    try:
+        first_message = await anext(history_messages)
+    except StopAsyncIteration:
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Conversation ID not found"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as exception:
+        await history_messages.aclose()
+        logger.log("Failed exporting messages from database", conversation_id=conversation_id, payload=exception)
+        return JSONResponse(
+            content=HistoryAPIResponse(
+                status=HistoryResponseStatusCode.ERROR, error_message="Failed exporting messages from database"
+            ).convert_to_error_response(),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    return StreamingResponse(
+        stream_ndjson_lines(first_message, history_messages, serialize_history_line, conversation_id),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
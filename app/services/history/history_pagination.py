@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from typing import AsyncGenerator, Callable, Dict, Optional, Tuple
+import asyncpg
+from utils.logger.logger import Logger
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+logger = Logger()
+
+
+def encode_cursor(record: asyncpg.Record) -> str:
+    """Opaque keyset cursor pointing at the (created_at, id) of the last row of a page."""
+    raw_cursor = json.dumps([record["created_at"].isoformat(), record["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw_cursor.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        padded_cursor = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded_cursor))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as exception:
+        raise ValueError(f"Invalid cursor: {cursor}") from exception
+
+
+def serialize_event(record: asyncpg.Record) -> Dict:
+    event = dict(record)
+    event["payload"] = json.loads(record["payload"])
+    return event
+
+
+def serialize_event_line(record: asyncpg.Record) -> str:
+    """The payload column already holds JSON text, so it is spliced into the line instead of being re-parsed."""
+    event = {key: value for key, value in record.items() if key != "payload"}
+    event["created_at"] = record["created_at"].isoformat()
+    return json.dumps(event)[:-1] + f', "payload": {record["payload"]}}}\n'
+
+
+def serialize_history_line(record: asyncpg.Record) -> str:
+    message = dict(record)
+    message["created_at"] = record["created_at"].isoformat()
+    return json.dumps(message) + "\n"
+
+
+async def stream_ndjson_lines(
+    first_record: asyncpg.Record,
+    records: AsyncGenerator[asyncpg.Record, None],
+    serialize_line: Callable[[asyncpg.Record], str],
+    conversation_id: str,
+) -> AsyncGenerator[str, None]:
+    try:
+        yield serialize_line(first_record)
+        async for record in records:
+            yield serialize_line(record)
+    except Exception as exception:
+        logger.log("Failed streaming history export", conversation_id=conversation_id, payload=exception)
+        raise
+    finally:
+        await records.aclose()
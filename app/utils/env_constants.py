@@ -12,3 +12,39 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+ROUTER_MODE = os.getenv("ROUTER_MODE", "sequential")
+ROUTER_SPECULATIVE_EXECUTION = os.getenv("ROUTER_SPECULATIVE_EXECUTION", "false").lower() == "true"
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "12"))
+PARTITION_ARCHIVE_DIRECTORY = os.getenv("PARTITION_ARCHIVE_DIRECTORY", "archive")
+REDIS_MESSAGE_COMPRESSION = os.getenv("REDIS_MESSAGE_COMPRESSION", "true").lower() == "true"
+REDIS_MESSAGE_COMPRESSION_MIN_SIZE = int(os.getenv("REDIS_MESSAGE_COMPRESSION_MIN_SIZE", "1024"))
+CONVERSATION_WINDOW_SIZE = int(os.getenv("CONVERSATION_WINDOW_SIZE", "20"))
+CONVERSATION_COMPACTION_THRESHOLD = int(os.getenv("CONVERSATION_COMPACTION_THRESHOLD", "10"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
+HANDOFF_MESSAGE_WARMUP_LANGUAGES = os.getenv("HANDOFF_MESSAGE_WARMUP_LANGUAGES", "es,pt,fr,de,it,id,lt")
+HANDOFF_CLASSIFIER_MODEL_PATH = os.getenv("HANDOFF_CLASSIFIER_MODEL_PATH", "")
+HANDOFF_CLASSIFIER_YES_THRESHOLD = float(os.getenv("HANDOFF_CLASSIFIER_YES_THRESHOLD", "0.98"))
+HANDOFF_CLASSIFIER_NO_THRESHOLD = float(os.getenv("HANDOFF_CLASSIFIER_NO_THRESHOLD", "0.02"))
+CHATBOT_LABEL_CACHE_MESSAGES = int(os.getenv("CHATBOT_LABEL_CACHE_MESSAGES", "3"))
+CHATBOT_LABEL_CACHE_SIZE = int(os.getenv("CHATBOT_LABEL_CACHE_SIZE", "10000"))
+CHATBOT_LABEL_CACHE_TTL = int(os.getenv("CHATBOT_LABEL_CACHE_TTL", "86400"))
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "5000"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "800000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+OPENAI_MIN_CONCURRENCY = int(os.getenv("OPENAI_MIN_CONCURRENCY", "4"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+OPENAI_HEDGED_ACTIONS = os.getenv("OPENAI_HEDGED_ACTIONS", "")
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "50"))
+OPENAI_HEDGE_INITIAL_DELAY = float(os.getenv("OPENAI_HEDGE_INITIAL_DELAY", "2"))
+OPENAI_ACTION_MODELS = os.getenv("OPENAI_ACTION_MODELS", "")
+OPENAI_ESCALATION_MODEL = os.getenv("OPENAI_ESCALATION_MODEL", "gpt-4o-2024-08-06")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "64"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "false").lower() == "true"
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_PREWARM_CONNECTIONS = int(os.getenv("OPENAI_PREWARM_CONNECTIONS", "4"))
+WRITE_BEHIND_SPILL_PATH = os.getenv("WRITE_BEHIND_SPILL_PATH", "/tmp/write_behind_spill.jsonl")
@@ -0,0 +1,78 @@
+import math
+from collections import defaultdict, deque
+from typing import Dict, Any, Tuple, Deque
+
+SUMMARY_WINDOW_SIZE = 1000
+SUMMARY_PERCENTILES = (50, 95, 99)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def calculate_percentile(samples: list, percentile: float) -> float:
+    if not samples:
+        return 0.0
+    ordered_samples = sorted(samples)
+    index = min(len(ordered_samples) - 1, max(0, math.ceil(percentile / 100 * len(ordered_samples)) - 1))
+    return ordered_samples[index]
+
+
+class Metrics:
+    """In-process counters, gauges and summaries, exposed through the /api/metrics endpoint."""
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(Metrics, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self) -> None:
+        self.counters: Dict[MetricKey, float] = defaultdict(float)
+        self.gauges: Dict[MetricKey, float] = {}
+        self.summaries: Dict[MetricKey, Deque[float]] = defaultdict(lambda: deque(maxlen=SUMMARY_WINDOW_SIZE))
+        self.summary_totals: Dict[MetricKey, Dict[str, float]] = defaultdict(lambda: {"count": 0, "sum": 0.0})
+
+    @staticmethod
+    def build_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    @staticmethod
+    def format_key(key: MetricKey) -> str:
+        name, labels = key
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        self.counters[self.build_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self.gauges[self.build_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self.build_key(name, labels)
+        self.summaries[key].append(value)
+        self.summary_totals[key]["count"] += 1
+        self.summary_totals[key]["sum"] += value
+
+    def get_counter(self, name: str, **labels) -> float:
+        return self.counters.get(self.build_key(name, labels), 0)
+
+    def get_percentile(self, name: str, percentile: float, **labels) -> float:
+        return calculate_percentile(list(self.summaries.get(self.build_key(name, labels), [])), percentile)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        summaries = {}
+        for key, samples in self.summaries.items():
+            sample_list = list(samples)
+            summary = dict(self.summary_totals[key])
+            for percentile in SUMMARY_PERCENTILES:
+                summary[f"p{percentile}"] = calculate_percentile(sample_list, percentile)
+            summaries[self.format_key(key)] = summary
+
+        return {
+            "counters": {self.format_key(key): value for key, value in self.counters.items()},
+            "gauges": {self.format_key(key): value for key, value in self.gauges.items()},
+            "summaries": summaries,
+        }
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, Identity, Index, Sequence, String, Text, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -8,33 +9,47 @@ from sqlalchemy.sql import func
 
 class Event(Base):
     __tablename__ = "events"
-    id = Column(Integer, primary_key=True)
-    conversation_id = Column(String, nullable=False, index=True)
+    id = Column(BigInteger, Sequence("events_id_seq"), primary_key=True)
+    conversation_id = Column(String, nullable=False)
     event_type = Column(String, nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(JSONB, nullable=False)
     message_part_id = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=func.now(), primary_key=True)
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("idx_events_conversation_created_at_id", "conversation_id", "created_at", "id"),
+        Index("brin_events_created_at", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 
 class Conversation(Base):
     __tablename__ = "conversations"
-    id = Column(Integer, primary_key=True)
+    id = Column(BigInteger, Identity(), primary_key=True)
     user_id = Column(String, nullable=False, index=True)
     conversation_id = Column(String, nullable=False, index=True)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now())
 
 
 class History(Base):
     __tablename__ = "history"
-    id = Column(Integer, primary_key=True)
-    conversation_id = Column(String, nullable=False, index=True)
+    id = Column(BigInteger, Sequence("history_id_seq"), primary_key=True)
+    conversation_id = Column(String, nullable=False)
     author_type = Column(String, nullable=False)
     message = Column(Text, nullable=False)
+    chatbot_label = Column(String, nullable=False, server_default="unknown")
     message_part_id = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=func.now(), primary_key=True)
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("idx_history_conversation_label_date", "conversation_id", "chatbot_label", "created_at"),
+        Index("idx_history_conversation_created_at_id", "conversation_id", "created_at", "id"),
+        Index("brin_history_created_at", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 
 class ChatbotPageUrls(Base):
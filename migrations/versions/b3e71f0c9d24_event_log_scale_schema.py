@@ -0,0 +1,98 @@
+"""Event log scale schema: JSONB payload, BIGINT identity ids, keyset and BRIN indexes, no updated_at triggers. Revision ID: b3e71f0c9d24 Revises: 62aa357c63ff Create Date: 2024-10-02 10:14"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "b3e71f0c9d24"
+down_revision: Union[str, None] = "62aa357c63ff"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+table_names = ["conversations", "events", "history"]
+
+
+def upgrade() -> None:
+    # Rows are only ever inserted, so the BEFORE UPDATE triggers never do useful work.
+    for table_name in table_names:
+        op.execute(f"DROP TRIGGER IF EXISTS update_{table_name}_updated_at_before_update ON {table_name}")
+        op.execute(f"DROP FUNCTION IF EXISTS update_{table_name}_updated_at_column()")
+
+    for table_name in table_names:
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN id DROP DEFAULT")
+        op.execute(f"DROP SEQUENCE IF EXISTS {table_name}_id_seq")
+        op.alter_column(table_name, "id", existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        op.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {table_name}"
+        )
+
+    op.alter_column(
+        "events",
+        "payload",
+        existing_type=sa.JSON(),
+        type_=postgresql.JSONB(),
+        existing_nullable=False,
+        postgresql_using="payload::jsonb",
+    )
+
+    # The keyset indexes serve the history queries, which filter by conversation and order by (created_at, id).
+    op.drop_index("ix_events_conversation_id", table_name="events")
+    op.create_index(
+        "idx_events_conversation_created_at_id", "events", ["conversation_id", "created_at", "id"], unique=False
+    )
+    op.create_index(
+        "idx_history_conversation_created_at_id", "history", ["conversation_id", "created_at", "id"], unique=False
+    )
+
+    # created_at follows insertion order, so a BRIN index covers time range scans at a fraction of a B-tree's size.
+    op.create_index("brin_events_created_at", "events", ["created_at"], unique=False, postgresql_using="brin")
+    op.create_index("brin_history_created_at", "history", ["created_at"], unique=False, postgresql_using="brin")
+
+
+def downgrade() -> None:
+    op.drop_index("brin_history_created_at", table_name="history")
+    op.drop_index("brin_events_created_at", table_name="events")
+
+    op.drop_index("idx_history_conversation_created_at_id", table_name="history")
+    op.drop_index("idx_events_conversation_created_at_id", table_name="events")
+    op.create_index(op.f("ix_events_conversation_id"), "events", ["conversation_id"], unique=False)
+
+    op.alter_column(
+        "events",
+        "payload",
+        existing_type=postgresql.JSONB(),
+        type_=sa.JSON(),
+        existing_nullable=False,
+        postgresql_using="payload::json",
+    )
+
+    for table_name in table_names:
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        op.alter_column(table_name, "id", existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
+        op.execute(f"CREATE SEQUENCE {table_name}_id_seq OWNED BY {table_name}.id")
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN id SET DEFAULT nextval('{table_name}_id_seq')")
+        op.execute(f"SELECT setval('{table_name}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {table_name}")
+
+    for table_name in table_names:
+        op.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION update_{table_name}_updated_at_column()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.updated_at = NOW();
+                RETURN NEW;
+            END;
+            $$ language 'plpgsql';
+        """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER update_{table_name}_updated_at_before_update
+            BEFORE UPDATE ON {table_name}
+            FOR EACH ROW
+            EXECUTE FUNCTION update_{table_name}_updated_at_column();
+        """
+        )
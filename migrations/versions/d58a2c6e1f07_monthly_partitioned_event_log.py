@@ -0,0 +1,249 @@
+"""Monthly range partitioned events and history tables. Revision ID: d58a2c6e1f07 Revises: b3e71f0c9d24 Create Date: 2024-10-09 09:40"""
+
+from typing import Sequence, Union
+from alembic import op
+
+revision: str = "d58a2c6e1f07"
+down_revision: Union[str, None] = "b3e71f0c9d24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+table_names = ["events", "history"]
+
+# Months of partitions created ahead of the current one; later months come from `make create_partitions`.
+PREMADE_MONTHS = 3
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partition(parent_table text, month_start date)
+        RETURNS text AS $$
+        DECLARE
+            partition_start date := date_trunc('month', month_start)::date;
+            partition_end date := (date_trunc('month', month_start) + interval '1 month')::date;
+            partition_name text := format('%s_%s', parent_table, to_char(partition_start, 'YYYY_MM'));
+            default_partition_name text := format('%s_default', parent_table);
+            has_default_rows boolean := false;
+            moved_rows bigint;
+        BEGIN
+            IF to_regclass(partition_name) IS NOT NULL THEN
+                RETURN partition_name;
+            END IF;
+
+            IF to_regclass(default_partition_name) IS NOT NULL THEN
+                EXECUTE format(
+                    'SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                    default_partition_name,
+                    partition_start,
+                    partition_end
+                ) INTO has_default_rows;
+            END IF;
+
+            IF NOT has_default_rows THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    parent_table,
+                    partition_start,
+                    partition_end
+                );
+                RETURN partition_name;
+            END IF;
+
+            -- Postgres refuses to create a partition for rows that already are in the default partition, so the
+            -- default partition is detached while its rows of the month are moved into the new partition.
+            EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent_table, default_partition_name);
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                parent_table,
+                partition_start,
+                partition_end
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                default_partition_name,
+                partition_start,
+                partition_end,
+                partition_name
+            );
+            GET DIAGNOSTICS moved_rows = ROW_COUNT;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I DEFAULT', parent_table, default_partition_name);
+            RAISE WARNING 'Moved % rows from % into %', moved_rows, default_partition_name, partition_name;
+            RETURN partition_name;
+        END;
+        $$ language 'plpgsql';
+    """
+    )
+
+    for table_name in table_names:
+        op.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_unpartitioned")
+        op.execute(f"ALTER INDEX {table_name}_pkey RENAME TO {table_name}_unpartitioned_pkey")
+        op.execute(f"ALTER SEQUENCE {table_name}_id_seq RENAME TO {table_name}_unpartitioned_id_seq")
+        op.execute(f"DROP INDEX IF EXISTS idx_{table_name}_conversation_created_at_id")
+        op.execute(f"DROP INDEX IF EXISTS brin_{table_name}_created_at")
+    op.execute("DROP INDEX IF EXISTS idx_history_conversation_label_date")
+
+    # Identity columns are not supported on partitioned tables by every Postgres version we run, so the ids
+    # come from a plain BIGINT sequence shared by all partitions of a table.
+    op.execute(
+        """
+        CREATE SEQUENCE events_id_seq AS BIGINT;
+        CREATE TABLE events (
+            id BIGINT NOT NULL DEFAULT nextval('events_id_seq'),
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            conversation_id VARCHAR NOT NULL,
+            event_type VARCHAR NOT NULL,
+            payload JSONB NOT NULL,
+            message_part_id VARCHAR NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        ALTER SEQUENCE events_id_seq OWNED BY events.id;
+    """
+    )
+    op.execute(
+        """
+        CREATE SEQUENCE history_id_seq AS BIGINT;
+        CREATE TABLE history (
+            id BIGINT NOT NULL DEFAULT nextval('history_id_seq'),
+            conversation_id VARCHAR NOT NULL,
+            author_type VARCHAR NOT NULL,
+            message TEXT NOT NULL,
+            chatbot_label VARCHAR NOT NULL DEFAULT 'unknown',
+            message_part_id VARCHAR NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        ALTER SEQUENCE history_id_seq OWNED BY history.id;
+    """
+    )
+
+    for table_name in table_names:
+        op.execute(
+            f"""
+            SELECT create_monthly_partition('{table_name}', month_start::date)
+            FROM generate_series(
+                date_trunc('month', COALESCE((SELECT MIN(created_at) FROM {table_name}_unpartitioned), NOW())),
+                date_trunc('month', NOW()) + interval '{PREMADE_MONTHS} months',
+                interval '1 month'
+            ) AS month_start
+        """
+        )
+        # Catches rows outside of every monthly partition, so a missed maintenance run does not fail inserts.
+        # create_monthly_partition moves them into the partition of their month once it is created.
+        op.execute(f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT")
+
+        op.create_index(
+            f"idx_{table_name}_conversation_created_at_id",
+            table_name,
+            ["conversation_id", "created_at", "id"],
+            unique=False,
+        )
+        op.create_index(
+            f"brin_{table_name}_created_at", table_name, ["created_at"], unique=False, postgresql_using="brin"
+        )
+    op.create_index(
+        "idx_history_conversation_label_date",
+        "history",
+        ["conversation_id", "chatbot_label", "created_at"],
+        unique=False,
+    )
+
+    op.execute(
+        """
+        INSERT INTO events (id, created_at, updated_at, conversation_id, event_type, payload, message_part_id)
+        SELECT id, created_at, updated_at, conversation_id, event_type, payload, message_part_id
+        FROM events_unpartitioned
+    """
+    )
+    op.execute(
+        """
+        INSERT INTO history (
+            id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at, updated_at
+        )
+        SELECT id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at, updated_at
+        FROM history_unpartitioned
+    """
+    )
+
+    for table_name in table_names:
+        op.execute(
+            f"SELECT setval('{table_name}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {table_name}_unpartitioned"
+        )
+        op.execute(f"DROP TABLE {table_name}_unpartitioned")
+
+
+def downgrade() -> None:
+    for table_name in table_names:
+        op.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_partitioned")
+        op.execute(f"ALTER INDEX {table_name}_pkey RENAME TO {table_name}_partitioned_pkey")
+        op.execute(
+            f"ALTER INDEX idx_{table_name}_conversation_created_at_id RENAME TO idx_{table_name}_partitioned_keyset"
+        )
+        op.execute(f"ALTER INDEX brin_{table_name}_created_at RENAME TO brin_{table_name}_partitioned_created_at")
+        op.execute(f"ALTER SEQUENCE {table_name}_id_seq RENAME TO {table_name}_partitioned_id_seq")
+    op.execute("ALTER INDEX idx_history_conversation_label_date RENAME TO idx_history_partitioned_label_date")
+
+    op.execute(
+        """
+        CREATE TABLE events (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            conversation_id VARCHAR NOT NULL,
+            event_type VARCHAR NOT NULL,
+            payload JSONB NOT NULL,
+            message_part_id VARCHAR NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000'
+        );
+        INSERT INTO events (id, created_at, updated_at, conversation_id, event_type, payload, message_part_id)
+        SELECT id, created_at, updated_at, conversation_id, event_type, payload, message_part_id
+        FROM events_partitioned;
+    """
+    )
+    op.execute(
+        """
+        CREATE TABLE history (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            conversation_id VARCHAR NOT NULL,
+            author_type VARCHAR NOT NULL,
+            message TEXT NOT NULL,
+            chatbot_label VARCHAR NOT NULL DEFAULT 'unknown',
+            message_part_id VARCHAR NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        INSERT INTO history (
+            id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at, updated_at
+        )
+        SELECT id, conversation_id, author_type, message, chatbot_label, message_part_id, created_at, updated_at
+        FROM history_partitioned;
+    """
+    )
+
+    for table_name in table_names:
+        op.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            f"FROM {table_name}"
+        )
+        op.execute(f"DROP TABLE {table_name}_partitioned")
+        op.create_index(
+            f"idx_{table_name}_conversation_created_at_id",
+            table_name,
+            ["conversation_id", "created_at", "id"],
+            unique=False,
+        )
+        op.create_index(
+            f"brin_{table_name}_created_at", table_name, ["created_at"], unique=False, postgresql_using="brin"
+        )
+    op.create_index(
+        "idx_history_conversation_label_date",
+        "history",
+        ["conversation_id", "chatbot_label", "created_at"],
+        unique=False,
+    )
+
+    op.execute("DROP FUNCTION IF EXISTS create_monthly_partition(text, date)")